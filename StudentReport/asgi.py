@@ -2,6 +2,9 @@
 ASGI config for StudentReport project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn StudentReport.asgi:application``)
+so the live attendance board's event stream (admin/attendance-board/events)
+holds an open connection without tying up a worker thread.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
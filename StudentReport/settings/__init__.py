@@ -0,0 +1,21 @@
+"""
+Settings package. DJANGO_ENV picks the profile:
+
+    DJANGO_ENV=dev   (default) DEBUG, django_extensions
+    DJANGO_ENV=prod  cached templates, persistent connections, cached sessions
+
+DJANGO_SETTINGS_MODULE=StudentReport.settings.prod (or .dev) selects one
+directly as well.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+DJANGO_ENV = os.environ.get('DJANGO_ENV', 'dev')
+
+if DJANGO_ENV == 'prod':
+    from .prod import *  # noqa: F401,F403
+elif DJANGO_ENV == 'dev':
+    from .dev import *  # noqa: F401,F403
+else:
+    raise ImproperlyConfigured(f"DJANGO_ENV must be 'dev' or 'prod', not {DJANGO_ENV!r}.")
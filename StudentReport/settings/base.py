@@ -0,0 +1,317 @@
+"""
+Django settings for StudentReport project: shared base for the dev and
+prod profiles (see StudentReport/settings/__init__.py).
+
+Generated by 'django-admin startproject' using Django 5.2.6.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.2/ref/settings/
+"""
+
+import os
+from pathlib import Path
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY', 'django-insecure-+vd^wj3dy^an0$+yjt&&)zncsr-a5$%z91jn_xjaktdw@2wdw$'
+)
+
+# SECURITY WARNING: don't run with debug turned on in production!
+# DEBUG also keeps every SQL query of a request in memory; dev.py turns it on.
+DEBUG = False
+
+ALLOWED_HOSTS = [h for h in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if h]
+
+# Allowed IP or WiFi gateways for attendance marking
+ALLOWED_WIFI_IPS = ["192.168.1.21", "2401:4900:88e4:cb03:94ac:daad:7e6a:840b","192.168.1.68"]  
+
+
+TEST_WIFI_IP = "192.168.1.21"
+
+# Student attendance older than this moves to the archive table (manage.py archive_attendance)
+ATTENDANCE_ARCHIVE_AFTER_DAYS = 365
+
+# Write coordination (myapp/writes.py): lock-error retries with jittered
+# backoff; WRITE_QUEUE_ENABLED funnels writes through one writer thread.
+WRITE_RETRY_ATTEMPTS = 5
+WRITE_RETRY_BASE_DELAY = 0.05  # seconds, doubled per attempt
+WRITE_QUEUE_ENABLED = False
+
+# Snapshots (manage.py backup, myapp/backup.py). The online copy moves
+# BACKUP_PAGES_PER_STEP pages per step and sleeps between steps, so writers
+# wait for at most one step; incrementals chain onto the previous snapshot.
+BACKUP_DIR = BASE_DIR / 'backups'
+BACKUP_PAGES_PER_STEP = 1024      # 4 MB with the default page size
+BACKUP_STEP_SLEEP = 0.05          # seconds between steps (and between incremental read chunks)
+BACKUP_MAX_RESTARTS = 20          # copies restarted by concurrent writes before giving up
+BACKUP_COMPRESSLEVEL = 6
+BACKUP_KEEP = 7                   # full snapshots kept, each with its incrementals
+BACKUP_MAX_CHAIN = 6              # incrementals after a full before the next full
+BACKUP_OVERLAP_SECONDS = 300      # incrementals re-read rows updated this long before the previous snapshot
+
+# Columnar attendance snapshots (manage.py attendance_snapshot, myapp/columnar.py)
+ATTENDANCE_SNAPSHOT_DIR = BASE_DIR / 'attendance_snapshots'
+ATTENDANCE_SNAPSHOT_MONTHS = 12   # months exported by default, the current one included
+
+# Seats of a batch without its own capacity; staff suggestions rank by active students / seats
+BATCH_DEFAULT_CAPACITY = 30
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'myapp',
+]
+
+MIDDLEWARE = [
+    'myapp.middleware.MetricsMiddleware',
+    'myapp.middleware.RequestProfilingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'myapp.middleware.BranchMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'StudentReport.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'StudentReport.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+
+# BEGIN IMMEDIATE: transactions take SQLite's write lock up front and wait
+# up to `timeout` seconds for it, instead of failing with "database is
+# locked" when a read turns into a write (see myapp/writes.py).
+SQLITE_OPTIONS = {'transaction_mode': 'IMMEDIATE', 'timeout': 5}
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': dict(SQLITE_OPTIONS),
+        # A file, not shared-cache memory, so the threaded tests lock like production
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+# Branch databases (myapp/routers.py): {Branch.code: alias}. Each alias gets
+# its own SQLite file; create its tables with `migrate --database <alias>`
+# and move the branch's existing rows with `move_branch_data <code>`.
+# Branches not listed here keep their data in "default".
+BRANCH_DATABASES = {}
+for _alias in BRANCH_DATABASES.values():
+    DATABASES[_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'{_alias}.sqlite3',
+        'OPTIONS': dict(SQLITE_OPTIONS),
+    }
+
+# An empty second database for the branch routing tests (myapp/tests.py),
+# which map a branch to it with override_settings. Nothing else uses it.
+DATABASES['branch_test'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'branch_test.sqlite3',
+    'OPTIONS': dict(SQLITE_OPTIONS),
+    'TEST': {'NAME': BASE_DIR / 'test_branch_test.sqlite3'},
+}
+
+DATABASE_ROUTERS = ['myapp.routers.BranchRouter']
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Password hashing (myapp/hashers.py). New hashes use PASSWORD_HASHER; the
+# others stay listed so existing hashes verify, and are rewritten with
+# PASSWORD_HASHER at the user's next login.
+#   pbkdf2  PBKDF2-SHA256, PASSWORD_PBKDF2_ITERATIONS (None: Django's 1,000,000;
+#           OWASP's floor is 600,000)
+#   scrypt  PASSWORD_SCRYPT_WORK_FACTOR (None: Django's 2**14)
+#   argon2  needs argon2-cffi; bcrypt needs bcrypt
+# Measure with manage.py bench_login before changing either.
+PASSWORD_HASHER_PROFILES = {
+    'pbkdf2': 'myapp.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'myapp.hashers.ScryptPasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'bcrypt': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+}
+PASSWORD_HASHER = os.environ.get('DJANGO_PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('DJANGO_PBKDF2_ITERATIONS', 0)) or None
+PASSWORD_SCRYPT_WORK_FACTOR = None
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHER]] + [
+    h for name, h in PASSWORD_HASHER_PROFILES.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+# Logins hashing at once per process (None: half the cores); the others wait
+# up to LOGIN_QUEUE_SECONDS, then are asked to retry (HTTP 503)
+LOGIN_CONCURRENCY = None
+LOGIN_QUEUE_SECONDS = 5
+
+# A login's session row is inserted once, with its data (myapp/sessions.py)
+SESSION_ENGINE = 'myapp.sessions'
+SESSION_BASE_ENGINE = 'django.contrib.sessions.backends.db'
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.2/howto/static-files/
+
+STATIC_URL = 'static/'
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_HOST = 'smtp.gmail.com'
+EMAIL_PORT = 587
+EMAIL_USE_TLS = True
+EMAIL_HOST_USER = 'vishvasen912@gmail.com'   # admin email
+EMAIL_HOST_PASSWORD = 'zkpa srwy wodm lnnf' # app-specific password, not Gmail password
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+
+# Redirect users after login
+LOGIN_REDIRECT_URL = '/admin/'   # sends you to admin dashboard after login
+LOGOUT_REDIRECT_URL = '/'        # optional: send users to home after logout
+
+
+
+# Live attendance board (myapp/live.py, served over SSE by StudentReport/asgi.py).
+# InProcessBroker serves one worker; several workers need a shared broker.
+LIVE_BROKER = 'myapp.live.InProcessBroker'
+LIVE_HEARTBEAT_SECONDS = 15   # keep-alive comment on idle streams
+LIVE_REPLAY = 200             # recent events replayed to reconnecting boards (Last-Event-ID)
+
+# Compiled course curricula (myapp/curriculum.py); topic saves drop them earlier
+CURRICULUM_CACHE_SECONDS = 86400
+
+# Topics per page of the progress editing form (one module at a time)
+PROGRESS_PAGE_SIZE = 50
+
+# Course analytics (myapp/analytics.py) cache lifetime; progress writes also invalidate it
+ANALYTICS_CACHE_SECONDS = 600
+
+# At-risk detection (manage.py flag_at_risk_students, myapp/risk.py)
+RISK_WINDOW_DAYS = 56        # attendance history loaded per run
+RISK_RECENT_DAYS = 14        # compared against the rest of the window
+RISK_MIN_MARKED_DAYS = 4     # marked days needed in each part before comparing rates
+RISK_ABSENCE_STREAK = 3      # consecutive absences on marked days
+RISK_ATTENDANCE_DROP = 0.25  # recent rate this far below the earlier rate
+RISK_STALL_DAYS = 21         # a started topic still unfinished after this many days
+
+
+# Request profiling (myapp.middleware.RequestProfilingMiddleware)
+# Off by default; set PROFILING_SAMPLE_RATE below 1 to keep it always-on cheaply.
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 1.0
+PROFILING_SLOW_REQUEST_MS = 500
+PROFILING_TOP_QUERIES = 5
+PROFILING_SLOW_LOG = BASE_DIR / 'slow_requests.log'
+
+
+# /metrics (myapp/metrics.py). Each worker process writes its counters to
+# METRICS_DIR every METRICS_FLUSH_SECONDS; a scrape sums all of them.
+METRICS_ENABLED = True
+METRICS_DIR = BASE_DIR / '.metrics'
+METRICS_FLUSH_SECONDS = 5
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+
+# Application logging (myapp/log.py). Records go through a queue and are
+# written as JSON lines by a background thread; DEBUG enables the per-request
+# detail in views/admin/signals. High-volume attendance events are sampled.
+MYAPP_LOG_LEVEL = os.environ.get('MYAPP_LOG_LEVEL', 'INFO')
+MYAPP_LOG_FILE = None              # e.g. BASE_DIR / 'myapp.log'; stderr only when None
+MYAPP_LOG_ATTENDANCE_SAMPLE_RATE = 0.1
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sample_attendance': {
+            '()': 'myapp.log.SamplingFilter',
+            'rate': MYAPP_LOG_ATTENDANCE_SAMPLE_RATE,
+        },
+    },
+    'handlers': {
+        'myapp_queue': {
+            '()': 'myapp.log.queue_handler',
+            'filename': MYAPP_LOG_FILE,
+        },
+    },
+    'loggers': {
+        'myapp': {
+            'handlers': ['myapp_queue'],
+            'level': MYAPP_LOG_LEVEL,
+            'propagate': False,
+        },
+        'myapp.attendance': {
+            'filters': ['sample_attendance'],
+        },
+    },
+}
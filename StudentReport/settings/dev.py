@@ -0,0 +1,8 @@
+"""Development profile: the project's original local setup."""
+from .base import *  # noqa: F401,F403
+
+DEBUG = True
+
+INSTALLED_APPS += [
+    'django_extensions',
+]
@@ -0,0 +1,53 @@
+"""
+Production profile. Configure through the environment:
+
+    DJANGO_SECRET_KEY      required
+    DJANGO_ALLOWED_HOSTS   comma-separated host names
+    DJANGO_CONN_MAX_AGE    seconds a DB connection is reused (default 600)
+    DJANGO_REDIS_URL       shared cache; a file cache under BASE_DIR is used otherwise
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa: F401,F403
+from .base import BASE_DIR, DATABASES, TEMPLATES
+
+DEBUG = False
+
+if not os.environ.get('DJANGO_SECRET_KEY'):
+    raise ImproperlyConfigured("Set DJANGO_SECRET_KEY for the prod settings profile.")
+
+# Templates are parsed once per process instead of on every render
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Keep connections (and their SQLite PRAGMAs/page cache) across requests
+for _database in DATABASES.values():
+    _database['CONN_MAX_AGE'] = int(os.environ.get('DJANGO_CONN_MAX_AGE', 600))
+    _database['CONN_HEALTH_CHECKS'] = True
+
+# One cache shared by every worker process, so cached sessions and the
+# analytics cache stay consistent between workers
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / '.cache',
+        },
+    }
+
+# Session reads come from the cache; writes still go to the database
+SESSION_BASE_ENGINE = 'django.contrib.sessions.backends.cached_db'
@@ -16,8 +16,17 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from myapp import views as myapp_views
 
 urlpatterns = [
+    path('admin/profiling/', myapp_views.profiling_summary, name='profiling_summary'),
+    path('admin/branches/', myapp_views.branch_report, name='branch_report'),
+    path('admin/schedule/', myapp_views.batch_schedule, name='batch_schedule'),
+    path('admin/attendance-board/', myapp_views.attendance_board, name='attendance_board'),
+    path('admin/attendance-board/events', myapp_views.attendance_board_events, name='attendance_board_events'),
+    path('admin/analytics/', myapp_views.analytics_dashboard, name='analytics_dashboard'),
+    path('admin/analytics/<int:course_id>.json', myapp_views.analytics_json, name='analytics_json'),
     path('admin/', admin.site.urls),
+    path('metrics', myapp_views.metrics_view, name='metrics'),
     path('',include('myapp.urls'))
 ]
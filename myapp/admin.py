@@ -1,9 +1,24 @@
 from django.contrib import admin
 from django import forms
 from django.utils.translation import gettext_lazy as _
-from .models import Staff, Course, Student, CourseTopic, StudentTopicProgress, Attendance , StudentAttendance ,Batch
+from .models import Staff, Course, Student, CourseTopic, StudentTopicProgress, Attendance , StudentAttendance ,Batch, StudentAttendanceArchive, Branch, StudentRiskFlag
 from django.urls import path
 from django.http import JsonResponse
+from django.contrib import messages
+from django.contrib.admin import helpers
+from django.core.exceptions import ValidationError
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from . import live
+from .analytics import invalidate_course
+from .reassign import reassign_students
+from .bulk_edit import (
+    clear_progress_marks, mark_students_on, set_attendance_status, set_progress_dates,
+)
+from .staffing import batch_label, ranked_batches, ranked_staff, staff_label, suggest_assignment
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 # Customize admin site
@@ -34,10 +49,25 @@ class CourseWithStaffFilter(admin.SimpleListFilter):
 # Student Form (show staff in course name)
 # ----------------------------
 
+class StaffLoadChoiceField(forms.ModelChoiceField):
+    def label_from_instance(self, obj):
+        return staff_label(obj) if hasattr(obj, "active_students") else str(obj)
+
+
+class BatchLoadChoiceField(forms.ModelChoiceField):
+    def label_from_instance(self, obj):
+        return batch_label(obj) if hasattr(obj, "active_students") else str(obj)
+
+
 class StudentAdminForm(forms.ModelForm):
     course = forms.ModelChoiceField(queryset=Course.objects.all(), required=True)
-    staff = forms.ModelChoiceField(queryset=Staff.objects.none(), required=True)
-    batch = forms.ModelChoiceField(queryset=Batch.objects.none(), required=False)
+    # Ranked least-loaded first (myapp/staffing.py); required unless auto_assign
+    staff = StaffLoadChoiceField(queryset=Staff.objects.none(), required=False)
+    batch = BatchLoadChoiceField(queryset=Batch.objects.none(), required=False)
+    auto_assign = forms.BooleanField(
+        required=False,
+        help_text="Ignore staff and batch and assign the least-loaded staff member and their emptiest batch.",
+    )
 
     class Meta:
         model = Student
@@ -46,30 +76,96 @@ class StudentAdminForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        print(self.data.get('staff'))
         if 'course' in self.data:
-            print("Course in data:", self.data.get('course'))
+            logger.debug("StudentAdminForm bound with course=%s staff=%s", self.data.get('course'), self.data.get('staff'))
             try:
                 course_id = int(self.data.get('course'))
-                self.fields['staff'].queryset = Staff.objects.filter(courses__course_id=course_id)
+                self.fields['staff'].queryset = ranked_staff(course_id)
 
             except (ValueError, TypeError):
                 self.fields['staff'].queryset = Staff.objects.none()
         elif self.instance.pk and self.instance.course:
-            self.fields['staff'].queryset = self.instance.course.staffs.all()
+            self.fields['staff'].queryset = ranked_staff(self.instance.course_id)
         
         if 'staff' in self.data:
             try:
                 staff_id = int(self.data.get('staff'))
-                self.fields['batch'].queryset = Batch.objects.filter(staff_id=staff_id)
+                self.fields['batch'].queryset = ranked_batches(staff_id)
             except (ValueError, TypeError):
                 self.fields['batch'].queryset = Batch.objects.none()
         elif self.instance.pk and self.instance.staff:
-            self.fields['batch'].queryset = Batch.objects.filter(staff=self.instance.staff)
+            self.fields['batch'].queryset = ranked_batches(self.instance.staff_id)
         else:
             # Add this: no staff selected -> empty queryset
             self.fields['batch'].queryset = Batch.objects.none()
 
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('auto_assign') and cleaned.get('course'):
+            staff, batch = suggest_assignment(cleaned['course'].pk)
+            if staff is None:
+                self.add_error('course', "No staff member teaches this course.")
+            else:
+                cleaned['staff'], cleaned['batch'] = staff, batch
+                self.errors.pop('staff', None)
+                self.errors.pop('batch', None)
+        elif not cleaned.get('staff') and 'staff' not in self.errors:
+            self.add_error('staff', self.fields['staff'].error_messages['required'])
+        return cleaned
+
+def bulk_action_page(model_admin, request, queryset, form, action, title):
+    """Intermediate page of an admin action that needs input; posts back with apply=1."""
+    select_across = request.POST.get('select_across') == '1'
+    return TemplateResponse(request, 'bulk_action.html', {
+        **model_admin.admin_site.each_context(request),
+        'title': title,
+        'opts': model_admin.model._meta,
+        'form': form,
+        'action': action,
+        # The changelist always posts select_across ("0" or "1"); the template must not test the raw string
+        'select_across': select_across,
+        # With "select all", the admin rebuilds the filtered queryset itself
+        'selected_ids': list(queryset.values_list('pk', flat=True)[:1] if select_across else
+                             queryset.values_list('pk', flat=True)),
+        'selection_count': queryset.count() if select_across else None,
+        'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+    })
+
+
+class AttendanceMarkForm(forms.Form):
+    date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    status = forms.TypedChoiceField(
+        choices=[('True', 'Present'), ('False', 'Absent'), ('', 'No mark')],
+        coerce=lambda v: v == 'True', empty_value=None, required=False,
+    )
+
+
+class ProgressDatesForm(forms.Form):
+    start_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    clear_end_date = forms.BooleanField(required=False, help_text="Mark the topics as not finished.")
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('end_date') and cleaned.get('clear_end_date'):
+            raise ValidationError("Either set an end date or clear it, not both.")
+        return cleaned
+
+
+class BulkReassignForm(forms.Form):
+    staff = forms.ModelChoiceField(queryset=Staff.objects.order_by('staff_name'), required=False,
+                                   help_text="Leave empty to keep the current staff (or use the batch's staff).")
+    batch = forms.ModelChoiceField(queryset=Batch.objects.select_related('staff').order_by('staff__staff_name', 'start_time'),
+                                   required=False)
+    mode = forms.TypedChoiceField(choices=[('', 'Keep current mode')] + [(str(v), l) for v, l in Student.MODE_CHOICES],
+                                  coerce=lambda v: v == 'True', empty_value=None, required=False)
+
+    def clean(self):
+        cleaned = super().clean()
+        if not cleaned.get('staff') and not cleaned.get('batch') and cleaned.get('mode') is None:
+            raise ValidationError("Choose a staff member, a batch or a mode.")
+        return cleaned
+
 # ----------------------
 # staff Course Filter
 # ----------------------
@@ -107,13 +203,30 @@ class EmailDomainFilter(admin.SimpleListFilter):
 
 
 
+# ----------------------------
+# Branch Admin
+# ----------------------------
+@admin.register(Branch)
+class BranchAdmin(admin.ModelAdmin):
+    list_display = ('branch_id', 'name', 'code')
+    search_fields = ('name', 'code')
+
+    def has_delete_permission(self, request, obj=None):
+        # Branch rows are referenced from other databases, nothing can cascade there
+        return False
+
+
 # ----------------------------
 # Staff Admin
 # ----------------------------
 @admin.register(Staff)
 class StaffAdmin(admin.ModelAdmin):
-    list_display = ('staff_id', 'staff_name', 'contact', 'staff_email','get_courses')
+    list_display = ('staff_id', 'staff_name', 'contact', 'staff_email','get_courses', 'branch')
+    # Explicit, so the changelist never joins auth_user/myapp_branch, which
+    # are not in a branch database
+    list_select_related = ()
     list_filter = (
+        'branch',
         'staff_id',
         'staff_name',
         StaffCourseFilter,     # NEW FILTER 1
@@ -131,7 +244,7 @@ class StaffAdmin(admin.ModelAdmin):
 # ----------------------------
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('course_id', 'course_name', 'get_staff_names')
+    list_display = ('course_id', 'course_name', 'get_staff_names', 'branch')
     list_filter = ('course_name',)
     def get_staff_names(self, obj):
         return ", ".join([s.staff_name for s in obj.staffs.all()])
@@ -169,6 +282,7 @@ class StudentAdmin(admin.ModelAdmin):
     list_display = ('student_id', 'student_name', 'join_date', 'course', 'staff')
     list_filter = (CourseWithStaffFilter,)
     search_fields = ('student_name',)
+    actions = ['reassign_selected', 'set_mode_offline', 'set_mode_online']
 
     class Media:
         js = ("myapp/student_admin_v2.js",)
@@ -181,37 +295,72 @@ class StudentAdmin(admin.ModelAdmin):
         ]
         return custom_urls + urls
 
+    @admin.action(description="Move selected students to another staff / batch / mode")
+    def reassign_selected(self, request, queryset):
+        form = BulkReassignForm(request.POST if 'apply' in request.POST else None)
+        if 'apply' in request.POST and form.is_valid():
+            changes = {k: v for k, v in form.cleaned_data.items() if v is not None}
+            try:
+                updated = reassign_students(queryset, **changes)
+            except ValidationError as exc:
+                self.message_user(request, " ".join(exc.messages), messages.ERROR)
+            else:
+                self.message_user(request, f"Updated {updated} student(s).", messages.SUCCESS)
+            return None
+        return bulk_action_page(self, request, queryset, form, 'reassign_selected', 'Reassign students')
+
+    @admin.action(description="Set selected students to Offline")
+    def set_mode_offline(self, request, queryset):
+        updated = reassign_students(queryset, mode=True)
+        self.message_user(request, f"{updated} student(s) set to Offline.", messages.SUCCESS)
+
+    @admin.action(description="Set selected students to Online")
+    def set_mode_online(self, request, queryset):
+        updated = reassign_students(queryset, mode=False)
+        self.message_user(request, f"{updated} student(s) set to Online.", messages.SUCCESS)
+
     def get_staff(self, request):
-        print(" get_staff called", request.GET)
+        logger.debug("get_staff called with %s", request.GET)
         course_id = request.GET.get('course_id')
         staff_list = []
         if course_id:
-            staffs = Staff.objects.filter(courses__course_id=course_id)
-            staff_list = [{"id": s.staff_id, "name": s.staff_name} for s in staffs]
+            try:
+                staffs = ranked_staff(int(course_id))
+            except (ValueError, TypeError):
+                return JsonResponse(staff_list, safe=False)
+            # Least loaded first; "name" carries the load for the dropdown
+            staff_list = [
+                {"id": s.staff_id, "name": staff_label(s), "active_students": s.active_students,
+                 "seats": s.seats, "batches": s.batch_count, "load": s.load}
+                for s in staffs
+            ]
         return JsonResponse(staff_list, safe=False)
     
     def get_batches(self, request):
         """AJAX: return batches for a single staff (filtered)."""   
         staff_id = request.GET.get('staff_id')
         batch_list = []
-        # debug log to server console
-        print("DEBUG get_batches called, raw staff_id:", repr(staff_id))
+        logger.debug("get_batches called, raw staff_id: %r", staff_id)
 
         if staff_id:
             try:
                 sid = int(staff_id)
             except (ValueError, TypeError):
-                print("DEBUG get_batches: invalid staff_id, returning empty")
+                logger.debug("get_batches: invalid staff_id, returning empty")
                 return JsonResponse(batch_list, safe=False)
 
             # ensure we only filter by staff id
-            batches = Batch.objects.filter(staff_id=sid).order_by('start_time')
-            print("DEBUG get_batches: matched batches (ids):", list(batches.values_list('batch_id', flat=True)))
-
-            batch_list = [{"id": b.batch_id, "name": str(b)} for b in batches]
+            batches = ranked_batches(sid)
+            batch_list = [
+                {"id": b.batch_id, "name": batch_label(b), "active_students": b.active_students,
+                 "seats": b.seats, "load": b.load}
+                for b in batches
+            ]
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("get_batches: matched batches (ids): %s", [b["id"] for b in batch_list])
 
         else:
-            print("DEBUG get_batches: no staff_id provided in request")
+            logger.debug("get_batches: no staff_id provided in request")
 
         return JsonResponse(batch_list, safe=False)
 
@@ -236,6 +385,7 @@ class CourseTopicAdmin(admin.ModelAdmin):
 @admin.register(Attendance)
 class AttendanceAdmin(admin.ModelAdmin):
     list_display = ("staff", "date", "time", "wifi_verified")
+    list_select_related = ("staff",)
     list_filter = ("staff", "date", "wifi_verified")
     search_fields = ("staff__staff_name",)
 
@@ -246,6 +396,48 @@ class StudentAttendanceAdmin(admin.ModelAdmin):
     list_display = ("student", "student_course", "student_staff", "date", "status")
     list_filter = ("status", "date", "student__course__course_name", "student__staff__staff_name")
     search_fields = ("student__student_name", "student__staff__staff_name", "student__course__course_name")
+    actions = ["mark_present", "mark_absent", "clear_marks", "mark_students_on_date"]
+
+    # StudentAttendance has no post_delete receiver (it would disable fast deletes)
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        live.marks_changed([obj.student_id], obj.date)
+
+    def delete_queryset(self, request, queryset):
+        today = timezone.localdate()
+        student_ids = list(queryset.filter(date=today).values_list('student_id', flat=True))
+        super().delete_queryset(request, queryset)
+        live.marks_changed(student_ids, today)
+
+    @admin.action(description="Mark selected rows Present")
+    def mark_present(self, request, queryset):
+        updated = set_attendance_status(queryset, True)
+        self.message_user(request, f"{updated} mark(s) set to Present.", messages.SUCCESS)
+
+    @admin.action(description="Mark selected rows Absent")
+    def mark_absent(self, request, queryset):
+        updated = set_attendance_status(queryset, False)
+        self.message_user(request, f"{updated} mark(s) set to Absent.", messages.SUCCESS)
+
+    @admin.action(description="Clear the marks of selected rows")
+    def clear_marks(self, request, queryset):
+        updated = set_attendance_status(queryset, None)
+        self.message_user(request, f"{updated} mark(s) cleared.", messages.SUCCESS)
+
+    @admin.action(description="Mark the selected rows' students on a date")
+    def mark_students_on_date(self, request, queryset):
+        form = AttendanceMarkForm(request.POST if 'apply' in request.POST else None)
+        if 'apply' in request.POST and form.is_valid():
+            student_ids = queryset.order_by().values_list('student_id', flat=True).distinct()
+            try:
+                marked = mark_students_on(student_ids, form.cleaned_data['date'], form.cleaned_data['status'])
+            except ValidationError as exc:
+                self.message_user(request, " ".join(exc.messages), messages.ERROR)
+            else:
+                self.message_user(request, f"Marked {marked} student(s) on {form.cleaned_data['date']}.",
+                                  messages.SUCCESS)
+            return None
+        return bulk_action_page(self, request, queryset, form, 'mark_students_on_date', 'Mark students on a date')
 
     def student_course(self, obj):
         return obj.student.course.course_name
@@ -256,12 +448,48 @@ class StudentAttendanceAdmin(admin.ModelAdmin):
     student_staff.admin_order_field = "student__staff__staff_name"
 
 
+@admin.register(StudentAttendanceArchive)
+class StudentAttendanceArchiveAdmin(admin.ModelAdmin):
+    list_display = ("student", "date", "status", "archived_at")
+    list_filter = ("status", "date")
+    search_fields = ("student__student_name",)
+    list_select_related = ("student",)
+
+    # Archived rows are history: read-only here, written by archive_attendance
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StudentRiskFlag)
+class StudentRiskFlagAdmin(admin.ModelAdmin):
+    list_display = ("student", "student_staff", "reason", "detail", "first_flagged", "computed_at")
+    list_filter = ("reason", "first_flagged", "student__staff")
+    search_fields = ("student__student_name",)
+    list_select_related = ("student", "student__staff")
+    ordering = ("first_flagged",)
+
+    def student_staff(self, obj):
+        return obj.student.staff.staff_name if obj.student.staff else "Unassigned"
+    student_staff.admin_order_field = "student__staff__staff_name"
+
+    # Rebuilt nightly by flag_at_risk_students; edits would be overwritten
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # --------------------------
 # BATCH ADMIN
 # --------------------------
 @admin.register(Batch)
 class BatchAdmin(admin.ModelAdmin):
-    list_display=("batch_id","staff","batch_name","start_time","end_time")
+    list_display=("batch_id","staff","batch_name","start_time","end_time","room","capacity")
+    list_select_related=("staff",)
     list_filter=("staff","start_time","end_time",)
     search_fields=("staff","start_time",)
 
@@ -283,7 +511,39 @@ class StudentTopicProgressAdmin(admin.ModelAdmin):
         'end_date', 
         'sign'
     )
+    list_select_related = ('student__staff', 'topic__course')
     search_fields = ('student__student_name', 'topic__topic_name', 'sign')
+    actions = ['set_dates', 'clear_marks']
+
+    # No post_delete receiver on this table (it would disable fast deletes)
+    def delete_model(self, request, obj):
+        course_id = obj.topic.course_id
+        super().delete_model(request, obj)
+        invalidate_course(course_id)
+
+    def delete_queryset(self, request, queryset):
+        course_ids = set(queryset.order_by().values_list('topic__course_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        for course_id in course_ids:
+            invalidate_course(course_id)
+
+    @admin.action(description="Set start / end dates of selected rows")
+    def set_dates(self, request, queryset):
+        form = ProgressDatesForm(request.POST if 'apply' in request.POST else None)
+        if 'apply' in request.POST and form.is_valid():
+            try:
+                updated = set_progress_dates(queryset, **form.cleaned_data)
+            except ValidationError as exc:
+                self.message_user(request, " ".join(exc.messages), messages.ERROR)
+            else:
+                self.message_user(request, f"Updated {updated} progress row(s).", messages.SUCCESS)
+            return None
+        return bulk_action_page(self, request, queryset, form, 'set_dates', 'Set progress dates')
+
+    @admin.action(description="Clear the marks of selected rows")
+    def clear_marks(self, request, queryset):
+        updated = clear_progress_marks(queryset)
+        self.message_user(request, f"Cleared marks of {updated} progress row(s).", messages.SUCCESS)
 
     def student_name(self, obj):
         return obj.student.student_name
@@ -0,0 +1,204 @@
+# myapp/analytics.py
+"""
+Course analytics over StudentTopicProgress.
+
+Each course's progress rows are pulled with one ``values_list`` query into
+NumPy arrays; funnels, mark percentiles/histograms and staff comparisons are
+then computed with grouped ``bincount``/sort operations instead of Python
+loops. Results are cached per course and dropped whenever a progress row of
+that course is saved or deleted (see myapp/signals.py).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .middleware import record_cache_lookup
+from .models import CourseTopic, Staff, Student, StudentTopicProgress
+from .routers import current_alias
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - analytics pages report it instead
+    np = None
+
+PERCENTILES = (25, 50, 75, 90)
+MARK_BINS = 10  # 0-9, 10-19, ... 90-100
+
+
+class AnalyticsUnavailable(Exception):
+    pass
+
+
+def cache_key(course_id, using=None):
+    # Course ids repeat across branch databases
+    return f"myapp:analytics:{using or current_alias()}:course:{course_id}"
+
+
+def invalidate_course(course_id, using=None):
+    cache.delete(cache_key(course_id, using))
+
+
+def course_analytics(course_id):
+    """Cached analytics dict for one course (JSON-serialisable)."""
+    key = cache_key(course_id)
+    result = cache.get(key)
+    record_cache_lookup(result is not None)
+    if result is None:
+        result = compute_course_analytics(course_id)
+        cache.set(key, result, getattr(settings, "ANALYTICS_CACHE_SECONDS", 600))
+    return result
+
+
+def _grouped_percentiles(groups, values, n_groups, percentiles):
+    """
+    Percentiles of ``values`` per group, linear interpolation like np.percentile.
+    Returns an (n_groups, len(percentiles)) array, NaN for empty groups.
+    """
+    order = np.lexsort((values, groups))
+    values = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    out = np.full((n_groups, len(percentiles)), np.nan)
+    has = counts > 0
+    for j, p in enumerate(percentiles):
+        pos = starts[has] + (counts[has] - 1) * (p / 100.0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, starts[has] + counts[has] - 1)
+        frac = pos - lo
+        out[has, j] = values[lo] + (values[hi] - values[lo]) * frac
+    return out
+
+
+def _mean_by(groups, values, n_groups):
+    counts = np.bincount(groups, minlength=n_groups)
+    sums = np.bincount(groups, weights=values, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan), counts
+
+
+def _clean(array):
+    """NaN -> None and NumPy scalars -> Python, so the result is JSON-safe."""
+    return [None if v != v else round(float(v), 2) for v in array]
+
+
+def compute_course_analytics(course_id):
+    if np is None:
+        raise AnalyticsUnavailable("NumPy is required for course analytics (pip install numpy).")
+
+    topics = list(
+        CourseTopic.objects.filter(course_id=course_id)
+        .order_by("topic_id")
+        .values_list("topic_id", "module_name", "topic_name")
+    )
+    students = list(Student.objects.filter(course_id=course_id).values_list("student_id", "staff_id"))
+    rows = list(
+        StudentTopicProgress.objects.filter(topic__course_id=course_id, student__course_id=course_id)
+        .values_list("student_id", "topic_id", "start_date", "end_date", "marks")
+    )
+
+    n_topics = len(topics)
+    topic_ids = np.array([t[0] for t in topics], dtype=np.int64)
+    modules = list(dict.fromkeys(t[1] for t in topics))  # curriculum order
+    module_of_topic = np.array([modules.index(t[1]) for t in topics], dtype=np.int64)
+    n_modules = len(modules)
+    topics_per_module = np.bincount(module_of_topic, minlength=n_modules)
+
+    student_ids = np.array([s[0] for s in students], dtype=np.int64)
+    staff_of_student = np.array([s[1] or 0 for s in students], dtype=np.int64)
+    s_order = np.argsort(student_ids)
+    student_ids = student_ids[s_order]
+    staff_of_student = staff_of_student[s_order]
+    n_students = len(student_ids)
+
+    if rows:
+        row_student, row_topic, start, end, marks = zip(*rows)
+        row_student = np.searchsorted(student_ids, np.array(row_student, dtype=np.int64))
+        row_topic = np.searchsorted(topic_ids, np.array(row_topic, dtype=np.int64))
+        started = np.array([d is not None for d in start])
+        completed = np.array([d is not None for d in end])
+        days = np.array(
+            [(e - s).days if (s and e) else np.nan for s, e in zip(start, end)], dtype=np.float64
+        )
+        marks = np.array([np.nan if m is None else m for m in marks], dtype=np.float64)
+    else:
+        row_student = row_topic = np.zeros(0, dtype=np.int64)
+        started = completed = np.zeros(0, dtype=bool)
+        days = marks = np.zeros(0, dtype=np.float64)
+
+    # --- topic funnel --------------------------------------------------
+    started_per_topic = np.bincount(row_topic[started], minlength=n_topics)
+    completed_per_topic = np.bincount(row_topic[completed], minlength=n_topics)
+    avg_days, _ = _mean_by(row_topic[~np.isnan(days)], days[~np.isnan(days)], n_topics)
+
+    # --- module funnel: a student completes a module when every topic in it is done
+    row_module = module_of_topic[row_topic]
+    done_key = row_student[completed] * n_modules + row_module[completed]
+    done_per_student_module = np.bincount(done_key, minlength=n_students * n_modules).reshape(
+        n_students, n_modules) if n_modules else np.zeros((n_students, 0), dtype=np.int64)
+    started_key = row_student[started] * n_modules + row_module[started]
+    started_per_student_module = np.bincount(started_key, minlength=n_students * n_modules).reshape(
+        n_students, n_modules) if n_modules else np.zeros((n_students, 0), dtype=np.int64)
+    module_completed = (done_per_student_module >= topics_per_module).sum(axis=0)
+    module_started = (started_per_student_module > 0).sum(axis=0)
+
+    # --- marks per topic -----------------------------------------------
+    has_marks = ~np.isnan(marks)
+    mark_topic = row_topic[has_marks]
+    mark_values = marks[has_marks]
+    topic_percentiles = _grouped_percentiles(mark_topic, mark_values, n_topics, PERCENTILES)
+    topic_mean, topic_mark_count = _mean_by(mark_topic, mark_values, n_topics)
+    bins = np.clip((mark_values // (100 // MARK_BINS)).astype(np.int64), 0, MARK_BINS - 1)
+    histograms = np.bincount(mark_topic * MARK_BINS + bins, minlength=n_topics * MARK_BINS).reshape(
+        n_topics, MARK_BINS)
+
+    # --- staff comparison ----------------------------------------------
+    staff_keys, staff_of_student_idx = np.unique(staff_of_student, return_inverse=True)
+    n_staff = len(staff_keys)
+    staff_students = np.bincount(staff_of_student_idx, minlength=n_staff)
+    row_staff = staff_of_student_idx[row_student] if n_students else np.zeros(0, dtype=np.int64)
+    staff_completed = np.bincount(row_staff[completed], minlength=n_staff)
+    staff_mean_marks, _ = _mean_by(row_staff[has_marks], mark_values, n_staff)
+    staff_marks_p50 = _grouped_percentiles(row_staff[has_marks], mark_values, n_staff, (50,))[:, 0]
+    names = dict(Staff.objects.filter(staff_id__in=staff_keys.tolist()).values_list("staff_id", "staff_name"))
+
+    return {
+        "course_id": course_id,
+        "students": n_students,
+        "topics": [
+            {
+                "topic_id": int(topic_ids[i]),
+                "module": topics[i][1],
+                "topic": topics[i][2],
+                "started": int(started_per_topic[i]),
+                "completed": int(completed_per_topic[i]),
+                "completion_rate": round(float(completed_per_topic[i]) / n_students, 4) if n_students else 0.0,
+                "avg_days": _clean([avg_days[i]])[0],
+                "marks_count": int(topic_mark_count[i]),
+                "marks_mean": _clean([topic_mean[i]])[0],
+                "marks_percentiles": dict(zip((f"p{p}" for p in PERCENTILES), _clean(topic_percentiles[i]))),
+                "marks_histogram": histograms[i].tolist(),
+            }
+            for i in range(n_topics)
+        ],
+        "modules": [
+            {
+                "module": modules[m],
+                "topics": int(topics_per_module[m]),
+                "started": int(module_started[m]),
+                "completed": int(module_completed[m]),
+            }
+            for m in range(n_modules)
+        ],
+        "staff": [
+            {
+                "staff_id": int(staff_keys[k]) or None,
+                "staff_name": names.get(int(staff_keys[k]), "Unassigned"),
+                "students": int(staff_students[k]),
+                "completion_rate": round(float(staff_completed[k]) / float(staff_students[k] * n_topics), 4)
+                if staff_students[k] and n_topics else 0.0,
+                "marks_mean": _clean([staff_mean_marks[k]])[0],
+                "marks_median": _clean([staff_marks_p50[k]])[0],
+            }
+            for k in range(n_staff)
+        ],
+        "histogram_bins": [f"{b * 10}-{b * 10 + 9}" for b in range(MARK_BINS)],
+    }
@@ -0,0 +1,80 @@
+# myapp/archive.py
+"""
+Attendance archival.
+
+Old StudentAttendance rows are moved to StudentAttendanceArchive so the hot
+table only holds recent history. Reports read both through
+``attendance_history`` and do not need to know where a row lives.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import StudentAttendance, StudentAttendanceArchive
+
+HISTORY_FIELDS = ("student_id", "date", "time", "status")
+
+
+def archive_cutoff(days=None):
+    """Attendance strictly before this date is eligible for archiving."""
+    if days is None:
+        days = getattr(settings, "ATTENDANCE_ARCHIVE_AFTER_DAYS", 365)
+    return timezone.localdate() - datetime.timedelta(days=days)
+
+
+def attendance_history(*conditions, **filters):
+    """
+    Hot and archived attendance as one queryset of HISTORY_FIELDS tuples.
+
+    ``conditions`` (Q objects) and ``filters`` are applied to both tables, e.g.
+    ``attendance_history(student_id=5, date__year=2024).order_by("date")``.
+    """
+    hot = StudentAttendance.objects.filter(*conditions, **filters).values_list(*HISTORY_FIELDS)
+    cold = StudentAttendanceArchive.objects.filter(*conditions, **filters).values_list(*HISTORY_FIELDS)
+    return hot.union(cold, all=True)
+
+
+def archive_window(start, end):
+    """Move attendance with start <= date < end into the archive. Returns rows moved."""
+    connection = connections[router.db_for_write(StudentAttendance)]  # current branch database
+    hot_table = connection.ops.quote_name(StudentAttendance._meta.db_table)
+    cold_table = connection.ops.quote_name(StudentAttendanceArchive._meta.db_table)
+    qn = connection.ops.quote_name
+    cols = ", ".join(qn(c) for c in ("student_id", "date", "time", "status"))
+    adapt = connection.ops.adapt_datefield_value
+
+    with transaction.atomic(using=connection.alias):
+        # A day re-marked after it was archived: the hot row is newer and wins
+        StudentAttendanceArchive.objects.filter(date__gte=start, date__lt=end).filter(
+            Exists(StudentAttendance.objects.filter(student_id=OuterRef("student_id"), date=OuterRef("date")))
+        ).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {cold_table} ({cols}, {qn('archived_at')}) "
+                f"SELECT {cols}, %s FROM {hot_table} WHERE {qn('date')} >= %s AND {qn('date')} < %s",
+                [connection.ops.adapt_datetimefield_value(timezone.now()), adapt(start), adapt(end)],
+            )
+            moved = cursor.rowcount
+        StudentAttendance.objects.filter(date__gte=start, date__lt=end).delete()
+    return moved
+
+
+def archive_attendance(cutoff, chunk_days=31):
+    """
+    Archive everything before ``cutoff`` in ``chunk_days`` windows.
+
+    Each window is its own short transaction so writers are only held up
+    for one window at a time. Yields (start, end, rows moved) per window.
+    """
+    oldest = StudentAttendance.objects.filter(date__lt=cutoff).order_by("date").values_list("date", flat=True).first()
+    if oldest is None:
+        return
+    step = datetime.timedelta(days=chunk_days)
+    start = oldest
+    while start < cutoff:
+        end = min(start + step, cutoff)
+        yield start, end, archive_window(start, end)
+        start = end
@@ -0,0 +1,115 @@
+# myapp/attendance_sync.py
+"""
+Batched, idempotent attendance sync for marks queued offline on the
+attendance page. Every entry carries a client-generated ``client_id``;
+entries already applied are reported as duplicates and skipped, the rest
+are validated in bulk and written with one upsert. A ``client_id`` that
+appears more than once in one request is rejected: none of its entries is
+applied, since results are keyed by ``client_id``.
+"""
+import logging
+from collections import Counter
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import live, metrics
+from .models import AttendanceSyncReceipt, Batch, Student, StudentAttendance
+
+logger = logging.getLogger("myapp.attendance")
+
+MAX_ENTRIES = 2000
+STATUS_VALUES = {"present": True, "absent": False}
+
+
+def apply_attendance_entries(staff, entries):
+    """
+    Apply ``entries`` (dicts with client_id, batch_id, student_id, date, status)
+    for ``staff``. Returns one result dict per entry, in request order.
+    """
+    today = timezone.localdate()
+    results = {}
+    order = []
+
+    client_ids = [str(e.get("client_id") or "") for e in entries]
+    repeated = {c for c, n in Counter(client_ids).items() if c and n > 1}
+    seen = set(
+        AttendanceSyncReceipt.objects.filter(client_id__in=[c for c in client_ids if c])
+        .values_list("client_id", flat=True)
+    )
+    batch_ids = set(Batch.objects.filter(staff=staff).values_list("batch_id", flat=True))
+    student_batch = dict(
+        Student.objects.filter(staff=staff, pk__in=[_as_int(e.get("student_id")) for e in entries])
+        .values_list("student_id", "batch_id")
+    )
+
+    pending = {}  # (student_id, date) -> (client_id, status); last entry wins
+    accepted = []
+    for entry, client_id in zip(entries, client_ids):
+        order.append(client_id)
+        if not client_id:
+            results[client_id] = {"client_id": client_id, "ok": False, "error": "missing client_id"}
+            continue
+        if client_id in seen:
+            results[client_id] = {"client_id": client_id, "ok": True, "duplicate": True}
+            continue
+        if client_id in repeated:
+            results[client_id] = {"client_id": client_id, "ok": False, "error": "client_id repeated in this request"}
+            continue
+        batch_id = _as_int(entry.get("batch_id"))
+        student_id = _as_int(entry.get("student_id"))
+        status = STATUS_VALUES.get(entry.get("status"))
+        try:
+            day = datetime.strptime(str(entry.get("date")), "%Y-%m-%d").date()
+        except ValueError:
+            day = None
+
+        error = None
+        if batch_id not in batch_ids:
+            error = "unknown batch"
+        elif student_batch.get(student_id, -1) != batch_id:
+            error = "student not in this batch"
+        elif day is None or day > today:
+            error = "invalid date"
+        elif status is None:
+            error = "invalid status"
+        if error:
+            results[client_id] = {"client_id": client_id, "ok": False, "error": error}
+            continue
+
+        superseded = pending.get((student_id, day))
+        if superseded:
+            results[superseded[0]] = {"client_id": superseded[0], "ok": True, "superseded": True}
+        pending[(student_id, day)] = (client_id, status)
+        accepted.append(client_id)
+        seen.add(client_id)
+
+    if pending:
+        with transaction.atomic():
+            StudentAttendance.objects.bulk_create(
+                [StudentAttendance(student_id=s, date=d, status=status) for (s, d), (_, status) in pending.items()],
+                update_conflicts=True,
+                unique_fields=["student", "date"],
+                update_fields=["status", "updated_at"],
+            )
+            AttendanceSyncReceipt.objects.bulk_create(
+                [AttendanceSyncReceipt(client_id=c, staff=staff) for c in accepted],
+                ignore_conflicts=True,
+            )
+            # bulk_create sends no post_save; tell the live board directly
+            live.marks_changed([s for (s, d) in pending if d == today], today)
+        for client_id, _ in pending.values():
+            results[client_id] = {"client_id": client_id, "ok": True}
+        metrics.inc("myapp_attendance_marks_written_total", len(pending), source="sync")
+        logger.info("Synced %d attendance mark(s) for %s", len(pending), staff.staff_name,
+                    extra={"staff_id": staff.pk, "entries": len(entries), "applied": len(pending)})
+
+    return [results[c] for c in order]
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,467 @@
+# myapp/backup.py
+"""
+Snapshots of the SQLite databases for ``manage.py backup``.
+
+A full snapshot copies the live file with SQLite's online backup API.
+In rollback-journal mode the copy advances BACKUP_PAGES_PER_STEP pages
+at a time and sleeps BACKUP_STEP_SLEEP between steps, so a writer waits
+for one step at most, never for the whole copy. A write made during the
+copy restarts it, and after BACKUP_MAX_RESTARTS the backup gives up. In
+WAL mode readers don't block writers, so the copy is a single step from
+one consistent read. The copy is quick-checked, gzipped and described by
+a JSON manifest with its SHA-256.
+
+An incremental snapshot holds only the rows changed since the previous
+snapshot of the same database, as gzipped JSON lines:
+
+- tables with an ``updated_at`` column: rows updated since the previous
+  snapshot began, with a BACKUP_OVERLAP_SECONDS margin;
+- APPEND_ONLY_TABLES: rows with a key above the highest one seen;
+- any other table: all of its rows. These tables are small.
+
+For every table that is not copied whole, the snapshot also lists the id
+ranges still present. Rows deleted since the previous snapshot, such as
+archived attendance, are therefore removed again on restore.
+
+Deleting a batch or a staff member sets the foreign keys that pointed at
+it to NULL (on_delete=SET_NULL) without touching those rows' updated_at,
+and StudentBatchChange rows are otherwise never updated. An incremental
+can't see that change, so every snapshot records the row count of the
+tables in NULLED_ON_DELETE_TABLES, and when one of them lost rows since
+the previous snapshot, a full snapshot is taken instead.
+
+A restore checks the checksums of the whole chain (the full snapshot
+plus its incrementals). It then rebuilds the chain in a scratch file and
+runs integrity_check and foreign_key_check. Only after that is the
+result copied over the target database.
+"""
+import datetime
+import gzip
+import hashlib
+import json
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.apps import apps
+from django.db import connections
+from django.db.models import CASCADE, DO_NOTHING, PROTECT, RESTRICT
+from django.utils import timezone
+
+from . import metrics
+from .models import Attendance, AttendanceSyncReceipt, StudentAttendanceArchive, StudentBatchChange
+
+# Rows here are inserted, never updated: an incremental takes the keys above the last one seen
+APPEND_ONLY_TABLES = {
+    model._meta.db_table for model in (Attendance, AttendanceSyncReceipt, StudentAttendanceArchive, StudentBatchChange)
+} | {"django_admin_log"}
+
+# Deleting a row here rewrites rows of other tables (SET_NULL, SET_DEFAULT, SET) without changing updated_at
+NULLED_ON_DELETE_TABLES = {
+    field.related_model._meta.db_table
+    for model in apps.get_models() for field in model._meta.concrete_fields
+    if field.remote_field and field.remote_field.on_delete not in (CASCADE, DO_NOTHING, PROTECT, RESTRICT)
+}
+
+READ_CHUNK = 5000   # rows (or ids) per read transaction of an incremental
+WRITE_CHUNK = 1000  # rows per executemany on restore
+TIMESTAMP = "%Y-%m-%d %H:%M:%S.%f"  # how Django stores datetimes in SQLite
+
+
+class BackupError(Exception):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def backup_dir():
+    return Path(_setting("BACKUP_DIR", Path(settings.BASE_DIR) / "backups"))
+
+
+def database_path(alias):
+    database = settings.DATABASES[alias]
+    if database["ENGINE"] != "django.db.backends.sqlite3":
+        raise BackupError(f"Database '{alias}' is not SQLite.")
+    return Path(database["NAME"])
+
+
+def _connect(path, readonly=False):
+    target = f"{Path(path).resolve().as_uri()}?mode=ro" if readonly else str(path)
+    return sqlite3.connect(target, uri=readonly, isolation_level=None,
+                           timeout=_setting("SQLITE_OPTIONS", {}).get("timeout", 5))
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _tables(conn):
+    """{table: (columns, key)} of the user tables; key is the INTEGER PRIMARY KEY column, if any."""
+    tables = {}
+    for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"):
+        info = conn.execute(f"PRAGMA table_info({_quote(name)})").fetchall()
+        keys = [row[1] for row in info if row[5] and row[2].upper() == "INTEGER"]
+        tables[name] = ([row[1] for row in info], keys[0] if len(keys) == 1 else None)
+    return tables
+
+
+def schema_hash(conn):
+    sql = conn.execute("SELECT group_concat(sql, ';') FROM (SELECT sql FROM sqlite_master "
+                       "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY name)").fetchone()[0]
+    return hashlib.sha256((sql or "").encode()).hexdigest()
+
+
+def _check(conn, full=False):
+    pragma = "integrity_check" if full else "quick_check"
+    problems = [row[0] for row in conn.execute(f"PRAGMA {pragma}")]
+    if problems != ["ok"]:
+        raise BackupError(f"{pragma} failed: {'; '.join(problems[:5])}")
+    if full:
+        orphans = conn.execute("PRAGMA foreign_key_check").fetchall()
+        if orphans:
+            raise BackupError(f"{len(orphans)} rows reference missing rows, e.g. {orphans[0][0]} rowid {orphans[0][1]}.")
+
+
+# -- manifests ---------------------------------------------------------------
+
+def snapshots(alias=None):
+    """Manifests in BACKUP_DIR (of ``alias`` only, if given), oldest first."""
+    found = []
+    for path in backup_dir().glob("*.json"):
+        manifest = json.loads(path.read_text())
+        if alias is None or manifest["alias"] == alias:
+            found.append(manifest)
+    return sorted(found, key=lambda m: m["started"])
+
+
+def snapshot_chain(name, alias="default"):
+    """[full, incremental, ...] needed to restore snapshot ``name`` ("latest": newest of ``alias``)."""
+    manifests = {m["name"]: m for m in snapshots()}
+    if name == "latest":
+        own = snapshots(alias)
+        if not own:
+            raise BackupError(f"No snapshots of '{alias}' in {backup_dir()}.")
+        name = own[-1]["name"]
+    chain = []
+    while name:
+        if name not in manifests:
+            raise BackupError(f"Snapshot '{name}' is missing from {backup_dir()}.")
+        chain.append(manifests[name])
+        name = manifests[name]["parent"]
+    return chain[::-1]
+
+
+def _save_manifest(manifest):
+    path = backup_dir() / f"{manifest['name']}.json"
+    path.with_suffix(".tmp").write_text(json.dumps(manifest, indent=2))
+    path.with_suffix(".tmp").replace(path)
+
+
+def verify_files(chain):
+    """Raise BackupError unless every file of ``chain`` is present with its recorded checksum."""
+    for manifest in chain:
+        path = backup_dir() / manifest["file"]
+        if not path.exists():
+            raise BackupError(f"{path} is missing.")
+        if _sha256(path) != manifest["sha256"]:
+            raise BackupError(f"{path} does not match its checksum.")
+
+
+def prune(alias, keep):
+    """Delete all but the newest ``keep`` full snapshots of ``alias`` and their incrementals."""
+    manifests = snapshots(alias)
+    fulls = [m for m in manifests if m["kind"] == "full"]
+    if keep < 1 or len(fulls) <= keep:
+        return []
+    oldest_kept = fulls[-keep]["started"]
+    removed = [m for m in manifests if m["started"] < oldest_kept]
+    for manifest in removed:
+        (backup_dir() / manifest["file"]).unlink(missing_ok=True)
+        (backup_dir() / f"{manifest['name']}.json").unlink(missing_ok=True)
+    return [m["name"] for m in removed]
+
+
+# -- taking snapshots --------------------------------------------------------
+
+def online_copy(source, target):
+    """Copy database ``source`` into the new file ``target``; returns how often the copy restarted."""
+    src = _connect(source, readonly=True)
+    dst = _connect(target)
+    restarts = 0
+    last_remaining = None
+    max_restarts = _setting("BACKUP_MAX_RESTARTS", 20)
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            # Someone wrote to the source; SQLite starts the copy over
+            restarts += 1
+            if restarts > max_restarts:
+                raise BackupError(f"The copy restarted {restarts} times because of concurrent writes; "
+                                  "retry at a quieter time or switch the database to WAL mode.")
+        last_remaining = remaining
+
+    try:
+        wal = src.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        pages = -1 if wal else _setting("BACKUP_PAGES_PER_STEP", 1024)
+        src.backup(dst, pages=pages, progress=progress, sleep=_setting("BACKUP_STEP_SLEEP", 0.05))
+        _check(dst)
+    finally:
+        src.close()
+        dst.close()
+    return restarts
+
+
+def _append_max_ids(conn, tables):
+    return {
+        table: conn.execute(f"SELECT MAX({_quote(key)}) FROM {_quote(table)}").fetchone()[0] or 0
+        for table, (columns, key) in tables.items() if table in APPEND_ONLY_TABLES and key
+    }
+
+
+def _parent_rows(conn, tables, previous=None):
+    """
+    {table: [rows, max key, rows above the max key in ``previous``]} of the
+    NULLED_ON_DELETE_TABLES, one statement per table.
+    """
+    found = {}
+    for table in sorted(NULLED_ON_DELETE_TABLES):
+        key = tables.get(table, (None, None))[1]
+        if key:
+            last = (previous or {}).get(table, (0, 0))[1]
+            found[table] = list(conn.execute(
+                f"SELECT COUNT(*), COALESCE(MAX({_quote(key)}), 0), COALESCE(SUM({_quote(key)} > ?), 0) "
+                f"FROM {_quote(table)}", (last,)).fetchone())
+    return found
+
+
+def _lost_rows(previous, current):
+    """Whether a table of ``current`` holds fewer of the rows counted in ``previous`` (keys only grow)."""
+    return any(rows - added < previous.get(table, (0, 0))[0] for table, (rows, _, added) in current.items())
+
+
+def take_snapshot(alias="default", incremental=False):
+    """Write a snapshot of ``alias`` to BACKUP_DIR and return its manifest."""
+    source = database_path(alias)
+    parent = parents = None
+    if incremental:
+        own = snapshots(alias)
+        if own and len(snapshot_chain(own[-1]["name"])) <= _setting("BACKUP_MAX_CHAIN", 6):
+            parent = own[-1]
+        if parent:
+            conn = _connect(source, readonly=True)
+            try:
+                if schema_hash(conn) != parent["schema"]:
+                    parent = None  # migrated since: rows of the old schema can't be replayed
+                else:
+                    parents = _parent_rows(conn, _tables(conn), parent.get("parents"))
+                    if "parents" not in parent or _lost_rows(parent["parents"], parents):
+                        parent = None  # rows were set to NULL by a delete, with their old updated_at
+            finally:
+                conn.close()
+
+    started = timezone.now()
+    kind = "incremental" if parent else "full"
+    name = f"{alias}-{started:%Y%m%d-%H%M%S}-{kind}"
+    backup_dir().mkdir(parents=True, exist_ok=True)
+    clock = time.perf_counter()
+    try:
+        if parent:
+            manifest = _incremental(source, name, parent)
+            # Counted before any row was read, so a delete during the read shows up next time
+            manifest["parents"] = {table: found[:2] for table, found in parents.items()}
+        else:
+            manifest = _full(source, name)
+    except Exception:
+        metrics.inc("myapp_backups_total", kind=kind, outcome="failed")
+        raise
+    manifest.update(name=name, alias=alias, kind=kind, parent=parent["name"] if parent else None,
+                    started=started.strftime(TIMESTAMP), seconds=round(time.perf_counter() - clock, 2))
+    _save_manifest(manifest)
+    metrics.inc("myapp_backups_total", kind=kind, outcome="ok")
+    return manifest
+
+
+def _full(source, name):
+    target = backup_dir() / f"{name}.sqlite3.gz"
+    with tempfile.TemporaryDirectory(dir=backup_dir()) as scratch:
+        copy = Path(scratch) / "copy.sqlite3"
+        restarts = online_copy(source, copy)
+        conn = _connect(copy)
+        try:
+            tables = _tables(conn)
+            schema, max_ids = schema_hash(conn), _append_max_ids(conn, tables)
+            parents = {table: found[:2] for table, found in _parent_rows(conn, tables).items()}
+        finally:
+            conn.close()
+        with open(copy, "rb") as raw, gzip.open(target, "wb", compresslevel=_setting("BACKUP_COMPRESSLEVEL", 6)) as out:
+            shutil.copyfileobj(raw, out, 1 << 20)
+    return {"file": target.name, "sha256": _sha256(target), "bytes": target.stat().st_size,
+            "schema": schema, "max_ids": max_ids, "parents": parents, "restarts": restarts}
+
+
+def _id_ranges(conn, table, key):
+    """[[first, last], ...] runs of consecutive ids present in ``table``, read in chunks."""
+    ranges = []
+    last = -1
+    key = _quote(key)
+    while True:
+        ids = [row[0] for row in conn.execute(
+            f"SELECT {key} FROM {_quote(table)} WHERE {key} > ? ORDER BY {key} LIMIT ?", (last, READ_CHUNK))]
+        for pk in ids:
+            if ranges and ranges[-1][1] == pk - 1:
+                ranges[-1][1] = pk
+            else:
+                ranges.append([pk, pk])
+        if len(ids) < READ_CHUNK:
+            return ranges
+        last = ids[-1]
+        time.sleep(_setting("BACKUP_STEP_SLEEP", 0.05))
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {"hex": value.hex()}
+    raise TypeError(f"Cannot store {type(value).__name__} in a snapshot")
+
+
+def _incremental(source, name, parent):
+    since = (datetime.datetime.strptime(parent["started"], TIMESTAMP)
+             - datetime.timedelta(seconds=_setting("BACKUP_OVERLAP_SECONDS", 300))).strftime(TIMESTAMP)
+    target = backup_dir() / f"{name}.jsonl.gz"
+    conn = _connect(source, readonly=True)
+    counts, max_ids = {}, {}
+    try:
+        schema, tables = schema_hash(conn), _tables(conn)
+        with gzip.open(target, "wt", compresslevel=_setting("BACKUP_COMPRESSLEVEL", 6)) as out:
+            for table, (columns, key) in tables.items():
+                if key and "updated_at" in columns:
+                    mode, where, args = "changed", "updated_at >= ?", [since]
+                elif key and table in APPEND_ONLY_TABLES:
+                    mode, where, args = "append", f"{_quote(key)} > ?", [parent["max_ids"].get(table, 0)]
+                else:
+                    mode, where, args = "full", "1", []
+                header = {"table": table, "mode": mode, "columns": columns, "key": key}
+                if mode != "full":
+                    header["ids"] = _id_ranges(conn, table, key)
+                out.write(json.dumps(header) + "\n")
+                counts[table] = 0
+                for row in _changed_rows(conn, table, columns, key, where, args):
+                    out.write(json.dumps(row, default=_encode) + "\n")
+                    counts[table] += 1
+                if mode == "append":
+                    seen = header["ids"][-1][1] if header["ids"] else 0
+                    max_ids[table] = max(seen, parent["max_ids"].get(table, 0))
+    finally:
+        conn.close()
+    return {"file": target.name, "sha256": _sha256(target), "bytes": target.stat().st_size,
+            "schema": schema, "max_ids": max_ids, "rows": {t: n for t, n in counts.items() if n}}
+
+
+def _changed_rows(conn, table, columns, key, where, args):
+    select = f"SELECT {', '.join(map(_quote, columns))} FROM {_quote(table)}"
+    if not key:
+        yield from conn.execute(f"{select} WHERE {where}", args).fetchall()
+        return
+    position = columns.index(key)
+    last = -1
+    while True:
+        # Keyset chunks, each its own short read, so writers get in between
+        rows = conn.execute(f"{select} WHERE {where} AND {_quote(key)} > ? ORDER BY {_quote(key)} LIMIT ?",
+                            [*args, last, READ_CHUNK]).fetchall()
+        yield from rows
+        if len(rows) < READ_CHUNK:
+            return
+        last = rows[-1][position]
+        time.sleep(_setting("BACKUP_STEP_SLEEP", 0.05))
+
+
+# -- restoring ---------------------------------------------------------------
+
+def _decode(row):
+    return [bytes.fromhex(v["hex"]) if isinstance(v, dict) else v for v in row]
+
+
+def _apply_incremental(conn, manifest):
+    if schema_hash(conn) != manifest["schema"]:
+        raise BackupError(f"{manifest['name']} was taken with a different schema than its parent.")
+    conn.execute("BEGIN")
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS backup_ranges (lo INTEGER PRIMARY KEY, hi INTEGER)")
+    insert, batch = None, []
+    with gzip.open(backup_dir() / manifest["file"], "rt") as f:
+        for line in f:
+            item = json.loads(line)
+            if isinstance(item, list):
+                batch.append(_decode(item))
+                if len(batch) >= WRITE_CHUNK:
+                    conn.executemany(insert, batch)
+                    batch = []
+                continue
+            if batch:
+                conn.executemany(insert, batch)
+                batch = []
+            table = _quote(item["table"])
+            if item["mode"] == "full":
+                conn.execute(f"DELETE FROM {table}")
+            else:
+                # Drop the rows deleted since the parent: ids outside every present range
+                key = f"{table}.{_quote(item['key'])}"
+                conn.execute("DELETE FROM backup_ranges")
+                conn.executemany("INSERT INTO backup_ranges VALUES (?, ?)", item["ids"])
+                conn.execute(f"DELETE FROM {table} WHERE COALESCE((SELECT hi FROM backup_ranges "
+                             f"WHERE lo <= {key} ORDER BY lo DESC LIMIT 1), -1) < {key}")
+            insert = (f"INSERT OR REPLACE INTO {table} ({', '.join(map(_quote, item['columns']))}) "
+                      f"VALUES ({', '.join('?' * len(item['columns']))})")
+    if batch:
+        conn.executemany(insert, batch)
+    conn.execute("DROP TABLE backup_ranges")
+    conn.execute("COMMIT")
+
+
+def restore_snapshot(name, alias="default", into=None, dry_run=False):
+    """
+    Rebuild snapshot ``name`` and check it. Unless ``dry_run``, copy it
+    over ``into`` (a file path; default: the live database of ``alias``).
+    Returns the chain of manifests that was applied.
+    """
+    chain = snapshot_chain(name, alias)
+    if chain[0]["kind"] != "full":
+        raise BackupError(f"The chain of '{name}' does not start with a full snapshot.")
+    verify_files(chain)
+    with tempfile.TemporaryDirectory(dir=backup_dir()) as scratch:
+        work = Path(scratch) / "restore.sqlite3"
+        with gzip.open(backup_dir() / chain[0]["file"], "rb") as raw, open(work, "wb") as out:
+            shutil.copyfileobj(raw, out, 1 << 20)
+        conn = _connect(work)
+        try:
+            conn.execute("PRAGMA foreign_keys = OFF")
+            for manifest in chain[1:]:
+                _apply_incremental(conn, manifest)
+            _check(conn, full=True)
+            if not dry_run:
+                target = Path(into) if into else database_path(chain[0]["alias"])
+                if not into:
+                    connections[chain[0]["alias"]].close()
+                dst = _connect(target)
+                try:
+                    conn.backup(dst)  # one step: the target is locked only while its pages are replaced
+                finally:
+                    dst.close()
+        finally:
+            conn.close()
+    metrics.inc("myapp_backup_restores_total", outcome="checked" if dry_run else "restored")
+    return chain
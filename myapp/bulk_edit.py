@@ -0,0 +1,113 @@
+# myapp/bulk_edit.py
+"""
+Set-based attendance and progress edits for the admin actions. Each call
+validates the whole selection with one query and then writes it with a
+single UPDATE (or one upsert), so a filtered selection of thousands of
+rows costs a handful of statements.
+"""
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+
+from . import live, metrics
+from .analytics import invalidate_course
+from .models import CourseTopic, StudentAttendance
+from .writes import run_write
+
+UPSERT_BATCH_SIZE = 500
+
+
+def set_attendance_status(queryset, status):
+    """Set (or clear, with None) the status of the selected StudentAttendance rows."""
+    def update():
+        # .update() sends no post_save; tell the live board directly
+        today = timezone.localdate()
+        live.marks_changed(queryset.filter(date=today).values_list("student_id", flat=True), today)
+        return queryset.update(status=status, updated_at=timezone.now())
+
+    updated = run_write(update)
+    metrics.inc("myapp_attendance_marks_written_total", updated, source="admin")
+    return updated
+
+
+def mark_students_on(student_ids, day, status):
+    """Upsert one mark per student on ``day``; existing marks of that day are overwritten."""
+    if day > timezone.localdate():
+        raise ValidationError("Attendance cannot be marked for a future date.")
+    student_ids = sorted(set(student_ids))
+
+    def upsert():
+        now = timezone.now()
+        StudentAttendance.objects.bulk_create(
+            [StudentAttendance(student_id=pk, date=day, status=status, updated_at=now) for pk in student_ids],
+            update_conflicts=True,
+            unique_fields=["student", "date"],
+            update_fields=["status", "updated_at"],
+            batch_size=UPSERT_BATCH_SIZE,
+        )
+        live.marks_changed(student_ids, day)
+
+    run_write(upsert)
+    metrics.inc("myapp_attendance_marks_written_total", len(student_ids), source="admin")
+    return len(student_ids)
+
+
+def set_progress_dates(queryset, start_date=None, end_date=None, clear_end_date=False):
+    """
+    Set start and/or end dates of the selected StudentTopicProgress rows.
+
+    Applies the rules of StudentTopicProgress.clean to every row as it
+    would be after the change (end needs a start, start <= end); if any
+    row would break them nothing is written.
+    """
+    changes = {}
+    if start_date:
+        changes["start_date"] = start_date
+    if end_date:
+        changes["end_date"] = end_date
+    elif clear_end_date:
+        changes["end_date"] = None
+    if not changes:
+        raise ValidationError("Give a start date, an end date or clear the end date.")
+    if start_date and end_date and start_date > end_date:
+        raise ValidationError("Start Date cannot be greater than End Date.")
+
+    invalid = Q(pk__in=[])
+    if end_date and not start_date:
+        invalid = Q(start_date__isnull=True) | Q(start_date__gt=end_date)
+    elif start_date and "end_date" not in changes:
+        invalid = Q(end_date__lt=start_date)
+    bad = list(queryset.filter(invalid).select_related("student", "topic")[:6])
+    if bad:
+        total = queryset.filter(invalid).count() if len(bad) > 5 else len(bad)
+        examples = ", ".join(str(p) for p in bad[:5])
+        raise ValidationError(
+            f"{total} selected row(s) would end before they start or have an end date without a start date "
+            f"(e.g. {examples}). Nothing was changed."
+        )
+
+    changes["updated_at"] = timezone.now()
+    course_ids = _course_ids(queryset)
+    updated = run_write(queryset.update, **changes)
+    _after_progress_update(course_ids, updated)
+    return updated
+
+
+def clear_progress_marks(queryset):
+    course_ids = _course_ids(queryset)
+    updated = run_write(queryset.update, marks=None, updated_at=timezone.now())
+    _after_progress_update(course_ids, updated)
+    return updated
+
+
+def _course_ids(queryset):
+    return list(
+        CourseTopic.objects.filter(pk__in=queryset.values("topic_id")).values_list("course_id", flat=True).distinct()
+    )
+
+
+def _after_progress_update(course_ids, updated):
+    # .update() sends no post_save, so do what the signal receivers would
+    for course_id in course_ids:
+        invalidate_course(course_id)
+    metrics.inc("myapp_progress_rows_updated_total", updated)
@@ -0,0 +1,302 @@
+# myapp/columnar.py
+"""
+Columnar attendance snapshots (manage.py attendance_snapshot).
+
+Reports that look at months of attendance should not have to build a
+model object, or even a tuple, per StudentAttendance row. This module
+exports attendance, hot and archived, as one small file per batch and
+month under ATTENDANCE_SNAPSHOT_DIR/<database>/<YYYY-MM>/batch-<id>.att:
+
+    header        HEADER, padded to HEADER_SIZE bytes
+    student_ids   int64[students], sorted
+    marked        uint8[students, row_bytes]   bit set: status recorded
+    present       uint8[students, row_bytes]   bit set: present
+
+Day d of the month is bit d - 1 of a row, most significant bit first
+(np.packbits). Present, absent and unmarked are (present), (marked and
+not present) and (not marked). A batch of 40 students takes 64 + 320 + 2 x
+160 bytes a month. The file is opened with mmap and every array is a view
+of it, so nothing is copied until the bits are unpacked.
+
+A batch's students are the ones in it when the month is exported. Moves
+between batches are not replayed. index.json lists every month with a
+fingerprint of its rows (counts and last update of both attendance
+tables, plus batch membership). An export skips the months whose
+fingerprint has not changed. ``verify_month`` rebuilds a month from the
+database and compares it with the files.
+"""
+import calendar
+import datetime
+import hashlib
+import json
+import mmap
+import struct
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .archive import attendance_history
+from .models import Student, StudentAttendance, StudentAttendanceArchive
+from .routers import current_alias
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - the command reports it instead
+    np = None
+
+MAGIC = b"MYATT001"
+HEADER = struct.Struct("<8sHBBIII")  # magic, year, month, days, batch_id, students, row_bytes
+HEADER_SIZE = 64  # keeps the int64 ids aligned
+
+BatchAttendance = namedtuple("BatchAttendance", "batch_id start student_ids marked present")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _require_numpy():
+    if np is None:
+        raise SnapshotError("NumPy is required for attendance snapshots (pip install numpy).")
+
+
+def snapshot_dir(using=None):
+    root = getattr(settings, "ATTENDANCE_SNAPSHOT_DIR", Path(settings.BASE_DIR) / "attendance_snapshots")
+    return Path(root) / (using or current_alias())
+
+
+def month_key(year, month):
+    return f"{year:04d}-{month:02d}"
+
+
+def month_range(year, month):
+    days = calendar.monthrange(year, month)[1]
+    return datetime.date(year, month, 1), datetime.date(year, month, days)
+
+
+def read_index(using=None):
+    path = snapshot_dir(using) / "index.json"
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def _write_index(index, using=None):
+    path = snapshot_dir(using) / "index.json"
+    path.with_suffix(".tmp").write_text(json.dumps(index, indent=2, sort_keys=True))
+    path.with_suffix(".tmp").replace(path)
+
+
+def _sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+class MonthSnapshot:
+    """One batch-month file, mapped read-only; the arrays are views of the mapping."""
+
+    __slots__ = ("batch_id", "year", "month", "days", "student_ids", "marked_bits", "present_bits", "_map")
+
+    def __init__(self, path):
+        _require_numpy()
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.year, self.month, self.days, self.batch_id, students, row_bytes = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not an attendance snapshot.")
+        buffer = np.frombuffer(self._map, dtype=np.uint8)
+        ids_end = HEADER_SIZE + 8 * students
+        plane = students * row_bytes
+        self.student_ids = buffer[HEADER_SIZE:ids_end].view(np.int64)
+        self.marked_bits = buffer[ids_end:ids_end + plane].reshape(students, row_bytes)
+        self.present_bits = buffer[ids_end + plane:ids_end + 2 * plane].reshape(students, row_bytes)
+
+    @property
+    def start(self):
+        return datetime.date(self.year, self.month, 1)
+
+    def marked(self):
+        """bool[students, days]"""
+        return np.unpackbits(self.marked_bits, axis=1, count=self.days).view(bool)
+
+    def present(self):
+        return np.unpackbits(self.present_bits, axis=1, count=self.days).view(bool)
+
+    def counts(self):
+        """(marked days, present days) per student, counted on the packed bits."""
+        return _popcount(self.marked_bits), _popcount(self.present_bits)
+
+
+def _popcount(bits):
+    if hasattr(np, "bitwise_count"):  # NumPy 2
+        return np.bitwise_count(bits).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(bits, axis=1).sum(axis=1, dtype=np.int64)
+
+
+def _membership():
+    """{batch_id: sorted student ids} for every student in a batch."""
+    batches = {}
+    for student_id, batch_id in Student.objects.filter(batch__isnull=False).values_list("student_id", "batch_id"):
+        batches.setdefault(batch_id, []).append(student_id)
+    return {batch_id: sorted(ids) for batch_id, ids in batches.items()}
+
+
+def _fingerprint(first, last, membership):
+    hot = StudentAttendance.objects.filter(date__range=(first, last)).aggregate(n=Count("pk"), at=Max("updated_at"))
+    cold = StudentAttendanceArchive.objects.filter(date__range=(first, last)).aggregate(
+        n=Count("pk"), at=Max("archived_at"))
+    parts = [hot["n"], hot["at"], cold["n"], cold["at"], sorted(membership.items())]
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def build_month(year, month, membership=None):
+    """{batch_id: (student_ids, marked, present)} from the database; the planes are packed."""
+    _require_numpy()
+    membership = _membership() if membership is None else membership
+    first, last = month_range(year, month)
+    rows = list(
+        attendance_history(date__range=(first, last), status__isnull=False).iterator(chunk_size=20000)
+    )
+    # One plane for every batched student, grouped by batch, then cut into batches
+    batch_ids = sorted(membership)
+    all_ids = np.array([s for batch_id in batch_ids for s in membership[batch_id]], dtype=np.int64)
+    order = np.argsort(all_ids)
+    sorted_ids = all_ids[order]
+    marked = np.zeros((len(all_ids), last.day), dtype=bool)
+    present = np.zeros_like(marked)
+    if rows and len(all_ids):
+        row_student, row_date, _, row_status = zip(*rows)
+        row_student = np.array(row_student, dtype=np.int64)
+        index = np.searchsorted(sorted_ids, row_student)
+        # Students no longer in a batch are left out
+        known = (index < len(sorted_ids)) & (sorted_ids[np.minimum(index, len(sorted_ids) - 1)] == row_student)
+        row = order[index[known]]
+        day = np.fromiter((d.day - 1 for d in row_date), dtype=np.int64, count=len(row_date))[known]
+        marked[row, day] = True
+        present[row, day] = np.array(row_status, dtype=bool)[known]
+    marked, present = np.packbits(marked, axis=1), np.packbits(present, axis=1)
+    batches = {}
+    offset = 0
+    for batch_id in batch_ids:
+        n = len(membership[batch_id])
+        batches[batch_id] = (all_ids[offset:offset + n], marked[offset:offset + n], present[offset:offset + n])
+        offset += n
+    return batches
+
+
+def _write_file(path, year, month, batch_id, student_ids, marked, present):
+    header = HEADER.pack(MAGIC, year, month, month_range(year, month)[1].day, batch_id,
+                         len(student_ids), marked.shape[1])
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        f.write(student_ids.astype("<i8").tobytes())
+        f.write(marked.tobytes())
+        f.write(present.tobytes())
+    tmp.replace(path)
+
+
+def export_month(year, month, force=False, membership=None):
+    """
+    Write the current database's snapshot files of one month and return
+    its index entry, or None when its fingerprint has not changed.
+    """
+    _require_numpy()
+    membership = _membership() if membership is None else membership
+    key = month_key(year, month)
+    index = read_index()
+    fingerprint = _fingerprint(*month_range(year, month), membership)
+    if not force and index.get(key, {}).get("fingerprint") == fingerprint:
+        return None
+
+    directory = snapshot_dir() / key
+    directory.mkdir(parents=True, exist_ok=True)
+    batches = {}
+    for batch_id, (student_ids, marked, present) in build_month(year, month, membership).items():
+        path = directory / f"batch-{batch_id}.att"
+        _write_file(path, year, month, batch_id, student_ids, marked, present)
+        batches[str(batch_id)] = {
+            "file": f"{key}/{path.name}",
+            "students": len(student_ids),
+            "marked": int(_popcount(marked).sum()),
+            "present": int(_popcount(present).sum()),
+            "sha256": _sha256(path),
+        }
+    # Batches deleted since the last export
+    for path in directory.glob("batch-*.att"):
+        if path.stem.split("-", 1)[1] not in batches:
+            path.unlink()
+    entry = {"fingerprint": fingerprint, "exported_at": timezone.now().isoformat(), "batches": batches}
+    index[key] = entry
+    _write_index(index)
+    return entry
+
+
+def open_month(batch_id, year, month, using=None):
+    path = snapshot_dir(using) / month_key(year, month) / f"batch-{batch_id}.att"
+    if not path.exists():
+        raise SnapshotError(f"No snapshot of batch {batch_id} for {month_key(year, month)}; "
+                            "run manage.py attendance_snapshot.")
+    return MonthSnapshot(path)
+
+
+def month_span(start, end):
+    """(year, month) pairs from ``start``'s month to ``end``'s, inclusive."""
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def load_batch(batch_id, start, end, using=None):
+    """
+    BatchAttendance of ``batch_id`` for the months from ``start`` to
+    ``end``: bool[students, days] planes whose column 0 is the first day
+    of ``start``'s month. A student missing from a month is unmarked there.
+    """
+    months = [open_month(batch_id, year, month, using) for year, month in month_span(start, end)]
+    student_ids = np.unique(np.concatenate([m.student_ids for m in months])) if months else np.zeros(0, np.int64)
+    first = months[0].start if months else start.replace(day=1)
+    marked = np.zeros((len(student_ids), sum(m.days for m in months)), dtype=bool)
+    present = np.zeros_like(marked)
+    column = 0
+    for m in months:
+        rows = np.searchsorted(student_ids, m.student_ids)
+        marked[rows, column:column + m.days] = m.marked()
+        present[rows, column:column + m.days] = m.present()
+        column += m.days
+    return BatchAttendance(batch_id, first, student_ids, marked, present)
+
+
+def verify_month(year, month):
+    """Problems found comparing a month's files with the index and the current database; empty when they agree."""
+    _require_numpy()
+    key = month_key(year, month)
+    entry = read_index().get(key)
+    if entry is None:
+        return [f"{key}: not exported"]
+    problems = []
+    expected = build_month(year, month)
+    for batch_id in sorted(set(map(int, entry["batches"])) | set(expected)):
+        label = f"{key} batch {batch_id}"
+        listed = entry["batches"].get(str(batch_id))
+        if listed is None:
+            problems.append(f"{label}: in the database, not in the snapshot")
+            continue
+        if batch_id not in expected:
+            problems.append(f"{label}: in the snapshot, no longer in the database")
+            continue
+        path = snapshot_dir() / listed["file"]
+        if not path.exists() or _sha256(path) != listed["sha256"]:
+            problems.append(f"{label}: file missing or checksum mismatch")
+            continue
+        snapshot = MonthSnapshot(path)
+        student_ids, marked, present = expected[batch_id]
+        if not np.array_equal(snapshot.student_ids, student_ids):
+            problems.append(f"{label}: students differ ({len(snapshot.student_ids)} vs {len(student_ids)} now)")
+            continue
+        cells = int(_popcount((snapshot.marked_bits ^ marked) | (snapshot.present_bits ^ present)).sum())
+        if cells:
+            problems.append(f"{label}: {cells} student-days differ")
+    return problems
+
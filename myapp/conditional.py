@@ -0,0 +1,84 @@
+# myapp/conditional.py
+"""
+Conditional GET (ETag / Last-Modified -> 304) for the staff pages.
+
+A page declares what it is built from as querysets; ``page_state`` turns
+them into MAX(updated_at) and COUNT(*) scalar subqueries of one SELECT.
+The counts catch deletes, which MAX alone would miss. When the client's
+validators still match, the view is never called, so none of its queries
+or its template rendering run.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib import messages
+from django.db.models import DateTimeField, F, Func, IntegerField, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.utils.timezone import localdate
+
+
+def _scalar(queryset, function, field, output_field):
+    # A plain Func (not an Aggregate) keeps Django from adding GROUP BY
+    return Subquery(
+        queryset.order_by().values(v=Func(F(field), function=function, output_field=output_field)),
+        output_field=output_field,
+    )
+
+
+def page_state(base, **parts):
+    """
+    One SELECT over the single-row queryset ``base``, with the MAX/COUNT of
+    every ``parts`` queryset. Models with ``updated_at`` report their newest
+    change, the others their highest pk. Returns None when ``base`` is empty.
+    """
+    columns = {}
+    for name, queryset in parts.items():
+        if any(f.name == "updated_at" for f in queryset.model._meta.fields):
+            columns[f"{name}_max"] = _scalar(queryset, "MAX", "updated_at", DateTimeField())
+        else:
+            columns[f"{name}_max"] = _scalar(queryset, "MAX", "pk", IntegerField())
+        columns[f"{name}_count"] = _scalar(queryset, "COUNT", "pk", IntegerField())
+    fields = list(columns)
+    if any(f.name == "updated_at" for f in base.model._meta.fields):
+        fields.append("updated_at")
+    return base.annotate(**columns).values(*fields).first()
+
+
+def conditional_page(state_func):
+    """
+    Decorator for GET views: ``state_func(request, *args, **kwargs)`` returns
+    ``page_state(...)`` (or None to skip). Unchanged pages get a 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Pending flash messages are part of the page, so always render them
+            if request.method not in ("GET", "HEAD") or len(messages.get_messages(request)):
+                return view(request, *args, **kwargs)
+            state = state_func(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+
+            # The same data looks different per user, per day (active
+            # rosters) and per CSRF secret (forms embed the token).
+            key = repr((
+                sorted(state.items()), request.user.pk, localdate().isoformat(),
+                request.META.get("CSRF_COOKIE"),
+            ))
+            etag = '"%s"' % hashlib.md5(key.encode()).hexdigest()
+            stamps = [v for v in state.values() if hasattr(v, "timestamp")]
+            last_modified = int(max(stamps).timestamp()) if stamps else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    response.headers.setdefault("ETag", etag)
+                    if last_modified:
+                        response.headers.setdefault("Last-Modified", http_date(last_modified))
+            # Browsers must revalidate every time; shared caches must not store it
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,105 @@
+# myapp/curriculum.py
+"""
+Compiled curriculum of a course: its modules, each with its topics, in
+topic_id order. That is the order the topics were authored in; the name
+ordering of CourseTopic.Meta is only for the admin.
+
+Student pages read the curriculum on every request, but it rarely
+changes. So it is built once and kept at two levels: in the process and
+in the shared cache. Both copies are tagged with the course's version
+token, which lives in the shared cache. When a CourseTopic save or
+delete commits, the token is dropped (myapp/signals.py), so every
+process rebuilds on its next read. A read with a current process copy
+costs one cache get and no query.
+"""
+import threading
+import uuid
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .middleware import record_cache_lookup
+from .models import CourseTopic
+from .routers import current_alias
+
+Topic = namedtuple("Topic", "topic_id module_name topic_name")
+
+_compiled = {}  # (alias, course_id) -> Curriculum
+_lock = threading.Lock()
+
+
+class Curriculum:
+    """One course's topics as tuples; ``modules`` is ((module_name, (Topic, ...)), ...)."""
+
+    __slots__ = ("course_id", "version", "topics", "modules", "topics_by_id")
+
+    def __init__(self, course_id, version, rows):
+        self.course_id = course_id
+        self.version = version
+        self.topics = tuple(Topic(*row) for row in sorted(rows))
+        modules = {}
+        for topic in self.topics:
+            modules.setdefault(topic.module_name, []).append(topic)
+        self.modules = tuple((name, tuple(topics)) for name, topics in modules.items())
+        self.topics_by_id = MappingProxyType({topic.topic_id: topic for topic in self.topics})
+
+    def module(self, name):
+        return next((topics for module_name, topics in self.modules if module_name == name), ())
+
+    def with_progress(self, progress):
+        """[{"topic": Topic, "progress": row or None}] for every topic, joining ``progress`` rows in memory."""
+        by_topic = {p.topic_id: p for p in progress}
+        return [{"topic": topic, "progress": by_topic.get(topic.topic_id)} for topic in self.topics]
+
+
+def cache_key(course_id, using=None):
+    # Course ids repeat across branch databases
+    return f"myapp:curriculum:{using or current_alias()}:course:{course_id}"
+
+
+def curriculum(course_id, using=None):
+    """The current Curriculum of ``course_id``."""
+    using = using or current_alias()
+    key = cache_key(course_id, using)
+    version = cache.get(f"{key}:version")
+    compiled = _compiled.get((using, course_id))
+    if version is not None and compiled is not None and compiled.version == version:
+        record_cache_lookup(True)
+        return compiled
+
+    shared = cache.get(key) if version is not None else None
+    record_cache_lookup(shared is not None and shared[0] == version)
+    if shared is not None and shared[0] == version:
+        rows = shared[1]
+    else:
+        timeout = getattr(settings, "CURRICULUM_CACHE_SECONDS", 86400)
+        if version is None:
+            # Whoever adds the token first wins; everyone then builds under the same one
+            cache.add(f"{key}:version", uuid.uuid4().hex, timeout)
+            version = cache.get(f"{key}:version")
+        rows = list(
+            CourseTopic.objects.using(using).filter(course_id=course_id)
+            .values_list("topic_id", "module_name", "topic_name")
+        )
+        cache.set(key, (version, rows), timeout)
+    compiled = Curriculum(course_id, version, rows)
+    with _lock:
+        _compiled[(using, course_id)] = compiled
+    return compiled
+
+
+def invalidate_curriculum(course_id, using=None):
+    """Drop ``course_id``'s curriculum everywhere once the current transaction commits."""
+    using = using or current_alias()
+    key = cache_key(course_id, using)
+
+    def drop():
+        cache.delete_many([key, f"{key}:version"])
+        with _lock:
+            _compiled.pop((using, course_id), None)
+
+    # Not before: a reader could otherwise rebuild from the uncommitted old rows
+    transaction.on_commit(drop, using=using)
@@ -0,0 +1,76 @@
+# myapp/hashers.py
+"""
+Password hashing at shift start.
+
+Every staff member logs in within a few minutes, and each login verifies
+one password hash. Two things keep that burst affordable:
+
+* The cost is a setting. PASSWORD_HASHER picks the hasher that new hashes
+  use (settings/base.py), and PASSWORD_PBKDF2_ITERATIONS and
+  PASSWORD_SCRYPT_WORK_FACTOR set its cost. The hashers of the other
+  profiles stay listed, so existing hashes keep verifying. On a successful
+  login Django rewrites a hash that uses another hasher or cost, so
+  changing the profile migrates users as they log in.
+* ``hashing_slot`` bounds how many logins hash at once in a process
+  (LOGIN_CONCURRENCY). The rest wait at most LOGIN_QUEUE_SECONDS and are
+  then asked to retry, so a burst can't take every core and worker thread
+  away from attendance submissions.
+
+``manage.py bench_login`` measures logins per second per core for each
+profile.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """Django's PBKDF2-SHA256 with PASSWORD_PBKDF2_ITERATIONS; same algorithm name, so hashes are interchangeable."""
+
+    @property
+    def iterations(self):
+        return getattr(settings, "PASSWORD_PBKDF2_ITERATIONS", None) or hashers.PBKDF2PasswordHasher.iterations
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """Django's scrypt with PASSWORD_SCRYPT_WORK_FACTOR (a power of two)."""
+
+    @property
+    def work_factor(self):
+        return getattr(settings, "PASSWORD_SCRYPT_WORK_FACTOR", None) or hashers.ScryptPasswordHasher.work_factor
+
+
+def login_concurrency():
+    # Leave at least one core of every two to the other requests
+    return getattr(settings, "LOGIN_CONCURRENCY", None) or max(1, (os.cpu_count() or 1) // 2)
+
+
+def _semaphore():
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(login_concurrency())
+    return _slots
+
+
+@contextmanager
+def hashing_slot():
+    """
+    Yield True once this thread may hash a password, or False when no slot
+    freed up within LOGIN_QUEUE_SECONDS; the caller should then ask the
+    user to retry instead of hashing.
+    """
+    slots = _semaphore()
+    acquired = slots.acquire(timeout=getattr(settings, "LOGIN_QUEUE_SECONDS", 5))
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            slots.release()
@@ -0,0 +1,207 @@
+# myapp/live.py
+"""
+Live attendance board: writes of StudentAttendance and staff Attendance
+are pushed to open boards as Server-Sent Events, instead of admins
+re-running the changelist queries.
+
+Write sites report what changed. The signal receivers do it for single
+saves, and bulk writes and deletes call ``marks_changed`` themselves. After the
+transaction commits, the touched batches' counts for today are
+re-read with one query and published. An event always carries a batch's
+full numbers, never a delta, so a board that missed some events is still
+right after the next one.
+
+The broker is LIVE_BROKER (a dotted path). The default, InProcessBroker,
+fans events out to the streams of its own process. That is enough for a
+single ASGI worker. With several workers, use a broker with the same
+three methods that goes through a shared channel, e.g. Redis pub/sub:
+``publish(event)``, ``has_subscribers()`` (True whenever a remote worker
+might listen) and ``subscribe(last_id)``, which returns an object with
+``async next(timeout)`` and ``close()``.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Batch, Student, StudentAttendance, active_student_q
+from .routers import current_alias
+
+_broker = None
+_broker_lock = threading.Lock()
+_pending = threading.local()  # alias -> student ids whose batches changed in this thread's transaction
+
+
+class Subscription:
+    def __init__(self, broker, backlog):
+        self.broker = broker
+        self.backlog = deque(backlog)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=getattr(settings, "LIVE_QUEUE_SIZE", 1000))
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass  # a stalled client misses events; the next one for a batch carries its full numbers
+
+    async def next(self, timeout):
+        """The next event, or None after ``timeout`` seconds without one."""
+        if self.backlog:
+            return self.backlog.popleft()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Publishes to the subscriptions of this process; keeps the last LIVE_REPLAY events for reconnects."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._recent = deque(maxlen=getattr(settings, "LIVE_REPLAY", 200))
+        self._subscriptions = set()
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+    def publish(self, event):
+        with self._lock:
+            event = {**event, "id": next(self._ids)}
+            self._recent.append(event)
+            subscriptions = list(self._subscriptions)
+        # Writers run in worker threads; each stream's queue belongs to its event loop
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+        return event
+
+    def subscribe(self, last_id=None):
+        with self._lock:
+            backlog = [e for e in self._recent if last_id is not None and e["id"] > last_id]
+            subscription = Subscription(self, backlog)
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+
+def broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, "LIVE_BROKER", "myapp.live.InProcessBroker"))()
+    return _broker
+
+
+def board_rows(day, batch_ids=None, using=None):
+    """Marking progress of every batch (or of ``batch_ids``) on ``day``, in one SELECT."""
+    marks = (
+        StudentAttendance.objects.filter(active_student_q("student__", day), student__batch=OuterRef("pk"), date=day)
+        .order_by().values("student__batch")
+    )
+
+    def count(queryset):
+        return Coalesce(Subquery(queryset.annotate(n=Count("pk")).values("n"), output_field=IntegerField()), 0)
+
+    batches = Batch.objects.using(using or current_alias()).select_related("staff")
+    if batch_ids is not None:
+        batches = batches.filter(pk__in=batch_ids)
+    batches = batches.annotate(
+        student_count=Count("students", filter=active_student_q("students__", day)),
+        marked_count=count(marks.exclude(status__isnull=True)),
+        present_count=count(marks.filter(status=True)),
+    ).order_by("start_time", "batch_name")
+    return [
+        {
+            "batch_id": b.pk,
+            "batch": b.batch_name,
+            "staff": b.staff.staff_name,
+            "start": b.start_time.strftime("%H:%M"),
+            "end": b.end_time.strftime("%H:%M"),
+            "students": b.student_count,
+            "marked": b.marked_count,
+            "present": b.present_count,
+            "absent": b.marked_count - b.present_count,
+        }
+        for b in batches
+    ]
+
+
+def marks_changed(student_ids, day, using=None):
+    """
+    Report that attendance of ``student_ids`` on ``day`` was written.
+    Their batches are published once the current transaction commits,
+    however many rows it wrote. Only today's board is live.
+    """
+    if day != timezone.localdate() or not broker().has_subscribers():
+        return
+    using = using or current_alias()
+    if not hasattr(_pending, "ids"):
+        _pending.ids = {}
+    _pending.ids.setdefault(using, set()).update(student_ids)
+    # One callback per call is cheap; the first to run publishes everything pending
+    transaction.on_commit(lambda: _publish_pending(using, day), using=using, robust=True)
+
+
+def _publish_pending(using, day):
+    student_ids = getattr(_pending, "ids", {}).pop(using, None)
+    if not student_ids:
+        return
+    batch_ids = (
+        Student.objects.using(using).filter(pk__in=student_ids, batch__isnull=False)
+        .values_list("batch_id", flat=True).distinct()
+    )
+    for row in board_rows(day, batch_ids, using):
+        broker().publish({"type": "batch", "database": using, "date": day.isoformat(), "data": row})
+
+
+def staff_checked_in(attendance, using=None):
+    """Publish a staff Attendance row after it commits."""
+    if not broker().has_subscribers():
+        return
+    using = using or current_alias()
+    event = {
+        "type": "staff",
+        "database": using,
+        "date": attendance.date.isoformat(),
+        "data": {
+            "staff_id": attendance.staff_id,
+            "staff": attendance.staff.staff_name,
+            "time": attendance.time.strftime("%H:%M") if attendance.time else "",
+            "wifi_verified": attendance.wifi_verified,
+        },
+    }
+    transaction.on_commit(lambda: broker().publish(event), using=using, robust=True)
+
+
+async def event_stream(database, last_id=None):
+    """SSE lines for the events of ``database``; a comment every LIVE_HEARTBEAT_SECONDS keeps proxies from closing."""
+    subscription = broker().subscribe(last_id)
+    heartbeat = getattr(settings, "LIVE_HEARTBEAT_SECONDS", 15)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            event = await subscription.next(heartbeat)
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif event["database"] == database:
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        # Also runs when the server cancels the stream on disconnect
+        subscription.close()
@@ -0,0 +1,103 @@
+# myapp/log.py
+"""
+Logging helpers for myapp, wired up through settings.LOGGING.
+
+* ``StructuredFormatter`` - one JSON object per line, including any
+  ``extra={...}`` fields passed to the logging call.
+* ``SamplingFilter`` - keeps only a fraction of low-level records from
+  high-volume loggers (warnings and errors always pass).
+* ``queue_handler`` - a QueueHandler whose QueueListener does the JSON
+  formatting and the I/O on a background thread. Request threads still
+  interpolate the message (and format a traceback, if any) before the
+  ``queue.put``, because the arguments may change once the call returns.
+
+Subsystem loggers: myapp.views, myapp.attendance (sampled), myapp.signals,
+myapp.admin, myapp.models, myapp.profiling.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Attributes every LogRecord has; anything else came from ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Pass ``rate`` of the records at or below ``max_level``; everything above always passes."""
+
+    def __init__(self, rate=1.0, max_level="INFO"):
+        super().__init__()
+        self.rate = float(rate)
+        self.max_level = logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class _PreformattedQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Runs on the logging thread: resolve the message and traceback now,
+        # since args and exc_info may change after the call returns. The
+        # extra fields stay on the record for the listener's formatter.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listeners = []
+
+
+def queue_handler(filename=None, max_bytes=10 * 1024 * 1024, backups=5, stream=True, structured=True):
+    """
+    dictConfig factory: a QueueHandler feeding a background QueueListener
+    that writes to stderr and/or a rotating file.
+    """
+    formatter = StructuredFormatter() if structured else logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s %(message)s")
+    targets = []
+    if stream:
+        targets.append(logging.StreamHandler(sys.stderr))
+    if filename:
+        targets.append(RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backups, delay=True))
+    for target in targets:
+        target.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *targets, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return _PreformattedQueueHandler(log_queue)
+
+
+@atexit.register
+def _stop_listeners():
+    # Flush whatever is still queued before the interpreter exits
+    while _listeners:
+        _listeners.pop().stop()
@@ -0,0 +1,64 @@
+"""
+Move old StudentAttendance rows into StudentAttendanceArchive.
+
+    python manage.py archive_attendance                 # ATTENDANCE_ARCHIVE_AFTER_DAYS
+    python manage.py archive_attendance --days 180 --vacuum
+    python manage.py archive_attendance --database branch_chennai
+
+Every branch database is processed unless --database is given.
+"""
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from myapp.archive import archive_attendance, archive_cutoff
+from myapp.models import AttendanceSyncReceipt, StudentAttendance
+from myapp.routers import database_aliases, using_database
+
+
+class Command(BaseCommand):
+    help = "Archive student attendance older than the configured horizon."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None,
+                            help="Archive attendance older than this many days (default: ATTENDANCE_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument("--chunk-days", type=int, default=31,
+                            help="Days moved per transaction; smaller keeps write locks shorter.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many rows would move.")
+        parser.add_argument("--receipt-days", type=int, default=30,
+                            help="Also drop offline-sync receipts older than this many days.")
+        parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to give space back (SQLite).")
+        parser.add_argument("--database", default=None, help="Only this database alias (default: every branch database).")
+
+    def handle(self, *args, **options):
+        for alias in [options["database"]] if options["database"] else database_aliases():
+            if len(database_aliases()) > 1:
+                self.stdout.write(f"[{alias}]")
+            with using_database(alias):
+                self.archive(alias, options)
+
+    def archive(self, alias, options):
+        cutoff = archive_cutoff(options["days"])
+        if options["dry_run"]:
+            count = StudentAttendance.objects.filter(date__lt=cutoff).count()
+            self.stdout.write(f"{count} attendance rows before {cutoff} would be archived.")
+            return
+
+        total = 0
+        for start, end, moved in archive_attendance(cutoff, options["chunk_days"]):
+            total += moved
+            self.stdout.write(f"  {start} .. {end}: {moved} rows")
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} attendance rows before {cutoff}."))
+
+        # Clients never replay marks that old, so their receipts are no longer needed
+        stale = timezone.now() - datetime.timedelta(days=options["receipt_days"])
+        pruned, _ = AttendanceSyncReceipt.objects.filter(received_at__lt=stale).delete()
+        if pruned:
+            self.stdout.write(f"Pruned {pruned} attendance sync receipts.")
+
+        connection = connections[alias]
+        if options["vacuum"] and connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
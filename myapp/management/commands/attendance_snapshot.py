@@ -0,0 +1,99 @@
+"""
+Export student attendance as columnar snapshots, or check them against the database.
+
+    python manage.py attendance_snapshot                   # last ATTENDANCE_SNAPSHOT_MONTHS months, changed ones only
+    python manage.py attendance_snapshot --from 2024-06 --to 2025-05 --force
+    python manage.py attendance_snapshot --verify          # compare the files with the database
+    python manage.py attendance_snapshot --list
+
+Every branch database is processed unless --database is given. See
+myapp/columnar.py for the file format and how to load a batch's months.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from myapp.columnar import SnapshotError, export_month, month_key, month_span, read_index, verify_month
+from myapp.routers import database_aliases, using_database
+
+
+def parse_month(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise CommandError(f"Expected a month as YYYY-MM, got '{value}'.")
+
+
+class Command(BaseCommand):
+    help = "Write per-batch, per-month attendance bitsets for analytics, or verify them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", type=parse_month, default=None,
+                            help="First month, YYYY-MM (default: ATTENDANCE_SNAPSHOT_MONTHS back).")
+        parser.add_argument("--to", dest="end", type=parse_month, default=None,
+                            help="Last month, YYYY-MM (default: the current month).")
+        parser.add_argument("--force", action="store_true", help="Rewrite months whose rows have not changed.")
+        parser.add_argument("--verify", action="store_true", help="Compare the snapshots with the database instead.")
+        parser.add_argument("--list", action="store_true", help="List the exported months and exit.")
+        parser.add_argument("--database", default=None, help="Only this database alias (default: every branch database).")
+
+    def handle(self, *args, **options):
+        end = options["end"] or timezone.localdate()
+        start = options["start"]
+        if start is None:
+            months = getattr(settings, "ATTENDANCE_SNAPSHOT_MONTHS", 12)
+            index = end.year * 12 + end.month - months
+            start = datetime.date(index // 12, index % 12 + 1, 1)
+        if start > end:
+            raise CommandError("--from is after --to.")
+
+        failed = False
+        for alias in [options["database"]] if options["database"] else database_aliases():
+            if len(database_aliases()) > 1:
+                self.stdout.write(f"[{alias}]")
+            with using_database(alias):
+                try:
+                    if options["list"]:
+                        self.list()
+                    elif options["verify"]:
+                        failed |= self.verify(start, end)
+                    else:
+                        self.export(start, end, options["force"])
+                except SnapshotError as exc:
+                    raise CommandError(str(exc))
+        if failed:
+            raise CommandError("Snapshots differ from the database; re-export them with --force.")
+
+    def list(self):
+        for key, entry in sorted(read_index().items()):
+            batches = entry["batches"].values()
+            self.stdout.write(
+                f"{key}  {len(batches):>4} batches {sum(b['students'] for b in batches):>6} students "
+                f"{sum(b['marked'] for b in batches):>8} marks  exported {entry['exported_at'][:19]}"
+            )
+
+    def export(self, start, end, force):
+        written = 0
+        for year, month in month_span(start, end):
+            entry = export_month(year, month, force=force)
+            if entry is None:
+                self.stdout.write(f"  {month_key(year, month)}: unchanged")
+                continue
+            written += 1
+            batches = entry["batches"].values()
+            self.stdout.write(f"  {month_key(year, month)}: {len(batches)} batches, "
+                              f"{sum(b['marked'] for b in batches)} marks")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} month(s)."))
+
+    def verify(self, start, end):
+        problems = []
+        for year, month in month_span(start, end):
+            problems += verify_month(year, month)
+        for problem in problems:
+            self.stdout.write(self.style.ERROR(f"  {problem}"))
+        if not problems:
+            self.stdout.write(self.style.SUCCESS(f"Snapshots from {month_key(start.year, start.month)} to "
+                                                 f"{month_key(end.year, end.month)} match the database."))
+        return bool(problems)
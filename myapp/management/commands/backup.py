@@ -0,0 +1,83 @@
+"""
+Snapshot, verify and restore the SQLite databases (run nightly, e.g. from cron).
+
+    python manage.py backup                          # full snapshot of every database
+    python manage.py backup --incremental            # rows changed since the last snapshot
+    python manage.py backup --list
+    python manage.py backup --verify latest          # rebuild and check, change nothing
+    python manage.py backup --restore latest --database branch_chennai
+    python manage.py backup --restore default-20250914-020000-incremental --to /tmp/restored.sqlite3
+
+Snapshots go to BACKUP_DIR. After each backup, only the newest --keep
+full snapshots (BACKUP_KEEP) and their incrementals are kept. See
+myapp/backup.py for how the copy is throttled.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.backup import BackupError, prune, restore_snapshot, snapshots, take_snapshot
+from myapp.routers import database_aliases
+
+
+class Command(BaseCommand):
+    help = "Take throttled online snapshots of the SQLite databases, or verify and restore one."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=None, help="Only this database alias (default: every branch database).")
+        parser.add_argument("--incremental", action="store_true",
+                            help="Only rows changed since the previous snapshot (a full one when there is none).")
+        parser.add_argument("--keep", type=int, default=None, help="Full snapshots to keep (default: BACKUP_KEEP).")
+        parser.add_argument("--list", action="store_true", help="List the snapshots and exit.")
+        parser.add_argument("--verify", metavar="SNAPSHOT", help="Rebuild SNAPSHOT (or 'latest') and check it.")
+        parser.add_argument("--restore", metavar="SNAPSHOT", help="Rebuild SNAPSHOT (or 'latest'), check it and restore it.")
+        parser.add_argument("--to", metavar="PATH", help="With --restore: write the database here instead of over the live one.")
+        parser.add_argument("--noinput", "--no-input", action="store_false", dest="interactive",
+                            help="Don't ask before overwriting the live database.")
+
+    def handle(self, *args, **options):
+        try:
+            if options["list"]:
+                self.list(options["database"])
+            elif options["verify"] or options["restore"]:
+                self.restore(options)
+            else:
+                self.backup(options)
+        except BackupError as exc:
+            raise CommandError(str(exc))
+
+    def list(self, alias):
+        for m in snapshots(alias):
+            self.stdout.write(f"{m['name']:<40}{m['bytes'] / 2**20:8.1f} MB  {m['seconds']:6.1f}s"
+                              + (f"  parent {m['parent']}" if m["parent"] else ""))
+
+    def backup(self, options):
+        keep = options["keep"] if options["keep"] is not None else getattr(settings, "BACKUP_KEEP", 7)
+        for alias in [options["database"]] if options["database"] else database_aliases():
+            manifest = take_snapshot(alias, incremental=options["incremental"])
+            detail = (f"{sum(manifest['rows'].values())} changed rows" if manifest["kind"] == "incremental"
+                      else f"{manifest['restarts']} restarts")
+            self.stdout.write(self.style.SUCCESS(
+                f"{manifest['name']}: {manifest['bytes'] / 2**20:.1f} MB in {manifest['seconds']:.1f}s ({detail})"))
+            if options["incremental"] and manifest["kind"] == "full":
+                self.stdout.write("  (full snapshot: no usable parent, chain too long, schema changed, "
+                                  "or a batch or staff member was deleted)")
+            for name in prune(alias, keep):
+                self.stdout.write(f"  removed {name}")
+
+    def restore(self, options):
+        alias = options["database"] or "default"
+        name = options["verify"] or options["restore"]
+        dry_run = bool(options["verify"])
+        if not dry_run and not options["to"] and options["interactive"]:
+            answer = input(f"This replaces database '{alias}' with snapshot '{name}'. "
+                           "Stop the web workers first. Type 'yes' to continue: ")
+            if answer != "yes":
+                raise CommandError("Restore cancelled.")
+        chain = restore_snapshot(name, alias=alias, into=options["to"], dry_run=dry_run)
+        for manifest in chain:
+            self.stdout.write(f"  {manifest['name']}: checksum ok")
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"{chain[-1]['name']} rebuilds and passes integrity checks."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Restored {chain[-1]['name']} to {options['to'] or alias}."))
@@ -0,0 +1,129 @@
+"""
+Login throughput per password hasher profile (PASSWORD_HASHER_PROFILES).
+
+    python manage.py bench_login                          # current PASSWORD_HASHER
+    python manage.py bench_login --hashers pbkdf2,scrypt --seconds 3
+    python manage.py bench_login --threads 4 --staff 60   # scaling, and a shift-start burst
+
+Measures, per profile:
+  verify   one password check: the hasher alone, in --threads threads
+  login    a first login through staff_login: authenticate, session insert,
+           the user_logged_in receivers (attendance). In a transaction that
+           is rolled back, so nothing is kept.
+Rates are per core. With --staff, also estimates how long that many staff
+logging in at once wait for LOGIN_CONCURRENCY hashing slots. loadtest_rush
+measures the same burst against a running server, attendance included.
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from myapp.hashers import login_concurrency
+from myapp.models import Staff
+
+PASSWORD = "bench-login-Pa55word"
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measure password verifications and staff logins per second per core, per hasher profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hashers", default=settings.PASSWORD_HASHER,
+                            help=f"Comma-separated profiles: {', '.join(settings.PASSWORD_HASHER_PROFILES)}.")
+        parser.add_argument("--seconds", type=float, default=2.0, help="Duration of each measurement.")
+        parser.add_argument("--threads", type=int, default=1, help="Threads verifying at once.")
+        parser.add_argument("--staff", type=int, default=0, help="Estimate a burst of this many logins.")
+        parser.add_argument("--no-login", action="store_true", help="Only time the hasher.")
+
+    def handle(self, *args, **options):
+        profiles = [p.strip() for p in options["hashers"].split(",") if p.strip()]
+        unknown = set(profiles) - set(settings.PASSWORD_HASHER_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown hasher profile(s): {', '.join(sorted(unknown))}")
+        cores = os.cpu_count() or 1
+        self.stdout.write(f"{cores} cores, LOGIN_CONCURRENCY {login_concurrency()}")
+
+        for profile in profiles:
+            hashers = [settings.PASSWORD_HASHER_PROFILES[profile]] + [
+                h for h in settings.PASSWORD_HASHERS if h != settings.PASSWORD_HASHER_PROFILES[profile]
+            ]
+            with override_settings(PASSWORD_HASHER=profile, PASSWORD_HASHERS=hashers):
+                try:
+                    hasher = get_hasher()
+                    encoded = make_password(PASSWORD)
+                except ValueError as exc:  # the hasher's library is not installed
+                    self.stderr.write(f"[{profile}] skipped: {exc}")
+                    continue
+                cost = {k: v for k, v in hasher.safe_summary(encoded).items() if k not in ("salt", "hash")}
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"[{profile}] " + ", ".join(f"{k} {v}" for k, v in cost.items())
+                ))
+                per_core = self.time_verify(hasher, encoded, options["seconds"], options["threads"], cores)
+                if not options["no_login"]:
+                    per_core = self.time_login(options["seconds"])
+                if options["staff"]:
+                    # Slots beyond the core count don't add throughput
+                    rate = per_core * min(login_concurrency(), cores)
+                    self.stdout.write(
+                        f"  burst of {options['staff']} logins: last one done after ~{options['staff'] / rate:.1f}s"
+                    )
+
+    def time_verify(self, hasher, encoded, seconds, threads, cores):
+        counts = [0] * threads
+        deadline = time.perf_counter() + seconds
+
+        def loop(i):
+            while time.perf_counter() < deadline:
+                hasher.verify(PASSWORD, encoded)
+                counts[i] += 1
+
+        workers = [threading.Thread(target=loop, args=(i,)) for i in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        rate = sum(counts) / elapsed
+        per_core = rate / min(threads, cores)
+        self.stdout.write(
+            f"  verify {elapsed / max(1, sum(counts)) * min(threads, cores) * 1000:>8.1f}ms"
+            f"  {per_core:>7.1f}/s per core  ({rate:.1f}/s in {threads} thread{'s' if threads > 1 else ''})"
+        )
+        return per_core
+
+    def time_login(self, seconds):
+        host = next((h for h in settings.ALLOWED_HOSTS if h not in ("*",) and not h.startswith(".")), "localhost")
+        url = reverse("staff_login")
+        durations = []
+        try:
+            with transaction.atomic(), transaction.atomic(using=router.db_for_write(Staff)):
+                user = get_user_model().objects.create_user("bench-login", password=PASSWORD)
+                Staff.objects.create(user=user, staff_name="Bench Login", staff_email="bench-login@example.invalid")
+                deadline = time.perf_counter() + seconds
+                while time.perf_counter() < deadline or not durations:
+                    client = Client(HTTP_HOST=host)  # no cookies: a first login, like at shift start
+                    started = time.perf_counter()
+                    response = client.post(url, {"username": "bench-login", "password": PASSWORD})
+                    durations.append(time.perf_counter() - started)
+                    if response.status_code != 302:
+                        raise CommandError(f"Login returned {response.status_code}, expected a redirect")
+                raise Rollback
+        except Rollback:
+            pass
+        mean = sum(durations) / len(durations)
+        self.stdout.write(f"  login  {mean * 1000:>8.1f}ms  {1 / mean:>7.1f}/s per core  ({len(durations)} logins)")
+        return 1 / mean
@@ -0,0 +1,167 @@
+"""
+Cold-start benchmark: every run is a fresh interpreter.
+
+    python manage.py bench_startup                       # current DJANGO_ENV
+    python manage.py bench_startup --profiles dev,prod --runs 7
+    python manage.py bench_startup --save startup.json   # keep a baseline
+    python manage.py bench_startup --compare startup.json --tolerance 20
+
+Measures, per settings profile:
+  manage.py       wall time of `manage.py check` (interpreter + setup + checks)
+  setup           import Django and run django.setup()
+  wsgi            import StudentReport.wsgi (middleware chain, URLconf on first use)
+  first request   first GET through the WSGI handler (URLconf, templates, DB connect)
+  second request  the same GET again, for comparison
+--compare exits non-zero when a median is more than --tolerance percent slower.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+METRICS = ("manage_py", "setup", "wsgi", "first_request", "second_request")
+
+# Runs inside the child interpreter; prints one JSON line
+PROBE = r"""
+import io, json, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+from StudentReport.wsgi import application
+from django.conf import settings
+t2 = time.perf_counter()
+host = next((h for h in settings.ALLOWED_HOSTS if h not in ("*",) and not h.startswith(".")), "localhost")
+
+def get(path):
+    status = []
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SERVER_NAME": host,
+        "SERVER_PORT": "80", "HTTP_HOST": host, "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr,
+        "wsgi.url_scheme": "http", "wsgi.version": (1, 0), "wsgi.multithread": True,
+        "wsgi.multiprocess": True, "wsgi.run_once": False,
+    }
+    started = time.perf_counter()
+    body = application(environ, lambda s, h, e=None: status.append(s))
+    b"".join(body)
+    body.close()
+    return time.perf_counter() - started, status[0]
+
+first, status = get(sys.argv[1])
+second, _ = get(sys.argv[1])
+print(json.dumps({"setup": t1 - t0, "wsgi": t2 - t1, "first_request": first,
+                  "second_request": second, "status": status}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure manage.py/WSGI cold-start time and first-request latency per settings profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--profiles", default=os.environ.get("DJANGO_ENV", "dev"),
+                            help="Comma-separated DJANGO_ENV values to measure (default: current).")
+        parser.add_argument("--runs", type=int, default=5, help="Cold starts per profile.")
+        parser.add_argument("--path", default="/login/", help="Path requested through the WSGI handler.")
+        parser.add_argument("--save", help="Write the medians to this JSON file.")
+        parser.add_argument("--compare", help="Baseline JSON written by --save.")
+        parser.add_argument("--tolerance", type=float, default=15.0,
+                            help="Allowed slowdown in percent before --compare fails.")
+        parser.add_argument("--importtime", action="store_true",
+                            help="Also list the slowest imports of django.setup() (python -X importtime).")
+
+    def handle(self, *args, **options):
+        profiles = [p.strip() for p in options["profiles"].split(",") if p.strip()]
+        results = {}
+        for profile in profiles:
+            env = self.environment(profile)
+            samples = {name: [] for name in METRICS}
+            for _ in range(options["runs"]):
+                samples["manage_py"].append(self.time_manage_py(env))
+                probe = self.run_probe(env, options["path"])
+                if not probe["status"].startswith(("2", "3")):
+                    self.stderr.write(f"[{profile}] GET {options['path']} returned {probe['status']}")
+                for name in METRICS[1:]:
+                    samples[name].append(probe[name])
+            results[profile] = {name: statistics.median(values) for name, values in samples.items()}
+            self.report(profile, samples)
+            if options["importtime"]:
+                self.report_imports(env)
+
+        if options["save"]:
+            with open(options["save"], "w", encoding="utf-8") as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(f"Saved medians to {options['save']}")
+        if options["compare"]:
+            self.compare(results, options["compare"], options["tolerance"])
+
+    def environment(self, profile):
+        env = dict(os.environ, DJANGO_ENV=profile, DJANGO_SETTINGS_MODULE="StudentReport.settings")
+        if profile == "prod":
+            # Only so the profile can start; nothing is signed with it
+            env.setdefault("DJANGO_SECRET_KEY", "bench-startup-only")
+            env.setdefault("DJANGO_ALLOWED_HOSTS", "localhost")
+        return env
+
+    def time_manage_py(self, env):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "manage.py", "check"], cwd=settings.BASE_DIR, env=env,
+                              capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if proc.returncode:
+            raise CommandError(f"manage.py check failed:\n{proc.stderr}")
+        return elapsed
+
+    def run_probe(self, env, path):
+        proc = subprocess.run([sys.executable, "-c", PROBE, path], cwd=settings.BASE_DIR, env=env,
+                              capture_output=True, text=True)
+        if proc.returncode:
+            raise CommandError(f"Startup probe failed:\n{proc.stderr}")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    def report(self, profile, samples):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"[{profile}] {len(samples['setup'])} cold starts"))
+        self.stdout.write(f"  {'':16}{'median':>10}{'min':>10}{'max':>10}")
+        for name in METRICS:
+            values = [v * 1000 for v in samples[name]]
+            self.stdout.write(
+                f"  {name.replace('_', ' '):16}{statistics.median(values):>8.1f}ms"
+                f"{min(values):>8.1f}ms{max(values):>8.1f}ms"
+            )
+
+    def report_imports(self, env, top=15):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import django; django.setup()"],
+                              cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        rows = []
+        for line in proc.stderr.splitlines():
+            # "import time:   self [us] | cumulative | imported package"
+            parts = line.split("|")
+            if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+                continue
+            rows.append((int(parts[1]), parts[2].rstrip()))
+        self.stdout.write("  slowest imports (cumulative):")
+        for cumulative, module in sorted(rows, reverse=True)[:top]:
+            self.stdout.write(f"    {cumulative / 1000:>8.1f}ms {module}")
+
+    def compare(self, results, path, tolerance):
+        try:
+            with open(path, encoding="utf-8") as fh:
+                baseline = json.load(fh)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read baseline {path}: {exc}")
+        regressions = []
+        for profile, medians in results.items():
+            for name, value in medians.items():
+                before = baseline.get(profile, {}).get(name)
+                if before and value > before * (1 + tolerance / 100):
+                    regressions.append(
+                        f"{profile} {name}: {before * 1000:.1f}ms -> {value * 1000:.1f}ms "
+                        f"(+{(value / before - 1) * 100:.0f}%)"
+                    )
+        if regressions:
+            raise CommandError("Startup regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No startup regression beyond {tolerance:.0f}%."))
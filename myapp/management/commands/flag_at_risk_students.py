@@ -0,0 +1,44 @@
+"""
+Rebuild the at-risk student flags (run nightly, e.g. from cron).
+
+    python manage.py flag_at_risk_students
+    python manage.py flag_at_risk_students --dry-run
+    python manage.py flag_at_risk_students --database branch_chennai
+
+Thresholds are the RISK_* settings. Every branch database is processed
+unless --database is given.
+"""
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.risk import RiskUnavailable, detect_at_risk, store_flags
+from myapp.routers import database_aliases, using_database
+
+
+class Command(BaseCommand):
+    help = "Flag students with absence streaks, falling attendance or stalled progress."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report the flags; keep the stored ones.")
+        parser.add_argument("--database", default=None, help="Only this database alias (default: every branch database).")
+
+    def handle(self, *args, **options):
+        for alias in [options["database"]] if options["database"] else database_aliases():
+            if len(database_aliases()) > 1:
+                self.stdout.write(f"[{alias}]")
+            with using_database(alias):
+                started = time.perf_counter()
+                try:
+                    flags = detect_at_risk()
+                except RiskUnavailable as exc:
+                    raise CommandError(str(exc))
+                elapsed = time.perf_counter() - started
+                for reason, count in sorted(Counter(f.reason for f in flags).items()):
+                    self.stdout.write(f"  {reason}: {count}")
+                if options["dry_run"]:
+                    self.stdout.write(f"{len(flags)} flags found in {elapsed:.1f}s (dry run, nothing stored).")
+                    continue
+                stored = store_flags(flags)
+                self.stdout.write(self.style.SUCCESS(f"Stored {stored} flags ({elapsed:.1f}s to compute)."))
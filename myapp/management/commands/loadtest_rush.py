@@ -0,0 +1,252 @@
+"""
+Replay the morning staff rush against a running server.
+
+Each simulated staff member logs in through ``staff_login`` (which fires the
+``mark_attendance`` signal), opens the batch list and submits
+``mark_student_attendance`` for every one of their batches.
+
+    python manage.py loadtest_rush --staff 50 --password secret
+    python manage.py loadtest_rush --start-server --staff 20 --password secret
+
+Failed requests are counted by status. Which of them were lock errors is
+not in the response (only DEBUG's error page says so); the server counts
+them instead, so the run reads myapp_db_write_retries_total from /metrics
+before and after and reports the difference. /metrics must be reachable
+from here (METRICS_ALLOWED_IPS).
+"""
+import http.cookiejar
+import math
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.models import Batch, Staff, Student
+
+WRITE_RETRIES = re.compile(r'^myapp_db_write_retries_total\{outcome="(\w+)"\} (\S+)$', re.MULTILINE)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+class StaffClient:
+    """A cookie-keeping HTTP client playing one staff member."""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def cookie(self, name):
+        for cookie in self.cookies:
+            if cookie.name == name:
+                return cookie.value
+        return ""
+
+    def request(self, path, data=None):
+        url = self.base_url + path
+        body = None
+        headers = {"Referer": url}
+        if data is not None:
+            data = dict(data, csrfmiddlewaretoken=self.cookie("csrftoken"))
+            body = urllib.parse.urlencode(data).encode()
+        req = urllib.request.Request(url, data=body, headers=headers)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read()
+
+
+def write_retries(base_url, timeout):
+    """{outcome: count} of the server's myapp_db_write_retries_total, or None without /metrics."""
+    try:
+        with urllib.request.urlopen(base_url.rstrip("/") + "/metrics", timeout=timeout) as resp:
+            text = resp.read().decode()
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+    return Counter({outcome: float(value) for outcome, value in WRITE_RETRIES.findall(text)})
+
+
+class Command(BaseCommand):
+    help = "Simulate N staff logging in and marking student attendance at the same time."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the running server.")
+        parser.add_argument("--staff", type=int, default=20, help="Number of staff members to simulate.")
+        parser.add_argument("--password", required=True, help="Password shared by the simulated staff users.")
+        parser.add_argument("--reset-passwords", action="store_true",
+                            help="Set the password above on the selected staff users first (test databases only!).")
+        parser.add_argument("--ramp", type=float, default=0.0,
+                            help="Spread the logins over this many seconds (0 = all at once).")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--start-server", action="store_true",
+                            help="Start 'runserver --noreload' on --url's port for the duration of the run.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        staff_members = list(
+            Staff.objects.select_related("user").filter(batches__isnull=False).distinct()[:options["staff"]]
+        )
+        if not staff_members:
+            raise CommandError("No staff with batches found. Seed the database first (manage.py seed_data).")
+
+        if options["reset_passwords"]:
+            for staff in staff_members:
+                staff.user.set_password(options["password"])
+                staff.user.save(update_fields=["password"])
+
+        plans = self.build_plans(staff_members)
+        server = self.start_server(options["url"]) if options["start_server"] else None
+        try:
+            before = write_retries(options["url"], options["timeout"])
+            results = self.run(plans, options, rng)
+            after = write_retries(options["url"], options["timeout"])
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+        self.report(results, after - before if before is not None and after is not None else None)
+
+    def build_plans(self, staff_members):
+        """Per staff: username and {batch_id: [student_id, ...]} fetched up front."""
+        batches = defaultdict(dict)
+        for batch_id, staff_id in Batch.objects.filter(staff__in=staff_members).values_list("batch_id", "staff_id"):
+            batches[staff_id][batch_id] = []
+        for student_id, batch_id, staff_id in Student.objects.filter(
+            staff__in=staff_members, batch__isnull=False
+        ).values_list("student_id", "batch_id", "staff_id"):
+            if batch_id in batches[staff_id]:
+                batches[staff_id][batch_id].append(student_id)
+        return [(s.user.username, batches[s.staff_id]) for s in staff_members]
+
+    def start_server(self, url):
+        port = urllib.parse.urlparse(url).port or 8000
+        proc = subprocess.Popen(
+            [sys.executable, sys.argv[0], "runserver", "--noreload", f"127.0.0.1:{port}"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(url.rstrip("/") + "/login/", timeout=1).close()
+                return proc
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        proc.terminate()
+        raise CommandError(f"Server on port {port} did not come up.")
+
+    def run(self, plans, options, rng):
+        results = []  # (step, seconds, status, error_kind)
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(plans))
+        ramp = options["ramp"]
+        delays = [rng.uniform(0, ramp) if ramp else 0.0 for _ in plans]
+
+        def record(step, started, status, body, error=None):
+            elapsed = time.perf_counter() - started
+            if error is None and status >= 400:
+                error = f"HTTP {status}"
+            with lock:
+                results.append((step, elapsed, status, error))
+            return error is None
+
+        def worker(username, batches, delay):
+            client = StaffClient(options["url"], options["timeout"])
+            barrier.wait()
+            time.sleep(delay)
+            try:
+                started = time.perf_counter()
+                status, body = client.request("/login/")
+                if not record("login_page", started, status, body):
+                    return
+                started = time.perf_counter()
+                status, body = client.request("/login/", {"username": username, "password": options["password"]})
+                # A rejected login re-renders the form with 200 and no session
+                if not record("login", started, status, body,
+                              None if client.cookie("sessionid") else "login rejected"):
+                    return
+                for batch_id, student_ids in batches.items():
+                    path = f"/attendance/{batch_id}"
+                    started = time.perf_counter()
+                    status, body = client.request(path)
+                    if not record("attendance_page", started, status, body):
+                        continue
+                    data = {"date": time.strftime("%Y-%m-%d")}
+                    for student_id in student_ids:
+                        data[f"status_{student_id}"] = "present" if rng.random() < 0.9 else "absent"
+                    started = time.perf_counter()
+                    status, body = client.request(path, data)
+                    record("attendance_submit", started, status, body)
+            except (urllib.error.URLError, ConnectionError, TimeoutError) as exc:
+                with lock:
+                    results.append(("connection", 0.0, 0, type(exc).__name__))
+
+        self.stdout.write(f"Simulating {len(plans)} staff against {options['url']} ...")
+        threads = [
+            threading.Thread(target=worker, args=(username, batches, delay))
+            for (username, batches), delay in zip(plans, delays)
+        ]
+        self.wall_started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.wall_time = time.perf_counter() - self.wall_started
+        return results
+
+    def report(self, results, retries):
+        by_step = defaultdict(list)
+        errors = defaultdict(Counter)
+        for step, elapsed, status, error in results:
+            by_step[step].append(elapsed)
+            if error:
+                errors[step][error] += 1
+
+        self.stdout.write("")
+        self.stdout.write(f"{'step':<20}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+        for step in ("login_page", "login", "attendance_page", "attendance_submit", "connection"):
+            if step not in by_step:
+                continue
+            timings = sorted(by_step[step])
+            n_errors = sum(errors[step].values())
+            self.stdout.write(
+                f"{step:<20}{len(timings):>7}"
+                f"{percentile(timings, 50) * 1000:>10.1f}"
+                f"{percentile(timings, 95) * 1000:>10.1f}"
+                f"{percentile(timings, 99) * 1000:>10.1f}"
+                f"{n_errors:>9}"
+            )
+
+        total = len(results)
+        failed = sum(1 for r in results if r[3])
+        self.stdout.write("")
+        self.stdout.write(f"Requests: {total} in {self.wall_time:.2f}s "
+                          f"({total / self.wall_time if self.wall_time else 0:.1f} req/s)")
+        self.stdout.write(f"Error rate: {failed / total * 100 if total else 0:.2f}%")
+        if retries is None:
+            self.stdout.write("Lock errors: unknown, /metrics was not reachable (METRICS_ALLOWED_IPS).")
+        else:
+            self.stdout.write(f"Writes retried on a locked database: {int(retries['retried'])}")
+            if retries["gave_up"]:
+                self.stdout.write(self.style.WARNING(
+                    f"'database is locked' errors: {int(retries['gave_up'])} write(s) gave up after retrying "
+                    f"(each one a failed request above)"))
+        for step, counter in errors.items():
+            for kind, count in counter.most_common():
+                self.stdout.write(f"  {step}: {kind} x{count}")
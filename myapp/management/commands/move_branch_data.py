@@ -0,0 +1,103 @@
+"""
+Copy one branch's rows from "default" into its own database.
+
+    python manage.py migrate --database branch_chennai
+    python manage.py move_branch_data chennai            # copy
+    python manage.py move_branch_data chennai --delete   # copy, then remove from default
+
+The branch must already be listed in settings.BRANCH_DATABASES. Courses
+without a branch are shared, so they (and their topics) are copied into
+every branch database. Rows are inserted with their original primary keys
+and INSERT OR IGNORE, so re-running the command is safe.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.constants import OnConflict
+
+from myapp.models import (
+    Attendance, AttendanceSyncReceipt, Batch, Branch, Course, CourseTopic, Staff, Student,
+    StudentAttendance, StudentAttendanceArchive, StudentBatchChange, StudentRiskFlag, StudentTopicProgress,
+)
+
+CHUNK_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = "Copy a branch's data from the default database into its BRANCH_DATABASES entry."
+
+    def add_arguments(self, parser):
+        parser.add_argument("code", help="Branch.code")
+        parser.add_argument("--delete", action="store_true",
+                            help="Delete the branch's rows from default after copying (shared courses are kept).")
+
+    def handle(self, *args, **options):
+        code = options["code"]
+        alias = getattr(settings, "BRANCH_DATABASES", {}).get(code)
+        if not alias:
+            raise CommandError(f"'{code}' is not in settings.BRANCH_DATABASES.")
+        try:
+            branch = Branch.objects.using("default").get(code=code)
+        except Branch.DoesNotExist:
+            raise CommandError(f"No branch with code '{code}'.")
+
+        src = lambda model: model.objects.using("default")  # noqa: E731
+        staff = src(Staff).filter(branch=branch)
+        courses = src(Course).filter(Q(branch=branch) | Q(branch__isnull=True))
+        students = src(Student).filter(Q(branch=branch) | Q(staff__in=staff))
+        plan = [
+            (Course, courses),
+            (CourseTopic, src(CourseTopic).filter(course__in=courses)),
+            (Staff, staff),
+            (Staff.courses.through, src(Staff.courses.through).filter(staff__in=staff, course__in=courses)),
+            (Batch, src(Batch).filter(staff__in=staff)),
+            (Student, students),
+            (StudentAttendance, src(StudentAttendance).filter(student__in=students)),
+            (StudentAttendanceArchive, src(StudentAttendanceArchive).filter(student__in=students)),
+            (StudentTopicProgress, src(StudentTopicProgress).filter(student__in=students)),
+            (StudentBatchChange, src(StudentBatchChange).filter(student__in=students)),
+            (StudentRiskFlag, src(StudentRiskFlag).filter(student__in=students)),
+            (Attendance, src(Attendance).filter(staff__in=staff)),
+            (AttendanceSyncReceipt, src(AttendanceSyncReceipt).filter(staff__in=staff)),
+        ]
+
+        with transaction.atomic(using=alias):
+            for model, queryset in plan:
+                copied = self.copy(model, queryset, alias)
+                self.stdout.write(f"  {model._meta.label}: {copied} rows")
+
+        if options["delete"]:
+            with transaction.atomic(using="default"):
+                # Children go with their students/staff through CASCADE
+                students.delete()
+                staff.delete()
+                src(Course).filter(branch=branch).delete()
+            self.stdout.write("Removed the branch's rows from default.")
+        self.stdout.write(self.style.SUCCESS(f"Branch '{code}' copied to database '{alias}'."))
+
+    def copy(self, model, queryset, alias):
+        """Insert ``queryset``'s rows unchanged (pks, auto_now values) into ``alias``."""
+        target = connections[alias]
+        fields = model._meta.concrete_fields
+        qn = target.ops.quote_name
+        sql = "%s %s (%s) VALUES (%s) %s" % (
+            target.ops.insert_statement(on_conflict=OnConflict.IGNORE),
+            qn(model._meta.db_table),
+            ", ".join(qn(f.column) for f in fields),
+            ", ".join(["%s"] * len(fields)),
+            target.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None),
+        )
+        count = 0
+        chunk = []
+        with target.cursor() as cursor:
+            for row in queryset.values_list(*[f.attname for f in fields]).iterator(chunk_size=CHUNK_SIZE):
+                chunk.append([f.get_db_prep_save(v, target) for f, v in zip(fields, row)])
+                if len(chunk) >= CHUNK_SIZE:
+                    cursor.executemany(sql, chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                cursor.executemany(sql, chunk)
+                count += len(chunk)
+        return count
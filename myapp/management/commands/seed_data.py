@@ -0,0 +1,316 @@
+"""
+Fill the database with realistic synthetic data for benchmarks and profiling.
+
+    python manage.py seed_data --size medium
+    python manage.py seed_data --size large --clear --seed 7
+
+Small tables go through ``bulk_create``; attendance and progress (millions
+of rows at the larger sizes) are streamed with ``executemany`` in chunks.
+Neither path fires ``post_save``, so no "new student" emails are sent.
+"""
+import datetime
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from myapp.models import (
+    Attendance, Batch, Course, CourseTopic, Staff, Student, StudentAttendance, StudentTopicProgress,
+)
+
+PRESETS = {
+    #          staff, students, courses, topics/course, days of history
+    "small": dict(staff=10, students=500, courses=3, topics=40, days=90),
+    "medium": dict(staff=100, students=5000, courses=8, topics=150, days=365),
+    "large": dict(staff=300, students=30000, courses=12, topics=300, days=730),
+}
+
+SEED_PREFIX = "seed"
+CHUNK_SIZE = 50000
+
+FIRST_NAMES = ["Arun", "Divya", "Karthik", "Priya", "Rahul", "Sneha", "Vijay", "Anitha", "Suresh", "Meena",
+               "Ravi", "Lakshmi", "Ganesh", "Kavya", "Manoj", "Deepa", "Hari", "Nisha", "Ajay", "Revathi"]
+LAST_NAMES = ["Kumar", "Raj", "Krishnan", "Iyer", "Nair", "Reddy", "Sharma", "Pillai", "Menon", "Das"]
+COURSE_NAMES = ["Python full stack", "Java full stack", "Data science", "Software testing", "Devops",
+                "Mern stack", "Ui ux design", "Cloud computing", "Cyber security", "Data analytics",
+                "Machine learning", "Dot net"]
+# Non-overlapping, so any sample of them passes Batch.clean for one staff member
+BATCH_SLOTS = [
+    ("Early morning", datetime.time(7, 0), datetime.time(9, 0)),
+    ("Morning", datetime.time(9, 0), datetime.time(11, 0)),
+    ("Late morning", datetime.time(11, 0), datetime.time(13, 0)),
+    ("Afternoon", datetime.time(14, 0), datetime.time(16, 0)),
+    ("Evening", datetime.time(16, 0), datetime.time(18, 0)),
+]
+TOPICS_PER_MODULE = 10
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic staff, batches, students, topics, attendance and progress."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", choices=sorted(PRESETS), default="small")
+        parser.add_argument("--seed", type=int, default=2024, help="Random seed (same seed, same data).")
+        parser.add_argument("--password", default="Seed@12345", help="Password for every generated staff user.")
+        parser.add_argument("--clear", action="store_true", help="Delete previously seeded data first.")
+
+    def handle(self, *args, **options):
+        preset = PRESETS[options["size"]]
+        self.rng = random.Random(options["seed"])
+        self.today = datetime.date.today()
+        started = time.perf_counter()
+
+        if User.objects.filter(username__startswith=f"{SEED_PREFIX}_").exists():
+            if not options["clear"]:
+                raise CommandError("Seeded data already exists; re-run with --clear to replace it.")
+            self.clear()
+
+        self.tune_sqlite()
+        with transaction.atomic():
+            courses, topics = self.create_courses(preset)
+            staff = self.create_staff(preset, courses, options["password"])
+            batches = self.create_batches(staff)
+            students = self.create_students(preset, courses)
+            self.build_calendar(preset["days"])
+            n_staff_att = self.create_staff_attendance(staff)
+            n_att = self.create_student_attendance(students)
+            n_prog = self.create_progress(students, topics)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(staff)} staff, {len(batches)} batches, {len(students)} students, "
+            f"{sum(len(t) for t in topics.values())} topics, {n_att} student attendance, "
+            f"{n_prog} progress and {n_staff_att} staff attendance rows in {elapsed:.1f}s."
+        ))
+
+    # ------------------------------------------------------------------
+    def clear(self):
+        self.stdout.write("Removing previously seeded data...")
+        with transaction.atomic():
+            # Big child tables first, as single DELETEs, so the cascade
+            # collector never has to load millions of rows
+            StudentAttendance.objects.filter(student__student_email__startswith=f"{SEED_PREFIX}.").delete()
+            StudentTopicProgress.objects.filter(student__student_email__startswith=f"{SEED_PREFIX}.").delete()
+            Attendance.objects.filter(staff__user__username__startswith=f"{SEED_PREFIX}_").delete()
+            Student.objects.filter(student_email__startswith=f"{SEED_PREFIX}.").delete()
+            Staff.objects.filter(user__username__startswith=f"{SEED_PREFIX}_").delete()
+            User.objects.filter(username__startswith=f"{SEED_PREFIX}_").delete()
+            # Only seeded course names, and only once nothing else refers to them
+            names = [n.capitalize() for n in COURSE_NAMES]
+            names += [f"{n} {SEED_PREFIX}".capitalize() for n in COURSE_NAMES]
+            Course.objects.filter(
+                course_name__in=names, students__isnull=True, staffs__isnull=True
+            ).delete()
+
+    def tune_sqlite(self):
+        if connection.vendor != "sqlite":
+            return
+        with connection.cursor() as cursor:
+            # Only affects this connection; keeps the bulk load off the fsync path
+            cursor.execute("PRAGMA synchronous = OFF")
+            cursor.execute("PRAGMA journal_mode = MEMORY")
+            cursor.execute("PRAGMA temp_store = MEMORY")
+            cursor.execute("PRAGMA cache_size = -200000")
+
+    def bulk_insert(self, model, columns, rows):
+        """Stream tuples into ``model``'s table with executemany, CHUNK_SIZE rows at a time."""
+        table = connection.ops.quote_name(model._meta.db_table)
+        cols = ", ".join(connection.ops.quote_name(model._meta.get_field(c).column) for c in columns)
+        sql = f"INSERT INTO {table} ({cols}) VALUES ({', '.join(['%s'] * len(columns))})"
+        count = 0
+        chunk = []
+        with connection.cursor() as cursor:
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= CHUNK_SIZE:
+                    cursor.executemany(sql, chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                cursor.executemany(sql, chunk)
+                count += len(chunk)
+        return count
+
+    def person_name(self):
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def mobile(self):
+        return f"{self.rng.randint(6, 9)}{self.rng.randint(0, 999999999):09d}"
+
+    # ------------------------------------------------------------------
+    def create_courses(self, preset):
+        courses = []
+        existing = set(Course.objects.values_list("course_name", flat=True))
+        for name in COURSE_NAMES[:preset["courses"]]:
+            # Course.save() capitalizes; bulk_create skips save() so do it here
+            name = name.capitalize()
+            if name in existing:
+                name = f"{name} {SEED_PREFIX}".capitalize()
+            courses.append(Course(course_name=name))
+        Course.objects.bulk_create(courses)
+        courses = list(Course.objects.filter(course_name__in=[c.course_name for c in courses]))
+
+        topic_objs = []
+        for course in courses:
+            for i in range(preset["topics"]):
+                module = i // TOPICS_PER_MODULE + 1
+                topic_objs.append(CourseTopic(
+                    course=course,
+                    module_name=f"Module {module}".capitalize(),
+                    topic_name=f"Topic {module}.{i % TOPICS_PER_MODULE + 1}".capitalize(),
+                ))
+        CourseTopic.objects.bulk_create(topic_objs, batch_size=5000)
+        topics = {c.course_id: [] for c in courses}
+        for topic_id, course_id in CourseTopic.objects.filter(course__in=courses).order_by(
+                "topic_id").values_list("topic_id", "course_id"):
+            topics[course_id].append(topic_id)
+        return courses, topics
+
+    def create_staff(self, preset, courses, password):
+        password_hash = make_password(password)  # hash once, not once per user
+        users = [
+            User(username=f"{SEED_PREFIX}_staff_{i}", password=password_hash, email=f"{SEED_PREFIX}.staff{i}@example.com")
+            for i in range(preset["staff"])
+        ]
+        User.objects.bulk_create(users, batch_size=1000)
+        users = User.objects.filter(username__startswith=f"{SEED_PREFIX}_staff_").order_by("id")
+        staff = [
+            Staff(user=user, staff_name=self.person_name(), contact=self.mobile(), staff_email=user.email)
+            for user in users
+        ]
+        Staff.objects.bulk_create(staff, batch_size=1000)
+        staff = list(Staff.objects.filter(user__in=users).order_by("staff_id"))
+
+        links = []
+        for i, member in enumerate(staff):
+            course_ids = {courses[i % len(courses)].course_id}
+            if self.rng.random() < 0.3:
+                course_ids.add(self.rng.choice(courses).course_id)
+            links.extend(Staff.courses.through(staff_id=member.staff_id, course_id=c) for c in course_ids)
+        Staff.courses.through.objects.bulk_create(links, batch_size=5000)
+        self.staff_courses = {}
+        for link in links:
+            self.staff_courses.setdefault(link.course_id, []).append(link.staff_id)
+        return staff
+
+    def create_batches(self, staff):
+        batches = []
+        for member in staff:
+            # 1-4 distinct slots per staff: unique (staff, batch_name) and start < end
+            for name, start, end in self.rng.sample(BATCH_SLOTS, self.rng.randint(1, 4)):
+                batches.append(Batch(staff=member, batch_name=name, start_time=start, end_time=end))
+        Batch.objects.bulk_create(batches, batch_size=5000)
+        self.staff_batches = {}
+        for batch_id, staff_id in Batch.objects.filter(staff__in=staff).values_list("batch_id", "staff_id"):
+            self.staff_batches.setdefault(staff_id, []).append(batch_id)
+        return batches
+
+    def create_students(self, preset, courses):
+        days = preset["days"]
+        rows = []
+        for i in range(preset["students"]):
+            course = self.rng.choice(courses)
+            staff_id = self.rng.choice(self.staff_courses[course.course_id])
+            join_date = self.today - datetime.timedelta(days=self.rng.randint(0, days))
+            end_date = join_date + datetime.timedelta(days=self.rng.randint(90, 240))
+            rows.append(Student(
+                student_name=self.person_name(),
+                join_date=join_date,
+                end_date=end_date if self.rng.random() < 0.8 else None,
+                course_id=course.course_id,
+                staff_id=staff_id,
+                student_email=f"{SEED_PREFIX}.student{i}@example.com",
+                student_contact=self.mobile(),
+                batch_id=self.rng.choice(self.staff_batches[staff_id]),
+                mode=self.rng.random() < 0.7,
+            ))
+        Student.objects.bulk_create(rows, batch_size=5000)
+        return list(
+            Student.objects.filter(student_email__startswith=f"{SEED_PREFIX}.")
+            .values_list("student_id", "course_id", "join_date", "end_date")
+        )
+
+    def build_calendar(self, days):
+        """Adapted date values and a Sunday mask for every day in the history window."""
+        adapt_date = connection.ops.adapt_datefield_value
+        self.first_day = self.today - datetime.timedelta(days=days)
+        self.base_ordinal = self.first_day.toordinal()
+        dates = [self.first_day + datetime.timedelta(days=i) for i in range(days + 1)]
+        self.day_values = [adapt_date(d) for d in dates]
+        self.sunday = [d.weekday() == 6 for d in dates]
+        # updated_at for raw-inserted rows (auto_now only runs through the ORM)
+        self.loaded_at = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    def day_index(self, day):
+        return max(0, min(day.toordinal(), self.today.toordinal()) - self.base_ordinal)
+
+    def create_staff_attendance(self, staff):
+        rng = self.rng
+        now = connection.ops.adapt_timefield_value(datetime.time(9, 0))
+        day_values, sunday = self.day_values, self.sunday
+
+        def rows():
+            for member in staff:
+                for i in range(len(day_values)):
+                    if sunday[i] or rng.random() < 0.05:
+                        continue
+                    # unique (staff, date, wifi_verified): at most one row of each kind
+                    yield (member.staff_id, day_values[i], now, rng.random() < 0.8)
+
+        return self.bulk_insert(Attendance, ("staff", "date", "time", "wifi_verified"), rows())
+
+    def create_student_attendance(self, students):
+        rng = self.rng
+        marked_at = connection.ops.adapt_timefield_value(datetime.time(10, 0))
+        day_values, sunday, loaded_at = self.day_values, self.sunday, self.loaded_at
+
+        def rows():
+            for student_id, _course_id, join_date, end_date in students:
+                present_rate = rng.uniform(0.6, 0.97)
+                # unique (student, date): one row per day, Sundays skipped
+                for i in range(self.day_index(join_date), self.day_index(end_date or self.today) + 1):
+                    if sunday[i]:
+                        continue
+                    roll = rng.random()
+                    status = True if roll < present_rate else (None if roll > 0.99 else False)
+                    yield (student_id, day_values[i], marked_at, status, loaded_at)
+
+        return self.bulk_insert(
+            StudentAttendance, ("student", "date", "time", "status", "updated_at"), rows()
+        )
+
+    def create_progress(self, students, topics):
+        rng = self.rng
+        day_values, loaded_at = self.day_values, self.loaded_at
+        signs = list(Staff.objects.values_list("staff_name", flat=True)[:50]) or ["Staff"]
+        n_signs = len(signs)
+        # rng.random() directly: randint()/choice() dominate the profile at millions of rows
+        rand = rng.random
+
+        def rows():
+            for student_id, course_id, join_date, end_date in students:
+                stop = self.day_index(end_date or self.today)
+                day = self.day_index(join_date)
+                for topic_id in topics[course_id]:
+                    if day > stop:
+                        break
+                    finish = day + int(rand() * 4)
+                    if finish > stop:
+                        # StudentTopicProgress.clean: end_date needs start_date and start <= end,
+                        # so an unfinished topic keeps its start and has no end.
+                        yield (student_id, topic_id, day_values[day], None, None,
+                               signs[int(rand() * n_signs)], loaded_at)
+                        break
+                    yield (student_id, topic_id, day_values[day], day_values[finish],
+                           35 + int(rand() * 66), signs[int(rand() * n_signs)], loaded_at)
+                    day = finish + int(rand() * 3)
+
+        return self.bulk_insert(
+            StudentTopicProgress,
+            ("student", "topic", "start_date", "end_date", "marks", "sign", "updated_at"),
+            rows(),
+        )
@@ -0,0 +1,235 @@
+# myapp/metrics.py
+"""
+Prometheus-style counters and histograms, exposed at /metrics.
+
+Each worker process aggregates in memory (one short lock per update) and
+every METRICS_FLUSH_SECONDS writes a snapshot to
+METRICS_DIR/metrics-<pid>-<token>.json with an atomic rename. The token is
+new in every process, so a reused pid never overwrites an older worker's
+file. A scrape flushes its own process and sums the snapshots of all
+processes, so the numbers cover every worker without a shared server.
+With METRICS_DIR unset only the scraping process is reported.
+
+A worker removes its file when it exits, and a scrape removes the files
+of pids that are no longer running (workers that were killed). The
+directory must therefore be local to the host. A departed worker's
+counts leave the sums; Prometheus' rate() treats that as a counter reset.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help, buckets)
+METRICS = {
+    "myapp_request_duration_seconds": (
+        "histogram", "Request latency per URL name.", LATENCY_BUCKETS),
+    "myapp_db_queries_total": (
+        "counter", "Database queries executed, per URL name.", None),
+    "myapp_attendance_marks_written_total": (
+        "counter", "Student attendance rows written (source: form or sync).", None),
+    "myapp_progress_rows_updated_total": (
+        "counter", "StudentTopicProgress rows saved.", None),
+    "myapp_notification_emails_total": (
+        "counter", "Notification emails by kind and status (queued, sent, failed).", None),
+    "myapp_login_attendance_total": (
+        "counter", "Staff attendance outcomes recorded at login.", None),
+    "myapp_logins_total": (
+        "counter", "Staff login attempts (outcome: success, failed, or throttled while hashing was busy).", None),
+    "myapp_db_write_retries_total": (
+        "counter", "Write transactions that hit a locked database (outcome: retried or gave_up).", None),
+    "myapp_backups_total": (
+        "counter", "Database snapshots taken by manage.py backup (kind: full or incremental; outcome).", None),
+    "myapp_backup_restores_total": (
+        "counter", "Snapshot chains rebuilt by manage.py backup (outcome: checked or restored).", None),
+}
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_last_flush = 0.0
+_token = None  # (pid, token) naming this process's snapshot
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Add ``amount`` to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    _maybe_flush()
+
+
+def observe(name, value, **labels):
+    """Record one observation in a histogram."""
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        row = _histograms.get(key)
+        if row is None:
+            row = _histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                row[i] += 1
+                break
+        row[-2] += value
+        row[-1] += 1
+    _maybe_flush()
+
+
+def _metrics_dir():
+    path = getattr(settings, "METRICS_DIR", None)
+    return os.fspath(path) if path else None
+
+
+def _snapshot_path(directory):
+    global _token
+    pid = os.getpid()
+    if _token is None or _token[0] != pid:  # also after a fork
+        _token = (pid, uuid.uuid4().hex[:8])
+    return os.path.join(directory, f"metrics-{pid}-{_token[1]}.json")
+
+
+def _snapshot():
+    with _lock:
+        return {
+            "counters": [[n, list(l), v] for (n, l), v in _counters.items()],
+            "histograms": [[n, list(l), list(row)] for (n, l), row in _histograms.items()],
+        }
+
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR (no-op without one)."""
+    global _last_flush
+    directory = _metrics_dir()
+    if not directory:
+        return
+    # Only one thread per process writes; the others just keep counting
+    if not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _last_flush = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        path = _snapshot_path(directory)
+        with open(path + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump(_snapshot(), fh)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
+    finally:
+        _flush_lock.release()
+
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= getattr(settings, "METRICS_FLUSH_SECONDS", 5):
+        flush()
+
+
+def _remove_snapshot():
+    directory = _metrics_dir()
+    if directory and _token is not None and _token[0] == os.getpid():
+        try:
+            os.remove(_snapshot_path(directory))
+        except OSError:
+            pass
+
+
+def _pid_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, owned by someone else
+    return True
+
+
+atexit.register(_remove_snapshot)
+
+
+def _collect():
+    """Merge the snapshots of every process (or just this one)."""
+    directory = _metrics_dir()
+    if directory:
+        flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            try:
+                pid = int(os.path.basename(path).split("-")[1].split(".")[0])
+            except (IndexError, ValueError):
+                continue
+            if not _pid_running(pid):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path, encoding="utf-8") as fh:
+                    snapshots.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+    else:
+        snapshots = [_snapshot()]
+
+    counters, histograms = {}, {}
+    for snap in snapshots:
+        for name, labels, value in snap.get("counters", []):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, row in snap.get("histograms", []):
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.get(key)
+            histograms[key] = row if merged is None else [a + b for a, b in zip(merged, row)]
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    counters, histograms = _collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        else:
+            for (n, labels), row in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, row):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {row[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(row[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {row[-1]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,278 @@
+# myapp/middleware.py
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils import timezone
+
+from . import metrics
+from .routers import SESSION_KEY, activate_branch, deactivate
+
+slow_logger = logging.getLogger("myapp.profiling")
+
+# Profile of the request currently being handled (None when not sampled)
+_current_profile = contextvars.ContextVar("myapp_request_profile", default=None)
+
+# Per-process aggregate per url name: {url_name: {...}}
+_endpoint_stats = {}
+_stats_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Timings collected for a single sampled request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.db_time = 0.0
+        self.queries = []  # (duration, sql)
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: time every query of this request
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db_time += duration
+            self.queries.append((duration, sql))
+
+    def top_queries(self, limit):
+        return sorted(self.queries, key=lambda q: q[0], reverse=True)[:limit]
+
+    def server_timing(self):
+        return ", ".join([
+            f"total;dur={self.total * 1000:.1f}",
+            f'db;dur={self.db_time * 1000:.1f};desc="{len(self.queries)} queries"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f'cache;desc="{self.cache_hits} hits {self.cache_misses} misses"',
+        ])
+
+
+def record_cache_lookup(hit):
+    """Count a cache hit/miss against the current request profile, if any."""
+    profile = _current_profile.get()
+    if profile is None:
+        return
+    if hit:
+        profile.cache_hits += 1
+    else:
+        profile.cache_misses += 1
+
+
+def _install_template_timer():
+    """Wrap the Django template backend once so render time is attributed to the request."""
+    original = DjangoTemplate.render
+    if getattr(original, "_profiled", False):
+        return
+
+    def render(self, context=None, request=None):
+        profile = _current_profile.get()
+        if profile is None:
+            return original(self, context, request)
+        started = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+    render._profiled = True
+    DjangoTemplate.render = render
+
+
+def _record_endpoint(url_name, profile):
+    with _stats_lock:
+        stats = _endpoint_stats.setdefault(url_name, {
+            "count": 0, "total_ms": 0.0, "max_ms": 0.0, "db_ms": 0.0, "queries": 0,
+        })
+        total_ms = profile.total * 1000
+        stats["count"] += 1
+        stats["total_ms"] += total_ms
+        stats["max_ms"] = max(stats["max_ms"], total_ms)
+        stats["db_ms"] += profile.db_time * 1000
+        stats["queries"] += len(profile.queries)
+
+
+def endpoint_summary():
+    """Per url name averages for this process, slowest first."""
+    with _stats_lock:
+        snapshot = {name: dict(stats) for name, stats in _endpoint_stats.items()}
+    rows = []
+    for name, stats in snapshot.items():
+        count = stats["count"]
+        rows.append({
+            "url_name": name,
+            "count": count,
+            "avg_ms": stats["total_ms"] / count,
+            "max_ms": stats["max_ms"],
+            "avg_db_ms": stats["db_ms"] / count,
+            "avg_queries": stats["queries"] / count,
+        })
+    rows.sort(key=lambda r: r["avg_ms"], reverse=True)
+    return rows
+
+
+def recent_slow_requests(limit=50):
+    """Last ``limit`` entries of the slow request log (all worker processes)."""
+    path = getattr(settings, "PROFILING_SLOW_LOG", None)
+    if not path:
+        return []
+    try:
+        with open(path, encoding="utf-8") as fh:
+            lines = fh.readlines()[-limit:]
+    except OSError:
+        return []
+    entries = []
+    for line in reversed(lines):
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
+
+
+class RequestProfilingMiddleware:
+    """
+    Opt-in request profiler (PROFILING_ENABLED).
+
+    Measures total, DB and template time plus query count and cache hits for
+    a sample of requests, adds a Server-Timing header and appends requests
+    slower than PROFILING_SLOW_REQUEST_MS to a rotating log.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 1.0)
+        self.slow_ms = getattr(settings, "PROFILING_SLOW_REQUEST_MS", 500)
+        self.top_queries = getattr(settings, "PROFILING_TOP_QUERIES", 5)
+        _install_template_timer()
+        self._configure_slow_log()
+
+    def _configure_slow_log(self):
+        path = getattr(settings, "PROFILING_SLOW_LOG", None)
+        if not path or slow_logger.handlers:
+            return
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=getattr(settings, "PROFILING_SLOW_LOG_MAX_BYTES", 5 * 1024 * 1024),
+            backupCount=getattr(settings, "PROFILING_SLOW_LOG_BACKUPS", 3),
+            delay=True,
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        slow_logger.addHandler(handler)
+        slow_logger.setLevel(logging.INFO)
+        slow_logger.propagate = False
+
+    def __call__(self, request):
+        # Unsampled requests pay for one random() call and nothing else
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        profile.total = time.perf_counter() - profile.started
+
+        response["Server-Timing"] = profile.server_timing()
+
+        match = getattr(request, "resolver_match", None)
+        # _endpoint_stats lives as long as the process: unresolved paths share one key
+        url_name = match.url_name if match and match.url_name else (match.view_name if match else "unmatched")
+        _record_endpoint(url_name, profile)
+
+        if profile.total * 1000 >= self.slow_ms:
+            self._log_slow(request, response, url_name, profile)
+        return response
+
+    def _log_slow(self, request, response, url_name, profile):
+        slow_logger.info(json.dumps({
+            "at": timezone.now().isoformat(),
+            "method": request.method,
+            "path": request.path,
+            "url_name": url_name,
+            "status": response.status_code,
+            "total_ms": round(profile.total * 1000, 1),
+            "db_ms": round(profile.db_time * 1000, 1),
+            "queries": len(profile.queries),
+            "template_ms": round(profile.template_time * 1000, 1),
+            "cache_hits": profile.cache_hits,
+            "cache_misses": profile.cache_misses,
+            "top_queries": [
+                {"ms": round(d * 1000, 2), "sql": sql}
+                for d, sql in profile.top_queries(self.top_queries)
+            ],
+        }))
+
+
+class _QueryCounter:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Feeds /metrics (myapp/metrics.py): latency histogram and DB query count
+    per URL name for every request. Disabled with METRICS_ENABLED = False.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        # Unresolved paths share one label so 404 scans can't blow up cardinality
+        view = match.url_name if match and match.url_name else (match.view_name if match else "unmatched")
+        metrics.observe("myapp_request_duration_seconds", elapsed, view=view)
+        if counter.count:
+            metrics.inc("myapp_db_queries_total", counter.count, view=view)
+        return response
+
+
+class BranchMiddleware:
+    """Routes the request's myapp queries to the branch database chosen at login (myapp/routers.py)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = activate_branch(request.session.get(SESSION_KEY))
+        try:
+            return self.get_response(request)
+        finally:
+            deactivate(token)
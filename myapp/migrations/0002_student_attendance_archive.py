@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentAttendanceArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time', models.TimeField(blank=True, null=True)),
+                ('status', models.BooleanField(blank=True, choices=[(True, 'Present'), (False, 'Absent')], null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendances', to='myapp.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='myapp_stude_date_4d092e_idx')],
+                'unique_together': {('student', 'date')},
+            },
+        ),
+    ]
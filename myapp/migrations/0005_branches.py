@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('branch_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('code', models.SlugField(help_text='Key in settings.BRANCH_DATABASES', max_length=30, unique=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='staff',
+            name='user',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='batch',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='myapp.branch'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='Empty: offered by every branch', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='myapp.branch'),
+        ),
+        migrations.AddField(
+            model_name='staff',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='myapp.branch'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='myapp.branch'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_branches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentBatchChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('from_batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='myapp.batch')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batch_changes', to='myapp.student')),
+                ('to_batch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='myapp.batch')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', 'changed_at'], name='myapp_stude_student_1d6523_idx')],
+            },
+        ),
+    ]
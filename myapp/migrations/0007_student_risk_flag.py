@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_student_batch_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentRiskFlag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('absence_streak', 'Absence streak'), ('falling_attendance', 'Falling attendance'), ('stalled_progress', 'Stalled progress')], max_length=30)),
+                ('value', models.FloatField(help_text='Streak length, attendance drop or days stalled')),
+                ('detail', models.CharField(max_length=200)),
+                ('first_flagged', models.DateField(help_text='First night of the current run of this flag')),
+                ('computed_at', models.DateTimeField()),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='risk_flags', to='myapp.student')),
+            ],
+            options={
+                'unique_together': {('student', 'reason')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_student_risk_flag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Seats for active students; empty: BATCH_DEFAULT_CAPACITY', null=True),
+        ),
+    ]
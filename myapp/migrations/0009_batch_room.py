@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_batch_capacity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batch',
+            name='room',
+            field=models.CharField(blank=True, help_text='Classroom; batches in one room must not overlap', max_length=50),
+        ),
+    ]
@@ -3,6 +3,9 @@ from django.db import models
 from django.utils import timezone
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 # Professional mobile number validation (India)
@@ -12,8 +15,22 @@ mobile_validator = RegexValidator(
 )
 
 # Create your models here.
+class Branch(models.Model):
+    """A training centre. Lives in "default"; its data may live in its own database (myapp/routers.py)."""
+    branch_id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100, unique=True)
+    code = models.SlugField(max_length=30, unique=True, help_text="Key in settings.BRANCH_DATABASES")
+
+    def __str__(self):
+        return self.name
+
+
 class Staff(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    # db_constraint=False on user/branch: both tables stay in "default" when
+    # the staff row lives in a branch database
+    user = models.OneToOneField(User, on_delete=models.CASCADE, db_constraint=False)
+    branch = models.ForeignKey(Branch, on_delete=models.DO_NOTHING, null=True, blank=True,
+                               db_constraint=False, related_name="+")
     staff_name =models.CharField(max_length=100)
     contact=models.CharField(max_length=10,validators=[mobile_validator],blank=True)
     staff_id = models.AutoField(primary_key=True)
@@ -26,6 +43,8 @@ class Staff(models.Model):
 class Course(models.Model):
     course_id = models.AutoField(primary_key=True)
     course_name = models.CharField(max_length=100,unique=True)
+    branch = models.ForeignKey(Branch, on_delete=models.DO_NOTHING, null=True, blank=True,
+                               db_constraint=False, related_name="+", help_text="Empty: offered by every branch")
                 
     def __str__(self):
         return self.course_name
@@ -36,6 +55,19 @@ class Course(models.Model):
             #print(self.course_name)
         super().save(*args,**kwargs)
 
+def active_student_q(prefix="", on=None):
+    """Q for students still attending on ``on`` (default today); ``prefix`` e.g. "students__"."""
+    on = on or timezone.localdate()
+    return models.Q(**{f"{prefix}end_date__isnull": True}) | models.Q(**{f"{prefix}end_date__gte": on})
+
+
+class ActiveStudentManager(models.Manager):
+    """Students still attending: no end_date yet, or an end_date from today on."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(active_student_q())
+
+
 class Student(models.Model):
     student_id = models.AutoField(primary_key=True)
     student_name = models.CharField(max_length=100)
@@ -52,13 +84,30 @@ class Student(models.Model):
     # batch = models.BooleanField(choices=BATCH_CHOICES, default=True)
     
     batch = models.ForeignKey("Batch", on_delete=models.SET_NULL, null=True, blank=True, related_name="students")
+    branch = models.ForeignKey(Branch, on_delete=models.DO_NOTHING, null=True, blank=True,
+                               db_constraint=False, related_name="+")
 
     MODE_CHOICES = [
         (True, 'Offline'),
         (False, 'Online'),
     ]
     mode = models.BooleanField(choices=MODE_CHOICES, default=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    objects = models.Manager()  # everyone (admin, reports)
+    active = ActiveStudentManager()  # staff rosters: finished students hidden
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Batch as loaded, so signals.record_batch_change can see a move
+        instance._loaded_batch_id = instance.__dict__.get("batch_id")
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.branch_id is None and self.staff_id:
+            self.branch_id = self.staff.branch_id
+        super().save(*args, **kwargs)
 
     def __str__(self):
         course_name = self.course.course_name if self.course else "No Course"
@@ -71,19 +120,26 @@ class CourseTopic(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='topics')
     module_name = models.CharField(max_length=100)
     topic_name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('course', 'module_name', 'topic_name')
         ordering = ('course','module_name','topic_name')
     def __str__(self):
         return f"{self.module_name} - {self.topic_name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Course as loaded, so a topic moved to another course invalidates both curricula
+        instance._loaded_course_id = instance.__dict__.get("course_id")
+        return instance
     
     def save(self,*args,**kwargs):
-        print(self.module_name)
         if self.module_name and self.topic_name:
             self.module_name=self.module_name.capitalize()
             self.topic_name=self.topic_name.capitalize()
-            print(self.module_name)
+        logger.debug("Saving topic %s / %s", self.module_name, self.topic_name)
         super().save(*args,**kwargs)
 
 class StudentTopicProgress(models.Model):
@@ -94,6 +150,7 @@ class StudentTopicProgress(models.Model):
     end_date = models.DateField(null=True, blank=True)
     marks = models.IntegerField(null=True, blank=True)
     sign = models.CharField(max_length=100, help_text="Staff full name")
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('student', 'topic')
@@ -135,6 +192,7 @@ class StudentAttendance(models.Model):
         (False, 'Absent'),
     ]
     status=models.BooleanField(choices=STATUS_CHOICES, null=True,blank=True)  # True for Present, False for Absent
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('student', 'date')  # only one attendance per student per day
@@ -143,12 +201,82 @@ class StudentAttendance(models.Model):
         return f"{self.student.student_name} - {self.date}"
 
 
+class AttendanceSyncReceipt(models.Model):
+    """Client-generated IDs of offline marks already applied, so replays are no-ops."""
+    client_id = models.CharField(max_length=64, unique=True)
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name='sync_receipts')
+    received_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.client_id} ({self.staff.staff_name})"
+
+
+class StudentAttendanceArchive(models.Model):
+    """Attendance moved out of StudentAttendance by the archive_attendance command."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='archived_attendances')
+    date = models.DateField()
+    time = models.TimeField(null=True, blank=True)
+    status = models.BooleanField(choices=StudentAttendance.STATUS_CHOICES, null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('student', 'date')
+        indexes = [models.Index(fields=['date'])]
+
+    def __str__(self):
+        return f"{self.student.student_name} - {self.date} (archived)"
+
+
+class StudentBatchChange(models.Model):
+    """A student joining or leaving a batch; one row per move, for the timeline."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='batch_changes')
+    from_batch = models.ForeignKey("Batch", on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    to_batch = models.ForeignKey("Batch", on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['student', 'changed_at'])]
+
+    def __str__(self):
+        return f"{self.student.student_name}: {self.from_batch} -> {self.to_batch}"
+
+
+class StudentRiskFlag(models.Model):
+    """An at-risk signal for a student; rebuilt nightly by the flag_at_risk_students command."""
+    ABSENCE_STREAK = "absence_streak"
+    FALLING_ATTENDANCE = "falling_attendance"
+    STALLED_PROGRESS = "stalled_progress"
+    REASON_CHOICES = [
+        (ABSENCE_STREAK, "Absence streak"),
+        (FALLING_ATTENDANCE, "Falling attendance"),
+        (STALLED_PROGRESS, "Stalled progress"),
+    ]
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='risk_flags')
+    reason = models.CharField(max_length=30, choices=REASON_CHOICES)
+    value = models.FloatField(help_text="Streak length, attendance drop or days stalled")
+    detail = models.CharField(max_length=200)
+    first_flagged = models.DateField(help_text="First night of the current run of this flag")
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('student', 'reason')
+
+    def __str__(self):
+        return f"{self.student.student_name}: {self.get_reason_display()}"
+
+
 class Batch(models.Model):
     batch_id = models.AutoField(primary_key=True)
     staff = models.ForeignKey("Staff", on_delete=models.CASCADE, related_name="batches")
     batch_name = models.CharField(max_length=50, help_text="Example: Morning Batch")
     start_time = models.TimeField()
     end_time = models.TimeField()
+    capacity = models.PositiveIntegerField(null=True, blank=True,
+                                           help_text="Seats for active students; empty: BATCH_DEFAULT_CAPACITY")
+    room = models.CharField(max_length=50, blank=True, help_text="Classroom; batches in one room must not overlap")
+    updated_at = models.DateTimeField(auto_now=True)
+    branch = models.ForeignKey(Branch, on_delete=models.DO_NOTHING, null=True, blank=True,
+                               db_constraint=False, related_name="+")
 
     class Meta:
         unique_together = ('staff', 'batch_name')
@@ -161,4 +289,19 @@ class Batch(models.Model):
         # Validate time order
         if self.start_time and self.end_time:
             if self.start_time >= self.end_time:
-                raise ValidationError("End Time must be later than Start Time.")
\ No newline at end of file
+                raise ValidationError("End Time must be later than Start Time.")
+            if self.staff_id:
+                from .schedule import schedule_index
+
+                branch_id = self.branch_id if self.branch_id is not None else self.staff.branch_id
+                clashes = schedule_index().clashes(self.staff_id, self.start_time, self.end_time,
+                                                   branch_id, self.room, exclude=self.pk)
+                errors = [f"Overlaps {self.staff.staff_name}'s batch {b}." for b in clashes["staff"]]
+                errors += [f"Room {self.room} is taken by {b.staff.staff_name}'s batch {b}." for b in clashes["room"]]
+                if errors:
+                    raise ValidationError(errors)
+
+    def save(self, *args, **kwargs):
+        if self.branch_id is None and self.staff_id:
+            self.branch_id = self.staff.branch_id
+        super().save(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,106 @@
+# myapp/reassign.py
+"""
+Bulk student reassignment (batch, staff, mode) used by the staff student
+list and the StudentAdmin actions. Every call validates once and then
+issues a single UPDATE; notification emails are grouped per staff member.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import Staff, Student, StudentBatchChange
+
+UNSET = object()
+
+
+def reassign_students(students, batch=UNSET, staff=UNSET, mode=UNSET, notify=True):
+    """
+    Move ``students`` (a Student queryset) to ``batch`` and/or ``staff`` and/or set ``mode``.
+
+    A batch always belongs to one staff member, so moving to a batch also
+    moves the students to that batch's staff. Changing only the staff
+    clears the batch, because the old batch belongs to the old staff.
+    Returns the number of students updated.
+    """
+    changes = {}
+    if batch is not UNSET and batch is not None:
+        if staff is not UNSET and staff is not None and batch.staff_id != staff.pk:
+            raise ValidationError("The selected batch does not belong to the selected staff member.")
+        staff = batch.staff
+        changes["batch"] = batch
+    if staff is not UNSET:
+        changes["staff"] = staff
+        if "batch" not in changes:
+            changes["batch"] = None
+    if mode is not UNSET:
+        changes["mode"] = mode
+    if not changes:
+        return 0
+    changes["updated_at"] = timezone.now()  # .update() skips auto_now
+
+    rows = list(students.values_list("student_id", "student_name", "course_id", "staff_id", "batch_id"))
+    if not rows:
+        return 0
+
+    if changes.get("staff") is not None:
+        target = changes["staff"]
+        taught = set(target.courses.values_list("course_id", flat=True))
+        missing = {row[2] for row in rows} - taught
+        if missing:
+            raise ValidationError(
+                f"{target.staff_name} does not teach the course of every selected student."
+            )
+
+    with transaction.atomic():
+        updated = Student.objects.filter(pk__in=[r[0] for r in rows]).update(**changes)
+        if "batch" in changes:
+            new_batch_id = changes["batch"].pk if changes["batch"] else None
+            StudentBatchChange.objects.bulk_create(
+                StudentBatchChange(student_id=row[0], from_batch_id=row[4], to_batch_id=new_batch_id,
+                                   changed_at=changes["updated_at"])
+                for row in rows if row[4] != new_batch_id
+            )
+
+    if notify and changes.get("staff", UNSET) is not UNSET:
+        notify_reassignment(rows, changes["staff"], changes.get("batch"))
+    return updated
+
+
+def notify_reassignment(rows, new_staff, new_batch):
+    """One email per affected staff member instead of one per student."""
+    gained = [name for _, name, _, old_staff_id, _ in rows if new_staff and old_staff_id != new_staff.pk]
+    lost = defaultdict(list)
+    for _, name, _, old_staff_id, _ in rows:
+        if old_staff_id and (new_staff is None or old_staff_id != new_staff.pk):
+            lost[old_staff_id].append(name)
+
+    batch_name = new_batch.batch_name if new_batch else "-"
+    messages = []
+    if gained:
+        messages.append((
+            new_staff,
+            f"{len(gained)} student(s) assigned to you",
+            f"Dear {new_staff.staff_name},\n\nThe following students have been assigned to you "
+            f"(batch: {batch_name}):\n\n" + "\n".join(f"  - {n}" for n in gained) +
+            "\n\nPlease check your portal for further details.\n\nRegards,\nAdmin Team\n",
+        ))
+    # No select_related("user"): users stay in "default" when staff live in a branch database
+    for staff in Staff.objects.filter(pk__in=lost.keys()):
+        names = lost[staff.pk]
+        messages.append((
+            staff,
+            f"{len(names)} student(s) moved to another staff member",
+            f"Dear {staff.staff_name},\n\nThe following students are no longer assigned to you:\n\n" +
+            "\n".join(f"  - {n}" for n in names) + "\n\nRegards,\nAdmin Team\n",
+        ))
+
+    for staff, subject, body in messages:
+        recipient = staff.staff_email or staff.user.email
+        if recipient:
+            metrics.inc("myapp_notification_emails_total", status="queued", kind="reassignment")
+            sent = send_mail(subject, body, None, [recipient], fail_silently=True)
+            metrics.inc("myapp_notification_emails_total", status="sent" if sent else "failed", kind="reassignment")
@@ -0,0 +1,163 @@
+# myapp/risk.py
+"""
+Nightly at-risk detection (manage.py flag_at_risk_students).
+
+Attendance of every active student over the last RISK_WINDOW_DAYS, hot
+and archived, is loaded with one query into two student x day boolean
+bitmaps (marked, present). Absence streaks and recent-vs-earlier
+attendance rates are then computed for the whole student body with
+array operations. Stalled progress uses the oldest topic each student
+started but has not finished. The flags replace the previous night's
+StudentRiskFlag rows in one transaction.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .archive import attendance_history
+from .models import Student, StudentRiskFlag, StudentTopicProgress, active_student_q
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - the command reports it instead
+    np = None
+
+
+class RiskUnavailable(Exception):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def attendance_bitmaps(student_ids, start, days):
+    """
+    (marked, present) boolean arrays of shape (len(student_ids), days);
+    column 0 is ``start``. ``student_ids`` must be sorted.
+    """
+    end = start + datetime.timedelta(days=days - 1)
+    # The window may reach back past ATTENDANCE_ARCHIVE_AFTER_DAYS
+    rows = list(
+        attendance_history(
+            active_student_q("student__", end), date__range=(start, end), status__isnull=False
+        ).iterator(chunk_size=20000)
+    )
+    marked = np.zeros((len(student_ids), days), dtype=bool)
+    present = np.zeros_like(marked)
+    if rows:
+        row_student, row_date, _, row_status = zip(*rows)
+        row_student = np.array(row_student, dtype=np.int64)
+        # Only ``days`` distinct dates: map them once instead of per row
+        offsets = {d: (d - start).days for d in set(row_date)}
+        row_day = np.fromiter((offsets[d] for d in row_date), dtype=np.int64, count=len(row_date))
+        index = np.searchsorted(student_ids, row_student)
+        known = (index < len(student_ids)) & (student_ids[np.minimum(index, len(student_ids) - 1)] == row_student)
+        marked[index[known], row_day[known]] = True
+        present[index[known], row_day[known]] = np.array(row_status, dtype=bool)[known]
+    return marked, present
+
+
+def absence_streaks(marked, present):
+    """Consecutive absences up to the latest marked day; unmarked days (holidays) are skipped."""
+    day = np.arange(marked.shape[1])
+    last_present = np.where(present, day, -1).max(axis=1, initial=-1)
+    absent = marked & ~present
+    return (absent & (day > last_present[:, None])).sum(axis=1)
+
+
+def attendance_rates(marked, present):
+    """Present / marked per student, NaN where nothing was marked."""
+    marked_days = marked.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(marked_days > 0, present.sum(axis=1) / np.maximum(marked_days, 1), np.nan), marked_days
+
+
+def oldest_open_topics(student_ids, before):
+    """(start ordinal of the oldest unfinished topic or 0, number of unfinished topics) per student."""
+    rows = list(
+        StudentTopicProgress.objects.filter(
+            active_student_q("student__"), start_date__isnull=False, end_date__isnull=True, start_date__lte=before
+        ).values_list("student_id", "start_date")
+    )
+    oldest = np.full(len(student_ids), np.iinfo(np.int64).max, dtype=np.int64)
+    open_topics = np.zeros(len(student_ids), dtype=np.int64)
+    if rows:
+        row_student, row_start = zip(*rows)
+        row_student = np.array(row_student, dtype=np.int64)
+        index = np.searchsorted(student_ids, row_student)
+        known = (index < len(student_ids)) & (student_ids[np.minimum(index, len(student_ids) - 1)] == row_student)
+        starts = np.array([d.toordinal() for d in row_start], dtype=np.int64)
+        np.minimum.at(oldest, index[known], starts[known])
+        open_topics = np.bincount(index[known], minlength=len(student_ids))
+    oldest[open_topics == 0] = 0
+    return oldest, open_topics
+
+
+def detect_at_risk(today=None):
+    """Unsaved StudentRiskFlag objects for the current database, at most one per (student, reason)."""
+    if np is None:
+        raise RiskUnavailable("NumPy is required for at-risk detection (pip install numpy).")
+
+    today = today or timezone.localdate()
+    window = _setting("RISK_WINDOW_DAYS", 56)
+    recent = _setting("RISK_RECENT_DAYS", 14)
+    min_marked = _setting("RISK_MIN_MARKED_DAYS", 4)
+    streak_limit = _setting("RISK_ABSENCE_STREAK", 3)
+    drop_limit = _setting("RISK_ATTENDANCE_DROP", 0.25)
+    stall_days = _setting("RISK_STALL_DAYS", 21)
+
+    student_ids = np.array(
+        sorted(Student.objects.filter(active_student_q(on=today)).values_list("student_id", flat=True)),
+        dtype=np.int64,
+    )
+    start = today - datetime.timedelta(days=window - 1)
+    marked, present = attendance_bitmaps(student_ids, start, window)
+
+    streaks = absence_streaks(marked, present)
+    recent_rate, recent_marked = attendance_rates(marked[:, -recent:], present[:, -recent:])
+    earlier_rate, earlier_marked = attendance_rates(marked[:, :-recent], present[:, :-recent])
+    drop = earlier_rate - recent_rate
+    with np.errstate(invalid="ignore"):
+        falling = (recent_marked >= min_marked) & (earlier_marked >= min_marked) & (drop >= drop_limit)
+
+    oldest, open_topics = oldest_open_topics(student_ids, today - datetime.timedelta(days=stall_days))
+    stalled = open_topics > 0
+
+    flags = []
+    for i in np.flatnonzero(streaks >= streak_limit):
+        flags.append(StudentRiskFlag(
+            student_id=int(student_ids[i]), reason=StudentRiskFlag.ABSENCE_STREAK, value=int(streaks[i]),
+            detail=f"Absent on the last {streaks[i]} marked days",
+        ))
+    for i in np.flatnonzero(falling):
+        flags.append(StudentRiskFlag(
+            student_id=int(student_ids[i]), reason=StudentRiskFlag.FALLING_ATTENDANCE, value=round(float(drop[i]), 3),
+            detail=f"Attendance {earlier_rate[i]:.0%} -> {recent_rate[i]:.0%} over the last {recent} days",
+        ))
+    for i in np.flatnonzero(stalled):
+        days = today.toordinal() - int(oldest[i])
+        flags.append(StudentRiskFlag(
+            student_id=int(student_ids[i]), reason=StudentRiskFlag.STALLED_PROGRESS, value=days,
+            detail=f"{open_topics[i]} topic(s) unfinished, the oldest started {days} days ago",
+        ))
+    return flags
+
+
+def store_flags(flags, today=None):
+    """Replace the stored flags with ``flags``, keeping first_flagged for flags that persist."""
+    today = today or timezone.localdate()
+    now = timezone.now()
+    with transaction.atomic():
+        first_seen = {
+            (student_id, reason): first
+            for student_id, reason, first in StudentRiskFlag.objects.values_list("student_id", "reason", "first_flagged")
+        }
+        StudentRiskFlag.objects.all().delete()
+        for flag in flags:
+            flag.first_flagged = first_seen.get((flag.student_id, flag.reason), today)
+            flag.computed_at = now
+        StudentRiskFlag.objects.bulk_create(flags, batch_size=1000)
+    return len(flags)
@@ -0,0 +1,128 @@
+# myapp/routers.py
+"""
+Per-branch databases.
+
+Each training centre (``Branch``) can have its own database: map its code to
+a DATABASES alias in settings.BRANCH_DATABASES. All myapp data of that
+branch (staff, courses, batches, students, attendance, progress) then lives
+in that database, so its queries and write locks never touch another
+branch. Branches without an entry, the Branch directory itself and Django's
+own apps (users, sessions, admin log) stay in "default".
+
+The branch of a request comes from the logged-in Staff (stored in the
+session at login, see myapp/signals.py) and is held in a contextvar by
+BranchMiddleware; the router reads it from there.
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+SESSION_KEY = "branch"
+DIRECTORY_MODELS = {"branch"}  # myapp models that always stay in "default"
+
+# Database alias of the branch being served (None -> "default")
+_current_alias = contextvars.ContextVar("myapp_branch_alias", default=None)
+
+
+def branch_alias(code):
+    """Database alias for a branch code; "default" for unsharded branches."""
+    return getattr(settings, "BRANCH_DATABASES", {}).get(code, "default")
+
+
+def database_aliases():
+    """Every database holding myapp data, default first."""
+    return list(dict.fromkeys(["default", *getattr(settings, "BRANCH_DATABASES", {}).values()]))
+
+
+def current_alias():
+    return _current_alias.get() or "default"
+
+
+def activate_branch(code):
+    """Route this context's queries to ``code``'s database. Returns a token for ``deactivate``."""
+    return _current_alias.set(branch_alias(code) if code else None)
+
+
+def deactivate(token):
+    _current_alias.reset(token)
+
+
+@contextmanager
+def using_database(alias):
+    token = _current_alias.set(alias)
+    try:
+        yield
+    finally:
+        _current_alias.reset(token)
+
+
+def for_each_database(func):
+    """
+    Run ``func(alias)`` against every branch database in parallel, each in
+    its own thread (and so its own connection). Returns {alias: result}.
+    """
+    aliases = database_aliases()
+
+    def run(alias):
+        try:
+            with using_database(alias):
+                return func(alias)
+        finally:
+            connections[alias].close()
+
+    if len(aliases) == 1:
+        with using_database(aliases[0]):
+            return {aliases[0]: func(aliases[0])}
+    with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+        return dict(zip(aliases, pool.map(run, aliases)))
+
+
+def staff_branch(user):
+    """Code of the branch whose database holds ``user``'s Staff row (None if unassigned)."""
+    from .models import Branch, Staff
+
+    codes = {alias: code for code, alias in getattr(settings, "BRANCH_DATABASES", {}).items()}
+    for alias in database_aliases():
+        rows = list(Staff.objects.using(alias).filter(user_id=user.pk).values_list("branch_id", flat=True)[:1])
+        if not rows:
+            continue
+        if alias in codes:
+            return codes[alias]
+        return Branch.objects.filter(pk=rows[0]).values_list("code", flat=True).first() if rows[0] else None
+    return None
+
+
+def _sharded(model):
+    return model._meta.app_label == "myapp" and model._meta.model_name not in DIRECTORY_MODELS
+
+
+class BranchRouter:
+    def _db(self, model, **hints):
+        if not _sharded(model):
+            # Explicit: Django would otherwise follow the instance hint, so
+            # staff.user read from a branch database would look there too
+            return "default"
+        instance = hints.get("instance")
+        # Related lookups from a myapp object stay in that object's database;
+        # lookups starting from a User (request.user.staff) use the branch.
+        if instance is not None and _sharded(type(instance)) and instance._state.db:
+            return instance._state.db
+        return current_alias()
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        sharded1, sharded2 = _sharded(type(obj1)), _sharded(type(obj2))
+        if sharded1 and sharded2:
+            return obj1._state.db == obj2._state.db
+        # Staff.user and the *.branch FKs point into "default" by design
+        return True if sharded1 or sharded2 else None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == "default":
+            return True
+        return app_label == "myapp" and model_name not in DIRECTORY_MODELS
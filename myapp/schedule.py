@@ -0,0 +1,138 @@
+# myapp/schedule.py
+"""
+Batch timetable conflicts: two batches of one staff member, or two
+batches in the same room of a branch, whose times overlap.
+
+Batches run every day, so a batch is the interval [start_time, end_time)
+in minutes since midnight. ``ScheduleIndex`` keeps one ``IntervalIndex``
+per staff member and per room. It is built with one query and kept per
+database until a Batch row changes (MAX(updated_at) and COUNT(*)), so
+Batch.clean, the student list and the schedule page answer overlap
+questions with a binary search instead of a query or a scan.
+"""
+import bisect
+import heapq
+import threading
+from collections import defaultdict
+
+from django.db import router
+from django.db.models import Count, Max
+
+from .models import Batch
+
+_cache = {}  # database alias -> (state, ScheduleIndex)
+_lock = threading.Lock()
+
+
+def minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def room_key(branch_id, room):
+    return (branch_id, room.strip().lower()) if room and room.strip() else None
+
+
+class IntervalIndex:
+    """
+    Static half-open intervals sorted by start, with the running maximum
+    of their ends. ``overlapping`` bisects to the last interval starting
+    before the query ends and walks back only while an earlier interval
+    can still reach the query: O(log n + k) for the usual k overlaps.
+    """
+
+    def __init__(self, items):
+        self.items = sorted(items, key=lambda item: (item[0], item[1]))
+        self.starts = [start for start, _, _ in self.items]
+        self.reach = []
+        furthest = -1
+        for _, end, _ in self.items:
+            furthest = max(furthest, end)
+            self.reach.append(furthest)
+
+    def __len__(self):
+        return len(self.items)
+
+    def overlapping(self, start, end):
+        """Values of the intervals overlapping [start, end), in start order."""
+        found = []
+        i = bisect.bisect_left(self.starts, end) - 1
+        while i >= 0 and self.reach[i] > start:
+            s, e, value = self.items[i]
+            if e > start:
+                found.append(value)
+            i -= 1
+        found.reverse()
+        return found
+
+    def conflicts(self):
+        """Every overlapping pair (value_a, value_b), with one sweep over the sorted intervals."""
+        pairs = []
+        active = []  # heap of (end, position)
+        for position, (start, end, value) in enumerate(self.items):
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            pairs.extend((self.items[other][2], value) for _, other in sorted(active, key=lambda a: a[1]))
+            heapq.heappush(active, (end, position))
+        return pairs
+
+
+class ScheduleIndex:
+    def __init__(self, batches):
+        self.batches = {b.pk: b for b in batches}
+        by_staff = defaultdict(list)
+        by_room = defaultdict(list)
+        for b in batches:
+            interval = (minutes(b.start_time), minutes(b.end_time), b.pk)
+            by_staff[b.staff_id].append(interval)
+            key = room_key(b.branch_id, b.room)
+            if key:
+                by_room[key].append(interval)
+        self.staff = {k: IntervalIndex(v) for k, v in by_staff.items()}
+        self.rooms = {k: IntervalIndex(v) for k, v in by_room.items()}
+
+    def clashes(self, staff_id, start, end, branch_id=None, room="", exclude=None):
+        """
+        {"staff": [...], "room": [...]} of existing batches overlapping a
+        batch of ``staff_id`` in ``room`` from ``start`` to ``end`` (times).
+        """
+        s, e = minutes(start), minutes(end)
+        staff_index = self.staff.get(staff_id)
+        room_index = self.rooms.get(room_key(branch_id, room))
+        return {
+            "staff": [self.batches[pk] for pk in (staff_index.overlapping(s, e) if staff_index else []) if pk != exclude],
+            "room": [self.batches[pk] for pk in (room_index.overlapping(s, e) if room_index else []) if pk != exclude],
+        }
+
+    def batch_clashes(self, batch):
+        return self.clashes(batch.staff_id, batch.start_time, batch.end_time, batch.branch_id, batch.room,
+                            exclude=batch.pk)
+
+    def all_conflicts(self, staff_id=None, room=None):
+        """[(kind, batch_a, batch_b)] for every staff (or room) index, or only the one asked for."""
+        if staff_id is not None:
+            groups = [("staff", self.staff.get(staff_id))]
+        elif room is not None:
+            groups = [("room", index) for key, index in self.rooms.items() if key[1] == room.strip().lower()]
+        else:
+            groups = [("staff", i) for i in self.staff.values()] + [("room", i) for i in self.rooms.values()]
+        return [
+            (kind, self.batches[a], self.batches[b])
+            for kind, index in groups if index
+            for a, b in index.conflicts()
+        ]
+
+
+def schedule_index():
+    """ScheduleIndex of the current database, rebuilt only after a Batch row changed."""
+    alias = router.db_for_read(Batch)
+    state = tuple(Batch.objects.using(alias).aggregate(changed=Max("updated_at"), count=Count("pk")).values())
+    cached = _cache.get(alias)
+    if cached and cached[0] == state:
+        return cached[1]
+    with _lock:
+        cached = _cache.get(alias)
+        if not cached or cached[0] != state:
+            batches = list(Batch.objects.using(alias).select_related("staff").order_by())
+            cached = (state, ScheduleIndex(batches))
+            _cache[alias] = cached
+    return cached[1]
@@ -0,0 +1,31 @@
+# myapp/sessions.py
+"""
+Session engine that writes a login's session once.
+
+``login()`` cycles the session key. Django's stores do that by inserting
+an empty session row right away and updating it with the user's data when
+the response goes out: two writes per login, and the first one is always
+redundant. This store only forgets the old key during the request; the
+response then inserts the new session with its data in one write.
+
+Use as SESSION_ENGINE = 'myapp.sessions'. SESSION_BASE_ENGINE is the
+Django engine it extends (db or cached_db).
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_Base = import_string(
+    getattr(settings, "SESSION_BASE_ENGINE", "django.contrib.sessions.backends.db") + ".SessionStore"
+)
+
+
+class SessionStore(_Base):
+    def cycle_key(self):
+        data = self._session
+        key = self.session_key
+        # With no key, the middleware's save() creates the row, data included
+        self._session_key = None
+        self._session_cache = data
+        self.modified = True
+        if key:
+            self.delete(key)
@@ -1,14 +1,22 @@
 # myapp/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.core.mail import send_mail
 from .models import Student
 from django.contrib.auth.signals import user_logged_in
-from .models import Staff, Attendance
+from .models import Staff, Attendance, StudentAttendance, StudentTopicProgress, CourseTopic, StudentBatchChange
+from .analytics import invalidate_course
+from .curriculum import invalidate_curriculum
+from . import live, metrics
+from .routers import SESSION_KEY, activate_branch, staff_branch
+from .writes import run_write
 from django.utils import timezone
 from django.conf import settings
+import logging
 import socket
 
+logger = logging.getLogger(__name__)
+
 def get_local_ip():
     """Get the device's current LAN/WiFi IP"""
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -17,7 +25,7 @@ def get_local_ip():
         s.connect(("8.8.8.8", 80))
         ip = s.getsockname()[0]
     except Exception as e:
-        print(f"❌ Failed to fetch local IP: {e}")
+        logger.warning("Failed to fetch local IP: %s", e)
         ip = "127.0.0.1"
     finally:
         s.close()
@@ -56,16 +64,42 @@ Admin Team
         recipient = staff.staff_email or staff.user.email
 
         if recipient:
-            send_mail(
-                subject,
-                message,
-                None,  # DEFAULT_FROM_EMAIL
-                [recipient],
-                fail_silently=False,
-            )
-            print(f"✅ Notification email sent to {recipient} for new student {instance.student_name}.")
+            metrics.inc("myapp_notification_emails_total", status="queued", kind="new_student")
+            try:
+                send_mail(
+                    subject,
+                    message,
+                    None,  # DEFAULT_FROM_EMAIL
+                    [recipient],
+                    fail_silently=False,
+                )
+            except Exception:
+                metrics.inc("myapp_notification_emails_total", status="failed", kind="new_student")
+                raise
+            metrics.inc("myapp_notification_emails_total", status="sent", kind="new_student")
+            logger.info("Notification email sent to %s for new student %s", recipient, instance.student_name,
+                        extra={"student_id": instance.pk, "staff_id": staff.pk})
         else:
-            print(f"⚠️ No email found for staff {staff.staff_name}.")
+            logger.warning("No email found for staff %s", staff.staff_name, extra={"staff_id": staff.pk})
+
+
+@receiver(post_save, sender=Student)
+def record_batch_change(sender, instance, created, using, **kwargs):
+    """Timeline entry when a save moves the student to another batch (reassign.py records bulk moves)."""
+    previous = None if created else getattr(instance, "_loaded_batch_id", instance.batch_id)
+    if previous != instance.batch_id:
+        StudentBatchChange.objects.using(using).create(
+            student=instance, from_batch_id=previous, to_batch_id=instance.batch_id
+        )
+    instance._loaded_batch_id = instance.batch_id
+
+
+@receiver(user_logged_in)
+def remember_branch(sender, request, user, **kwargs):
+    """Pin the session to the staff member's branch database; connected before mark_attendance."""
+    code = staff_branch(user)
+    request.session[SESSION_KEY] = code
+    activate_branch(code)  # the rest of this login request too; BranchMiddleware resets it
 
 
 @receiver(user_logged_in)
@@ -79,40 +113,98 @@ def mark_attendance(sender, request, user, **kwargs):
     ip = get_client_ip(request)
     wifi_verified = ip in getattr(settings, "ALLOWED_WIFI_IPS", [])
 
+    # Check and insert in one write transaction, so two logins at once can't both insert
+    outcome = run_write(record_login_attendance, staff, today, wifi_verified)
+    metrics.inc("myapp_login_attendance_total", outcome=outcome)
+    if outcome in ("wifi_verified", "unverified"):
+        logger.info("Attendance (%s) marked for %s on %s", outcome.replace("_", " "), staff.staff_name, today,
+                    extra={"staff_id": staff.pk, "ip": ip, "wifi_verified": wifi_verified})
+    else:
+        logger.debug("Attendance (%s) for %s on %s (ip %s)", outcome.replace("_", " "), staff.staff_name, today, ip)
+
+
+def record_login_attendance(staff, today, wifi_verified):
+    """Create today's Attendance row if needed; returns the outcome label for metrics."""
     # Case 1: If verified attendance already exists → do nothing
     if Attendance.objects.filter(staff=staff, date=today, wifi_verified=True).exists():
-        print(f"⚠️ Attendance already marked with WiFi verified for {staff.staff_name} on {today}")
-        return
+        return "already_verified"
 
     # Case 2: If logging in with WiFi verified → create new record
     if wifi_verified:
         Attendance.objects.create(staff=staff, date=today, wifi_verified=True)
-        print(f"✅ Attendance (WiFi Verified) marked for {staff.staff_name} on {today} {ip}")
-    else:
-        # Case 3: Allow multiple unverified? → Only one unverified per day
-        if not Attendance.objects.filter(staff=staff, date=today, wifi_verified=False).exists():
-            Attendance.objects.create(staff=staff, date=today, wifi_verified=False)
-            print(f"✅ Attendance (Unverified WiFi) marked for {staff.staff_name} on {today} {ip}")
-        else:
-            print(f"⚠️ Attendance (Unverified) already exists for {staff.staff_name} on {today} {ip}")
+        return "wifi_verified"
+
+    # Case 3: Allow multiple unverified? → Only one unverified per day
+    if Attendance.objects.filter(staff=staff, date=today, wifi_verified=False).exists():
+        return "already_unverified"
+    Attendance.objects.create(staff=staff, date=today, wifi_verified=False)
+    return "unverified"
 
-    print(f"   🌐 Final IP used: {ip}")
-    print(f"   📶 WiFi Verified: {wifi_verified}")
 
 def get_client_ip(request):
     """Extract client IP from request headers"""
     x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
     if x_forwarded_for:
         ip = x_forwarded_for.split(",")[0]
-        print(f"🔎 Found IP from X-Forwarded-For: {ip}")
+        logger.debug("Found IP from X-Forwarded-For: %s", ip)
     else:
         ip = request.META.get("REMOTE_ADDR")
-        print(f"🔎 Found IP from REMOTE_ADDR: {ip}")
+        logger.debug("Found IP from REMOTE_ADDR: %s", ip)
     # If running locally (127.0.0.1 / ::1), fetch actual WiFi IP
     if ip in ("127.0.0.1", "::1"):
         wifi_ip = get_local_ip()
-        print(f"💡 Localhost detected, replacing with WiFi IP: {wifi_ip}")
+        logger.debug("Localhost detected, replacing with WiFi IP: %s", wifi_ip)
         return wifi_ip
-    print(f"🌐 Detected client IP in Django: {ip}")
     return ip
 
+
+
+@receiver(post_save, sender=StudentTopicProgress)
+def invalidate_progress_analytics(sender, instance, using, **kwargs):
+    """Drop the cached course analytics whenever one of its progress rows changes."""
+    if StudentTopicProgress.topic.is_cached(instance):
+        course_id = instance.topic.course_id
+    else:
+        course_id = (
+            CourseTopic.objects.using(using).filter(pk=instance.topic_id).values_list("course_id", flat=True).first()
+        )
+    if course_id is not None:
+        invalidate_course(course_id, using)
+
+
+# Progress rows are deleted with their student or topic. Invalidating there,
+# once per parent, keeps fast deletes on the progress table; a per-row
+# post_delete would load every row and look up its course.
+@receiver(pre_delete, sender=Student)
+def invalidate_student_analytics(sender, instance, using, **kwargs):
+    invalidate_course(instance.course_id, using)
+
+
+@receiver(post_save, sender=StudentTopicProgress)
+def count_progress_update(sender, instance, **kwargs):
+    metrics.inc("myapp_progress_rows_updated_total")
+
+
+# post_save only: a post_delete receiver would turn every delete of this
+# table (archiving, cascades) into a load-and-signal per row. Deletes that
+# matter for today's board call live.marks_changed themselves.
+@receiver(post_save, sender=StudentAttendance)
+def publish_student_attendance(sender, instance, using, **kwargs):
+    live.marks_changed([instance.student_id], instance.date, using)
+
+
+@receiver(post_save, sender=Attendance)
+def publish_staff_attendance(sender, instance, created, using, **kwargs):
+    if created:
+        live.staff_checked_in(instance, using)
+
+
+@receiver([post_save, post_delete], sender=CourseTopic)
+def invalidate_topic_analytics(sender, instance, using, **kwargs):
+    invalidate_course(instance.course_id, using)
+
+
+@receiver([post_save, post_delete], sender=CourseTopic)
+def invalidate_topic_curriculum(sender, instance, using, **kwargs):
+    for course_id in {instance.course_id, getattr(instance, "_loaded_course_id", None)} - {None}:
+        invalidate_curriculum(course_id, using)
@@ -0,0 +1,88 @@
+# myapp/staffing.py
+"""
+Staff and batch load for assigning students (StudentAdmin form, its
+getstaff/getbatches AJAX endpoints and auto-assign).
+
+Loads are correlated COUNT/SUM subqueries annotated onto one Staff (or
+Batch) query, so a dropdown of any length costs a single SELECT and the
+ranking happens in the database.
+"""
+from django.conf import settings
+from django.db.models import F, FloatField, IntegerField, OuterRef, Subquery, Sum, Count, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import Batch, Staff, Student, active_student_q
+
+
+def default_capacity():
+    return getattr(settings, "BATCH_DEFAULT_CAPACITY", 30)
+
+
+def _seats():
+    return Coalesce(F("capacity"), Value(default_capacity()))
+
+
+def _scalar(queryset, group_by, aggregate):
+    values = queryset.order_by().values(group_by).annotate(v=aggregate).values("v")
+    return Coalesce(Subquery(values, output_field=IntegerField()), 0)
+
+
+def _load(active, seats):
+    # active / seats, NULL when there are no seats (ranked last)
+    return Cast(F(active), FloatField()) / NullIf(Cast(F(seats), FloatField()), Value(0.0))
+
+
+def ranked_staff(course_id):
+    """
+    Staff teaching ``course_id``, least loaded first, annotated with
+    active_students, batch_count, seats and load (active_students / seats).
+    """
+    active = Student.objects.filter(active_student_q(), staff=OuterRef("pk"))
+    batches = Batch.objects.filter(staff=OuterRef("pk"))
+    return (
+        Staff.objects.filter(courses__course_id=course_id)
+        .annotate(
+            active_students=_scalar(active, "staff", Count("pk")),
+            batch_count=_scalar(batches, "staff", Count("pk")),
+            seats=_scalar(batches, "staff", Sum(_seats())),
+        )
+        .annotate(load=_load("active_students", "seats"))
+        .order_by(F("load").asc(nulls_last=True), "active_students", "staff_name")
+    )
+
+
+def ranked_batches(staff_id):
+    """Batches of ``staff_id``, emptiest first, annotated with active_students, seats and load."""
+    return (
+        Batch.objects.filter(staff_id=staff_id)
+        .annotate(
+            active_students=_scalar(Student.objects.filter(active_student_q(), batch=OuterRef("pk")),
+                                    "batch", Count("pk")),
+            seats=_seats(),
+        )
+        .annotate(load=_load("active_students", "seats"))
+        .order_by(F("load").asc(nulls_last=True), "start_time")
+    )
+
+
+def staff_label(staff):
+    if not staff.batch_count:
+        return f"{staff.staff_name} — {staff.active_students} active, no batches"
+    return f"{staff.staff_name} — {staff.active_students} active / {staff.seats} seats in {staff.batch_count} batch(es)"
+
+
+def batch_label(batch):
+    full = " (full)" if batch.active_students >= batch.seats else ""
+    return f"{batch} — {batch.active_students}/{batch.seats}{full}"
+
+
+def suggest_assignment(course_id):
+    """
+    (staff, batch) with the most room for a new student of ``course_id``:
+    the least-loaded staff member, then their emptiest batch (None when
+    they have none). (None, None) when nobody teaches the course.
+    """
+    staff = ranked_staff(course_id).first()
+    if staff is None:
+        return None, None
+    return staff, ranked_batches(staff.pk).first()
@@ -1,3 +1,748 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import urllib.error
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.contrib.messages import INFO
+from django.contrib.messages.storage.base import Message
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.models.deletion import Collector
+from django.http import HttpRequest
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Attendance, Batch, Branch, Course, CourseTopic, Staff, Student, StudentAttendance, StudentAttendanceArchive,
+    StudentBatchChange, StudentRiskFlag, StudentTopicProgress,
+)
+from . import metrics
+from .backup import restore_snapshot, take_snapshot
+from .archive import attendance_history
+from .attendance_sync import MAX_ENTRIES, apply_attendance_entries
+from .management.commands.loadtest_rush import write_retries
+from .management.commands.seed_data import BATCH_SLOTS
+from .columnar import export_month, load_batch, verify_month
+from . import curriculum as curriculum_module
+from .curriculum import cache_key as curriculum_cache_key, curriculum
+from .middleware import endpoint_summary
+from .routers import SESSION_KEY, for_each_database, using_database
+from .risk import detect_at_risk, store_flags
+from .timeline import MAX_PAGE_SIZE, InvalidCursor, decode_cursor, student_timeline
+from .schedule import IntervalIndex, ScheduleIndex, minutes
+from .writes import run_write
+
+
+class ConcurrentAttendanceTests(TransactionTestCase):
+    """Many staff sessions writing attendance at once: nothing lost, nothing duplicated."""
+
+    THREADS = 8
+    ROUNDS = 4
+    STUDENTS = 15
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="tutor", password="x")
+        course = Course.objects.create(course_name="Python")
+        self.staff = Staff.objects.create(user=self.user, staff_name="Tutor", staff_email="tutor@example.com")
+        self.staff.courses.add(course)
+        self.batch = Batch.objects.create(staff=self.staff, batch_name="Morning",
+                                          start_time=datetime.time(9), end_time=datetime.time(11))
+        self.students = [
+            Student.objects.create(student_name=f"Student {i}", join_date=datetime.date(2024, 1, 1), course=course,
+                                   staff=self.staff, batch=self.batch, student_email=f"s{i}@example.com")
+            for i in range(self.STUDENTS)
+        ]
+        self.today = timezone.localdate()
+
+    def run_threads(self, work):
+        """Start THREADS threads together running ``work(index)``; return their exceptions."""
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def run(index):
+            try:
+                barrier.wait()
+                work(index)
+            except Exception as exc:  # collected and asserted on in the test thread
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def post_marks(self, client, day, statuses):
+        data = {"date": day.isoformat()}
+        data.update({f"status_{s.pk}": status for s, status in zip(self.students, statuses)})
+        response = client.post(reverse("student_attendance", args=[self.batch.pk]), data)
+        if response.status_code != 302:
+            raise AssertionError(f"attendance POST returned {response.status_code}")
+
+    def check_attendance(self):
+        def work(index):
+            client = Client()
+            client.force_login(self.user)  # user_logged_in -> mark_attendance, concurrently
+            for round_ in range(self.ROUNDS):
+                # Everyone fights over today...
+                self.post_marks(client, self.today,
+                                ["present" if (index + round_ + n) % 2 else "absent" for n in range(self.STUDENTS)])
+                # ...and each thread also owns one earlier day, to check nothing gets lost
+                self.post_marks(client, self.today - datetime.timedelta(days=index + 1),
+                                ["present" if (index + n) % 3 else "absent" for n in range(self.STUDENTS)])
+
+        errors = self.run_threads(work)
+        self.assertEqual(errors, [])
+
+        today = StudentAttendance.objects.filter(date=self.today)
+        self.assertEqual(today.count(), self.STUDENTS)
+        self.assertEqual(today.values("student").distinct().count(), self.STUDENTS)
+        for index in range(self.THREADS):
+            day = self.today - datetime.timedelta(days=index + 1)
+            expected = {s.pk: bool((index + n) % 3) for n, s in enumerate(self.students)}
+            stored = dict(StudentAttendance.objects.filter(date=day).values_list("student_id", "status"))
+            self.assertEqual(stored, expected, f"marks of thread {index} lost or changed")
+        self.assertEqual(
+            StudentAttendance.objects.count(), self.STUDENTS * (self.THREADS + 1)
+        )
+        self.assertEqual(Attendance.objects.filter(staff=self.staff, date=self.today).count(), 1)
+
+    def test_concurrent_first_saves_of_a_topic(self):
+        topic = CourseTopic.objects.create(course=self.students[0].course, module_name="Basics", topic_name="Syntax")
+        url = reverse("save_topic_progress", args=[self.students[0].pk, topic.pk])
+
+        def work(index):
+            client = Client()
+            client.force_login(self.user)
+            response = client.post(url, {"start_date": "2024-02-01", "marks": index})
+            if response.status_code != 200:
+                raise AssertionError(f"progress POST returned {response.status_code}")
+
+        self.assertEqual(self.run_threads(work), [])
+        self.assertEqual(StudentTopicProgress.objects.filter(student=self.students[0], topic=topic).count(), 1)
+
+    def test_concurrent_attendance_forms(self):
+        self.check_attendance()
+
+    @override_settings(WRITE_QUEUE_ENABLED=True)
+    def test_concurrent_attendance_forms_through_write_queue(self):
+        self.check_attendance()
+
+
+class RunWriteRetryTests(TransactionTestCase):
+    @override_settings(WRITE_RETRY_BASE_DELAY=0)
+    def test_lock_errors_are_retried(self):
+        calls = mock.Mock(side_effect=[OperationalError("database is locked"), "done"], __name__="write")
+        self.assertEqual(run_write(calls), "done")
+        self.assertEqual(calls.call_count, 2)
+
+    @override_settings(WRITE_RETRY_BASE_DELAY=0, WRITE_RETRY_ATTEMPTS=3)
+    def test_gives_up_after_the_configured_attempts(self):
+        calls = mock.Mock(side_effect=OperationalError("database is locked"), __name__="write")
+        with self.assertRaises(OperationalError):
+            run_write(calls)
+        self.assertEqual(calls.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        calls = mock.Mock(side_effect=OperationalError("no such table: x"), __name__="write")
+        with self.assertRaises(OperationalError):
+            run_write(calls)
+        self.assertEqual(calls.call_count, 1)
+
+
+class AdminBulkActionTests(TestCase):
+    """Intermediate-page admin actions change the selected rows only, not the whole changelist."""
+
+    HIDDEN_INPUT = re.compile(r'<input type="hidden" name="([^"]+)" value="([^"]*)">')
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        self.course = Course.objects.create(course_name="Python")
+        self.staff = Staff.objects.create(user=User.objects.create_user("tutor"), staff_name="Tutor",
+                                          staff_email="tutor@example.com")
+        self.staff.courses.add(self.course)
+        self.batch = Batch.objects.create(staff=self.staff, batch_name="Morning",
+                                          start_time=datetime.time(9), end_time=datetime.time(11))
+        self.students = [
+            Student.objects.create(student_name=f"Student {i}", join_date=datetime.date(2024, 1, 1),
+                                   course=self.course, staff=self.staff, batch=self.batch,
+                                   student_email=f"s{i}@example.com")
+            for i in range(4)
+        ]
+        self.day = timezone.localdate() - datetime.timedelta(days=3)
+
+    def run_action(self, model, action, rows, **data):
+        """Post ``action`` for ``rows`` the way the changelist does, then apply it from the intermediate page."""
+        url = reverse(f"admin:myapp_{model._meta.model_name}_changelist")
+        response = self.client.post(url, {
+            "action": action, "select_across": "0", "index": "0",
+            "_selected_action": [row.pk for row in rows],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context["select_across"])
+        payload = {}
+        for name, value in self.HIDDEN_INPUT.findall(response.content.decode()):
+            payload.setdefault(name, []).append(value)
+        self.assertNotIn("select_across", payload)
+        payload.update(data)
+        return self.client.post(url, payload)
+
+    def test_mark_students_on_date_marks_only_the_selection(self):
+        rows = [StudentAttendance.objects.create(student=s, date=self.day, status=False) for s in self.students]
+        target = self.day + datetime.timedelta(days=1)
+        self.run_action(StudentAttendance, "mark_students_on_date", rows[:2], date=target.isoformat(), status="True")
+        self.assertEqual(
+            set(StudentAttendance.objects.filter(date=target).values_list("student_id", flat=True)),
+            {s.pk for s in self.students[:2]},
+        )
+
+    def test_set_dates_changes_only_the_selection(self):
+        topic = CourseTopic.objects.create(course=self.course, module_name="Basics", topic_name="Syntax")
+        rows = [StudentTopicProgress.objects.create(student=s, topic=topic, sign="Tutor") for s in self.students]
+        self.run_action(StudentTopicProgress, "set_dates", rows[:2], start_date=self.day.isoformat())
+        self.assertEqual(
+            set(StudentTopicProgress.objects.filter(start_date=self.day).values_list("pk", flat=True)),
+            {row.pk for row in rows[:2]},
+        )
+
+    def test_reassign_moves_only_the_selection(self):
+        evening = Batch.objects.create(staff=self.staff, batch_name="Evening",
+                                       start_time=datetime.time(17), end_time=datetime.time(19))
+        self.run_action(Student, "reassign_selected", self.students[:2], batch=evening.pk)
+        self.assertEqual(
+            set(Student.objects.filter(batch=evening).values_list("pk", flat=True)),
+            {s.pk for s in self.students[:2]},
+        )
+        self.assertEqual(Student.objects.filter(batch=self.batch).count(), 2)
+
+
+class MarkStudentAttendanceTests(TestCase):
+    """The attendance form for a back-dated day shows that day's roster and marks."""
+
+    def test_back_dated_roster_and_archived_marks(self):
+        course = Course.objects.create(course_name="Python")
+        user = User.objects.create_user("tutor")
+        staff = Staff.objects.create(user=user, staff_name="Tutor", staff_email="tutor@example.com")
+        batch = Batch.objects.create(staff=staff, batch_name="Morning",
+                                     start_time=datetime.time(9), end_time=datetime.time(11))
+        day = timezone.localdate() - datetime.timedelta(days=400)
+
+        def student(name, joined, left=None):
+            return Student.objects.create(student_name=name, join_date=joined, end_date=left, course=course,
+                                          staff=staff, batch=batch, student_email=f"{name}@example.com")
+
+        left_since = student("left", day - datetime.timedelta(days=30), day + datetime.timedelta(days=30))
+        student("joined", day + datetime.timedelta(days=1))
+        StudentAttendanceArchive.objects.create(student=left_since, date=day, status=False)
+
+        self.client.force_login(user)
+        response = self.client.get(reverse("student_attendance", args=[batch.pk]), {"date": day.isoformat()})
+        self.assertEqual(list(response.context["students"]), [left_since])
+        self.assertEqual(response.context["attendance_records"], {left_since.pk: {"status": False}})
+
+
+@override_settings(RISK_WINDOW_DAYS=56, RISK_RECENT_DAYS=14, RISK_MIN_MARKED_DAYS=4, RISK_ABSENCE_STREAK=3,
+                   RISK_ATTENDANCE_DROP=0.25, RISK_STALL_DAYS=21)
+class RiskDetectionTests(TestCase):
+    """Nightly flags, with part of each window already moved to the archive."""
+
+    today = datetime.date(2025, 3, 31)
+
+    def setUp(self):
+        self.course = Course.objects.create(course_name="Python")
+        staff = Staff.objects.create(user=User.objects.create_user("tutor"), staff_name="Tutor",
+                                     staff_email="tutor@example.com")
+        self.students = {
+            name: Student.objects.create(student_name=name, join_date=datetime.date(2024, 1, 1), course=self.course,
+                                         staff=staff, student_email=f"{name}@example.com")
+            for name in ("streak", "falling", "stalled", "steady")
+        }
+
+    def mark(self, name, days_ago, present, archived=False):
+        model = StudentAttendanceArchive if archived else StudentAttendance
+        model.objects.create(student=self.students[name], date=self.today - datetime.timedelta(days=days_ago),
+                             status=present)
+
+    def flags(self):
+        return {(flag.student.student_name, flag.reason): flag.value for flag in detect_at_risk(self.today)}
+
+    def test_streak_trend_and_stalled(self):
+        # Absent on the last three marked days, the first of them archived; a holiday in between is skipped
+        self.mark("streak", 10, True)
+        self.mark("streak", 8, False, archived=True)
+        self.mark("streak", 5, False)
+        self.mark("streak", 2, False)
+        # Always present before the recent part (all archived), half of the time since
+        for days_ago in range(20, 45, 5):
+            self.mark("falling", days_ago, True, archived=True)
+        for days_ago, present in ((9, False), (7, False), (4, True), (1, True)):
+            self.mark("falling", days_ago, present)
+        for days_ago in range(1, 40, 3):
+            self.mark("steady", days_ago, days_ago % 2 == 0)
+
+        topics = [CourseTopic.objects.create(course=self.course, module_name="Basics", topic_name=name)
+                  for name in ("Loops", "Functions", "Classes")]
+        stalled, steady = self.students["stalled"], self.students["steady"]
+        StudentTopicProgress.objects.create(student=stalled, topic=topics[0],
+                                            start_date=self.today - datetime.timedelta(days=30), sign="Tutor")
+        StudentTopicProgress.objects.create(student=stalled, topic=topics[1],
+                                            start_date=self.today - datetime.timedelta(days=25), sign="Tutor")
+        StudentTopicProgress.objects.create(student=steady, topic=topics[2], sign="Tutor",
+                                            start_date=self.today - datetime.timedelta(days=10))
+        StudentTopicProgress.objects.create(student=steady, topic=topics[0], sign="Tutor",
+                                            start_date=self.today - datetime.timedelta(days=40),
+                                            end_date=self.today - datetime.timedelta(days=30))
+
+        self.assertEqual(self.flags(), {
+            ("streak", StudentRiskFlag.ABSENCE_STREAK): 3,
+            ("falling", StudentRiskFlag.FALLING_ATTENDANCE): 0.5,
+            ("stalled", StudentRiskFlag.STALLED_PROGRESS): 30,
+        })
+
+    def test_marks_outside_the_window_are_ignored(self):
+        for days_ago in (60, 58, 56):
+            self.mark("streak", days_ago, False, archived=True)
+        self.assertEqual(self.flags(), {})
+
+    def test_store_flags_keeps_first_flagged_while_a_flag_persists(self):
+        for days_ago in (3, 2, 1):
+            self.mark("streak", days_ago, False)
+        self.mark("falling", 1, False)
+        self.assertEqual(store_flags(detect_at_risk(self.today), self.today), 1)
+        StudentRiskFlag.objects.create(student=self.students["falling"], reason=StudentRiskFlag.STALLED_PROGRESS,
+                                       value=40, detail="stale", first_flagged=self.today, computed_at=timezone.now())
+
+        later = self.today + datetime.timedelta(days=1)
+        self.mark("streak", 0, False)
+        store_flags(detect_at_risk(later), later)
+        stored = list(StudentRiskFlag.objects.values_list("student__student_name", "reason", "value", "first_flagged"))
+        self.assertEqual(stored, [("streak", StudentRiskFlag.ABSENCE_STREAK, 4, self.today)])
+
+
+class StudentTimelineTests(TestCase):
+    """Keyset pages of the UNION ALL timeline: every event exactly once, in (day, kind, ref) order."""
+
+    def setUp(self):
+        course = Course.objects.create(course_name="Python")
+        staff = Staff.objects.create(user=User.objects.create_user("tutor"), staff_name="Tutor",
+                                     staff_email="tutor@example.com")
+        batches = [
+            Batch.objects.create(staff=staff, batch_name=name, start_time=datetime.time(hour),
+                                 end_time=datetime.time(hour + 2))
+            for name, hour in (("Morning", 9), ("Noon", 12))
+        ]
+        self.student = Student.objects.create(student_name="Student", join_date=datetime.date(2024, 1, 1),
+                                              course=course, staff=staff, student_email="s@example.com")
+        days = [datetime.date(2024, 3, d) for d in (1, 2, 3)]
+        for day in days:
+            # Every kind on every day, and several events of one kind on a day
+            StudentAttendance.objects.create(student=self.student, date=day, status=True)
+            StudentAttendanceArchive.objects.create(student=self.student, date=day, status=False)
+            for i in range(3):
+                topic = CourseTopic.objects.create(course=course, module_name=f"M{day.day}", topic_name=f"T{i}")
+                StudentTopicProgress.objects.create(student=self.student, topic=topic, start_date=day, end_date=day,
+                                                    marks=i, sign="Tutor")
+            for i in range(2):
+                StudentBatchChange.objects.create(
+                    student=self.student, from_batch=batches[i], to_batch=batches[1 - i],
+                    changed_at=timezone.make_aware(datetime.datetime.combine(day, datetime.time(10 + i))))
+        # attendance, archived attendance, 3 topics started, 3 completed and 2 moves on each of 3 days
+        self.total = 3 * 10
+
+    def walk(self, limit):
+        events, before = [], None
+        while True:
+            page = student_timeline(self.student.pk, before=before, limit=limit)
+            self.assertLessEqual(len(page["events"]), limit)
+            events += page["events"]
+            if not page["next"]:
+                return events
+            self.assertEqual(page["next"], page["events"][-1]["cursor"])
+            before = page["next"]
+
+    def test_pages_cover_every_event_once(self):
+        everything = student_timeline(self.student.pk, limit=MAX_PAGE_SIZE)
+        self.assertIsNone(everything["next"])
+        self.assertEqual(len(everything["events"]), self.total)
+        keys = [decode_cursor(e["cursor"]) for e in everything["events"]]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertEqual(len(set(keys)), len(keys))
+        for limit in (1, 2, 3, 4, 7):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.walk(limit), everything["events"])
+
+    def test_boundary_inside_a_run_of_one_kind(self):
+        # Cut right after the first of the three topics completed on the newest day
+        first = student_timeline(self.student.pk, limit=MAX_PAGE_SIZE)["events"]
+        completed = [i for i, e in enumerate(first) if e["kind"] == "Topic completed"]
+        page = student_timeline(self.student.pk, before=first[completed[0]]["cursor"], limit=2)
+        self.assertEqual(page["events"], first[completed[0] + 1:completed[0] + 3])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            student_timeline(self.student.pk, before="2024-03-01.x")
+
+
+class ConditionalPageTests(TestCase):
+    """Repeat GETs of an unchanged staff page get a 304 without running the view."""
+
+    def setUp(self):
+        self.course = Course.objects.create(course_name="Python")
+        self.user = User.objects.create_user("tutor")
+        staff = Staff.objects.create(user=self.user, staff_name="Tutor", staff_email="tutor@example.com")
+        batch = Batch.objects.create(staff=staff, batch_name="Morning",
+                                     start_time=datetime.time(9), end_time=datetime.time(11))
+        self.student = Student.objects.create(student_name="Student", join_date=datetime.date(2024, 1, 1),
+                                              course=self.course, staff=staff, batch=batch,
+                                              student_email="s@example.com")
+        self.client.force_login(self.user)
+        self.url = reverse("get_batches")
+
+    def etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_unchanged_page_is_not_modified(self):
+        etag = self.etag()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_a_new_mark_changes_the_page(self):
+        etag = self.etag()
+        StudentAttendance.objects.create(student=self.student, date=timezone.localdate(), status=True)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_pending_messages_are_always_rendered(self):
+        etag = self.etag()
+        self.client.cookies["messages"] = CookieStorage(HttpRequest())._encode([Message(INFO, "Saved.")])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_differs_between_users(self):
+        etag = self.etag()
+        other = User.objects.create_user("other")
+        Staff.objects.create(user=other, staff_name="Other", staff_email="other@example.com")
+        self.client.force_login(other)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class CurriculumInvalidationTests(TestCase):
+    """CourseTopic writes drop the process and shared copies of the curriculum, only once committed."""
+
+    def setUp(self):
+        cache.clear()
+        self.python = Course.objects.create(course_name="Python")
+        self.java = Course.objects.create(course_name="Java")
+        self.topic = CourseTopic.objects.create(course=self.python, module_name="Basics", topic_name="Loops")
+        CourseTopic.objects.create(course=self.java, module_name="Basics", topic_name="Classes")
+
+    def cached(self, course):
+        """(process copy, shared copy) of ``course``'s curriculum, None where dropped."""
+        key = curriculum_cache_key(course.pk, "default")
+        return curriculum_module._compiled.get(("default", course.pk)), cache.get(key)
+
+    def assert_dropped_on_commit(self, write, *courses):
+        for course in courses:
+            curriculum(course.pk, "default")
+        with self.captureOnCommitCallbacks() as callbacks:
+            write()
+            for course in courses:
+                self.assertNotIn(None, self.cached(course), "dropped before the commit")
+        for callback in callbacks:
+            callback()
+        for course in courses:
+            self.assertEqual(self.cached(course), (None, None))
+
+    def test_save(self):
+        def rename():
+            self.topic.topic_name = "While loops"
+            self.topic.save()
+        self.assert_dropped_on_commit(rename, self.python)
+        self.assertEqual([t.topic_name for t in curriculum(self.python.pk, "default").topics], ["While loops"])
+
+    def test_delete(self):
+        self.assert_dropped_on_commit(self.topic.delete, self.python)
+        self.assertEqual(curriculum(self.python.pk, "default").topics, ())
+
+    def test_move_to_another_course(self):
+        topic = CourseTopic.objects.get(pk=self.topic.pk)
+
+        def move():
+            topic.course = self.java
+            topic.save()
+        self.assert_dropped_on_commit(move, self.python, self.java)
+        self.assertEqual(curriculum(self.python.pk, "default").topics, ())
+        self.assertEqual(len(curriculum(self.java.pk, "default").topics), 2)
+
+
+class ColumnarSnapshotTests(TestCase):
+    """A month exported to bitset files reads back as the attendance in the database."""
+
+    def setUp(self):
+        course = Course.objects.create(course_name="Python")
+        staff = Staff.objects.create(user=User.objects.create_user("tutor"), staff_name="Tutor",
+                                     staff_email="tutor@example.com")
+        self.batch = Batch.objects.create(staff=staff, batch_name="Morning",
+                                          start_time=datetime.time(9), end_time=datetime.time(11))
+        self.students = [
+            Student.objects.create(student_name=f"Student {i}", join_date=datetime.date(2024, 1, 1), course=course,
+                                   staff=staff, batch=self.batch, student_email=f"s{i}@example.com")
+            for i in range(5)
+        ]
+        for i, student in enumerate(self.students):
+            for day in range(1, 31, i + 2):
+                model = StudentAttendanceArchive if day < 10 else StudentAttendance
+                model.objects.create(student=student, date=datetime.date(2024, 4, day), status=(day + i) % 3 != 0)
+        StudentAttendance.objects.create(student=self.students[0], date=datetime.date(2024, 4, 30), status=None)
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(ATTENDANCE_SNAPSHOT_DIR=directory):
+            entry = export_month(2024, 4)
+            self.assertEqual(entry["batches"][str(self.batch.pk)]["students"], 5)
+            self.assertIsNone(export_month(2024, 4))  # unchanged fingerprint
+
+            loaded = load_batch(self.batch.pk, datetime.date(2024, 4, 1), datetime.date(2024, 4, 30))
+            self.assertEqual(list(loaded.student_ids), sorted(s.pk for s in self.students))
+            self.assertEqual(loaded.marked.shape, (5, 30))
+            for row, student_id in enumerate(loaded.student_ids):
+                history = list(attendance_history(student_id=int(student_id), status__isnull=False))
+                self.assertEqual(int(loaded.marked[row].sum()), len(history))
+                self.assertEqual(int(loaded.present[row].sum()), sum(1 for *_, status in history if status))
+                for _, day, _, status in history:
+                    self.assertTrue(loaded.marked[row, day.day - 1])
+                    self.assertEqual(loaded.present[row, day.day - 1], status)
+            self.assertEqual(verify_month(2024, 4), [])
+
+            StudentAttendance.objects.create(student=self.students[1], date=datetime.date(2024, 4, 12), status=True)
+            self.assertEqual(verify_month(2024, 4), [f"2024-04 batch {self.batch.pk}: 1 student-days differ"])
+            entry = export_month(2024, 4)
+            self.assertIsNotNone(entry)
+            self.assertEqual(verify_month(2024, 4), [])
+
+            path = os.path.join(directory, "default", entry["batches"][str(self.batch.pk)]["file"])
+            with open(path, "r+b") as fh:
+                fh.seek(-1, os.SEEK_END)
+                fh.write(b"\xff")
+            self.assertEqual(verify_month(2024, 4),
+                             [f"2024-04 batch {self.batch.pk}: file missing or checksum mismatch"])
+
+
+@override_settings(BRANCH_DATABASES={"chennai": "branch_test"})
+class BranchDatabaseTests(TransactionTestCase):
+    """A branch moved into its own database is read from there, by session branch and per database."""
+
+    alias = "branch_test"  # settings/base.py
+    databases = {"default", alias}
+
+    def test_move_then_route_by_session_branch(self):
+        branch = Branch.objects.create(name="Chennai", code="chennai")
+        shared = Course.objects.create(course_name="Python")
+        user = User.objects.create_user("tutor")
+        staff = Staff.objects.create(user=user, staff_name="Tutor", staff_email="tutor@example.com", branch=branch)
+        staff.courses.add(shared)
+        batch = Batch.objects.create(staff=staff, batch_name="Chennai morning",
+                                     start_time=datetime.time(9), end_time=datetime.time(11))
+        student = Student.objects.create(student_name="Student", join_date=datetime.date(2024, 1, 1), course=shared,
+                                         staff=staff, batch=batch, student_email="s@example.com")
+        StudentAttendance.objects.create(student=student, date=datetime.date(2024, 3, 1), status=True)
+
+        call_command("move_branch_data", "chennai", "--delete", stdout=io.StringIO())
+        for model, default, moved in ((Staff, 0, 1), (Student, 0, 1), (StudentAttendance, 0, 1), (Course, 1, 1)):
+            self.assertEqual(model.objects.using("default").count(), default, model.__name__)
+            self.assertEqual(model.objects.using(self.alias).count(), moved, model.__name__)
+        self.assertEqual(list(Staff.objects.using(self.alias).get().courses.all()), [shared])
+
+        self.assertEqual(for_each_database(lambda alias: Student.objects.count()), {"default": 0, self.alias: 1})
+
+        # remember_branch also routes the rest of the login request; outside a request, undo that here
+        with using_database(None):
+            self.client.force_login(user)
+        self.assertEqual(self.client.session[SESSION_KEY], "chennai")
+        response = self.client.get(reverse("student_list", args=[batch.pk]))
+        self.assertContains(response, "Chennai morning")
+        # The login's check-in went to the branch database as well
+        self.assertEqual(Attendance.objects.using(self.alias).filter(staff_id=staff.pk).count(), 1)
+        self.assertFalse(Attendance.objects.using("default").exists())
+
+
+class RequestProfilingTests(TestCase):
+    @override_settings(PROFILING_ENABLED=True, PROFILING_SLOW_LOG=None)
+    def test_unresolved_paths_share_one_endpoint(self):
+        for path in ("/no-such-page/", "/wp-login.php"):
+            self.assertEqual(self.client.get(path).status_code, 404)
+        names = [row["url_name"] for row in endpoint_summary()]
+        self.assertNotIn("/no-such-page/", names)
+        self.assertIn("unmatched", names)
+
+
+class FastDeleteTests(TestCase):
+    """Hot tables keep Django's fast delete: no per-row delete signals on them."""
+
+    def test_student_attendance(self):
+        self.assertTrue(Collector(using="default").can_fast_delete(StudentAttendance.objects.all()))
+
+    def test_student_topic_progress(self):
+        self.assertTrue(Collector(using="default").can_fast_delete(StudentTopicProgress.objects.all()))
+
+
+class AnalyticsDashboardTests(TestCase):
+    def test_non_numeric_course_is_not_found(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        response = self.client.get(reverse("analytics_dashboard"), {"course": "abc"})
+        self.assertEqual(response.status_code, 404)
+
+
+class AttendanceSyncTests(TestCase):
+    def test_repeated_client_id_is_rejected(self):
+        course = Course.objects.create(course_name="Python")
+        staff = Staff.objects.create(user=User.objects.create_user("tutor"), staff_name="Tutor",
+                                     staff_email="tutor@example.com")
+        batch = Batch.objects.create(staff=staff, batch_name="Morning",
+                                     start_time=datetime.time(9), end_time=datetime.time(11))
+        student = Student.objects.create(student_name="Student", join_date=datetime.date(2024, 1, 1), course=course,
+                                         staff=staff, batch=batch, student_email="s@example.com")
+        day = (timezone.localdate() - datetime.timedelta(days=1)).isoformat()
+        entry = {"batch_id": batch.pk, "student_id": student.pk, "date": day}
+        results = apply_attendance_entries(staff, [
+            {**entry, "client_id": "a", "status": "present"},
+            {**entry, "client_id": "a", "status": "absent"},
+            {**entry, "client_id": "b", "status": "present"},
+        ])
+        self.assertEqual([r["ok"] for r in results], [False, False, True])
+        self.assertEqual(results[0]["error"], "client_id repeated in this request")
+        self.assertEqual(list(StudentAttendance.objects.values_list("status", flat=True)), [True])
+
+    def test_page_tells_the_queue_its_limit_and_owner(self):
+        user = User.objects.create_user("tutor")
+        staff = Staff.objects.create(user=user, staff_name="Tutor", staff_email="tutor@example.com")
+        batch = Batch.objects.create(staff=staff, batch_name="Morning",
+                                     start_time=datetime.time(9), end_time=datetime.time(11))
+        self.client.force_login(user)
+        response = self.client.get(reverse("student_attendance", args=[batch.pk]))
+        self.assertContains(response, f'data-sync-limit="{MAX_ENTRIES}"')
+        self.assertContains(response, f'data-user-id="{user.pk}"')
+
+
+class IncrementalBackupTests(TransactionTestCase):
+    """Deletes that set foreign keys to NULL are not visible to an incremental snapshot."""
+
+    def test_deleted_batch_forces_a_full_snapshot(self):
+        course = Course.objects.create(course_name="Python")
+        staff = Staff.objects.create(user=User.objects.create_user("tutor"), staff_name="Tutor",
+                                     staff_email="tutor@example.com")
+        batches = [
+            Batch.objects.create(staff=staff, batch_name=name, start_time=datetime.time(hour),
+                                 end_time=datetime.time(hour + 2))
+            for name, hour in (("Morning", 9), ("Noon", 12))
+        ]
+        for i, batch in enumerate(batches * 2):
+            Student.objects.create(student_name=f"Student {i}", join_date=datetime.date(2024, 1, 1), course=course,
+                                   staff=staff, batch=batch, student_email=f"s{i}@example.com")
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(BACKUP_DIR=directory, BACKUP_STEP_SLEEP=0):
+            self.assertEqual(take_snapshot()["kind"], "full")
+            Batch.objects.create(staff=staff, batch_name="Evening", start_time=datetime.time(18),
+                                 end_time=datetime.time(20))
+            self.assertEqual(take_snapshot(incremental=True)["kind"], "incremental")
+
+            batches[0].delete()
+            self.assertEqual(Student.objects.filter(batch__isnull=True).count(), 2)
+            manifest = take_snapshot(incremental=True)
+            self.assertEqual(manifest["kind"], "full")
+            restore_snapshot(manifest["name"], dry_run=True)  # foreign_key_check passes
+            self.assertEqual(take_snapshot(incremental=True)["kind"], "incremental")
+
+
+class MetricsSnapshotTests(TestCase):
+    def test_snapshots_of_exited_workers_are_dropped(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                                  capture_output=True, text=True).stdout.strip()
+            stale = os.path.join(directory, f"metrics-{dead}-deadbeef.json")
+            with open(stale, "w") as fh:
+                json.dump({"counters": [["myapp_logins_total", [["outcome", "success"]], 1000]]}, fh)
+
+            metrics.inc("myapp_logins_total", outcome="success")
+            counters, _ = metrics._collect()
+            self.assertLess(counters[("myapp_logins_total", (("outcome", "success"),))], 1000)
+            self.assertFalse(os.path.exists(stale))
+
+            own = metrics._snapshot_path(directory)
+            self.assertTrue(os.path.exists(own))
+            metrics._remove_snapshot()
+            self.assertFalse(os.path.exists(own))
+
+
+class LoadtestRushTests(TestCase):
+    def test_lock_errors_are_read_from_the_server_metrics(self):
+        def scrape():
+            with mock.patch("urllib.request.urlopen", return_value=io.BytesIO(metrics.render().encode())) as urlopen:
+                retries = write_retries("http://127.0.0.1:8000/", timeout=1)
+            urlopen.assert_called_once_with("http://127.0.0.1:8000/metrics", timeout=1)
+            return retries
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            before = scrape()
+            metrics.inc("myapp_db_write_retries_total", 3, outcome="retried")
+            metrics.inc("myapp_db_write_retries_total", outcome="gave_up")
+            after = scrape()
+            metrics._remove_snapshot()
+        self.assertEqual(after - before, {"retried": 3, "gave_up": 1})
+
+    def test_unreachable_metrics(self):
+        with mock.patch("urllib.request.urlopen", side_effect=urllib.error.URLError("refused")):
+            self.assertIsNone(write_retries("http://127.0.0.1:8000", timeout=1))
+
+
+class ScheduleIndexTests(SimpleTestCase):
+    def batch(self, pk, staff_id, start, end, room="", branch_id=None):
+        return Batch(batch_id=pk, staff_id=staff_id, batch_name=f"B{pk}", room=room, branch_id=branch_id,
+                     start_time=datetime.time(*start), end_time=datetime.time(*end))
+
+    def setUp(self):
+        self.index = ScheduleIndex([
+            self.batch(1, staff_id=1, start=(9,), end=(11,), room="Lab 1"),
+            self.batch(2, staff_id=1, start=(14,), end=(16,), room="Lab 2"),
+            self.batch(3, staff_id=2, start=(10,), end=(12,), room="Lab 1"),
+        ])
+
+    def clashes(self, staff_id, start, end, room="", exclude=None):
+        found = self.index.clashes(staff_id, datetime.time(*start), datetime.time(*end), room=room, exclude=exclude)
+        return {kind: [b.pk for b in batches] for kind, batches in found.items()}
+
+    def test_staff_overlap(self):
+        self.assertEqual(self.clashes(1, (10, 30), (14, 30)), {"staff": [1, 2], "room": []})
+
+    def test_room_overlap_is_case_insensitive(self):
+        self.assertEqual(self.clashes(3, (11,), (13,), room=" lab 1"), {"staff": [], "room": [3]})
+
+    def test_touching_intervals_do_not_clash(self):
+        self.assertEqual(self.clashes(1, (11,), (14,), room="Lab 1"), {"staff": [], "room": [3]})
+        self.assertEqual(self.clashes(1, (12,), (14,), room="Lab 1"), {"staff": [], "room": []})
+
+    def test_exclude_skips_the_batch_being_edited(self):
+        self.assertEqual(self.clashes(1, (9,), (11,), room="Lab 1", exclude=1), {"staff": [], "room": [3]})
+
+    def test_seed_slots_do_not_overlap(self):
+        slots = IntervalIndex([(minutes(start), minutes(end), name) for name, start, end in BATCH_SLOTS])
+        self.assertEqual(slots.conflicts(), [])
@@ -0,0 +1,115 @@
+# myapp/timeline.py
+"""
+One chronological stream of everything that happened to a student:
+attendance (live and archived), topics started and completed, batch moves.
+
+Each source is a queryset projected onto the same columns
+(day, kind, ref, label, value); they are combined with UNION ALL and the
+database sorts and limits the result, so only one page is ever fetched.
+Pages use keyset pagination on (day, kind, ref) rather than OFFSET: the
+cursor of the last row becomes a WHERE condition on every source, so the
+hundredth page costs the same as the first.
+"""
+from datetime import date
+
+from django.db.models import CharField, DateField, F, IntegerField, Value
+from django.db.models.functions import Cast, Coalesce, Concat, TruncDate
+
+from .models import StudentAttendance, StudentAttendanceArchive, StudentBatchChange, StudentTopicProgress
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# kind -> label shown to staff; the number also orders events within a day
+# (higher first, since the newest events come first)
+KINDS = {
+    1: "Attendance",
+    2: "Attendance (archived)",
+    3: "Topic started",
+    4: "Topic completed",
+    5: "Batch changed",
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _sources(student_id):
+    """(kind, queryset with a ``day`` annotation, the other columns) for every event source."""
+    text, number = CharField(), IntegerField()
+    progress = StudentTopicProgress.objects.filter(student_id=student_id)
+    topic = Concat("topic__module_name", Value(" - "), "topic__topic_name", output_field=text)
+    return [
+        (1, StudentAttendance.objects.filter(student_id=student_id, status__isnull=False)
+            .annotate(day=F("date")),
+         dict(label=Value("", output_field=text), value=Cast("status", number))),
+        (2, StudentAttendanceArchive.objects.filter(student_id=student_id, status__isnull=False)
+            .annotate(day=F("date")),
+         dict(label=Value("", output_field=text), value=Cast("status", number))),
+        (3, progress.filter(start_date__isnull=False).annotate(day=F("start_date")),
+         dict(label=topic, value=Value(None, output_field=number))),
+        (4, progress.filter(end_date__isnull=False).annotate(day=F("end_date")),
+         dict(label=topic, value=F("marks"))),
+        (5, StudentBatchChange.objects.filter(student_id=student_id)
+            .annotate(day=TruncDate("changed_at", output_field=DateField())),
+         dict(label=Concat(Coalesce("from_batch__batch_name", Value("-")), Value(" -> "),
+                           Coalesce("to_batch__batch_name", Value("-")), output_field=text),
+              value=Value(None, output_field=number))),
+    ]
+
+
+def _older_than(queryset, kind, cursor):
+    """Rows of one source that sort after ``cursor`` in (day, kind, ref) DESC order."""
+    day, cursor_kind, ref = cursor
+    if kind > cursor_kind:
+        return queryset.filter(day__lt=day)
+    if kind < cursor_kind:
+        return queryset.filter(day__lte=day)
+    return queryset.filter(day__lt=day) | queryset.filter(day=day, pk__lt=ref)
+
+
+def encode_cursor(row):
+    return f"{row['day'].isoformat()}.{row['kind']}.{row['ref']}"
+
+
+def decode_cursor(value):
+    try:
+        day, kind, ref = value.split(".")
+        return date.fromisoformat(day), int(kind), int(ref)
+    except ValueError:
+        raise InvalidCursor(f"Invalid cursor: {value!r}")
+
+
+def student_timeline(student_id, before=None, limit=PAGE_SIZE):
+    """
+    One page of ``student_id``'s events, newest first.
+
+    ``before`` is the ``next`` cursor of the previous page. Returns
+    {"events": [...], "next": cursor or None}.
+    """
+    cursor = decode_cursor(before) if before else None
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    parts = []
+    for kind, queryset, columns in _sources(student_id):
+        if cursor:
+            queryset = _older_than(queryset, kind, cursor)
+        parts.append(
+            queryset.order_by().values(
+                "day", kind=Value(kind, output_field=IntegerField()), ref=F("pk"), **columns
+            )
+        )
+    combined = parts[0].union(*parts[1:], all=True).order_by("-day", "-kind", "-ref")
+    rows = list(combined[:limit + 1])
+
+    events = [
+        {
+            "date": row["day"],
+            "kind": KINDS[row["kind"]],
+            "label": row["label"],
+            "value": row["value"],
+            "cursor": encode_cursor(row),
+        }
+        for row in rows[:limit]
+    ]
+    return {"events": events, "next": events[-1]["cursor"] if len(rows) > limit else None}
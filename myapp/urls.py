@@ -9,7 +9,11 @@ urlpatterns = [
     path('students/<int:batch_id>/', views.student_list, name='student_list'),  
     path('student/<int:student_id>/<int:batch_id>', views.student_detail, name='student_detail'),
     path('student/<int:student_id>/<int:batch_id>/progress/', views.add_progress, name='add_progress'),
+    path('student/<int:student_id>/progress/<int:topic_id>/', views.save_topic_progress, name='save_topic_progress'),
+    path('student/<int:student_id>/<int:batch_id>/timeline/', views.student_timeline, name='student_timeline'),
+    path('student/<int:student_id>/timeline.json', views.student_timeline_json, name='student_timeline_json'),
     path("attendance/<int:batch_id>", views.mark_student_attendance, name="student_attendance"),
+    path("attendance/sync/", views.sync_student_attendance, name="sync_student_attendance"),
     path('add_batch/', views.add_batch, name='add_batch'),
     path('register_staff/', views.register_staff, name='register_staff'),
 
@@ -2,11 +2,15 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Student, StudentTopicProgress, Staff, CourseTopic , Attendance , StudentAttendance ,Batch
+from .models import Student, StudentTopicProgress, Staff, CourseTopic , Attendance , StudentAttendance ,Batch, Course, active_student_q
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib import messages
+from django.conf import settings
 from django.forms import modelformset_factory
+from django.core.paginator import Paginator
 from django import forms
 from django.utils.timezone import now,localdate,datetime
 from django.utils import timezone
@@ -14,8 +18,27 @@ from django.urls import reverse
 from datetime import date
 import logging
 from django.views.decorators.http import require_GET
+from .middleware import endpoint_summary, recent_slow_requests
+from .analytics import AnalyticsUnavailable, course_analytics, invalidate_course
+from .reassign import reassign_students
+from .attendance_sync import MAX_ENTRIES, apply_attendance_entries
+from . import metrics
+from . import live
+from .curriculum import curriculum
+from .hashers import hashing_slot
+from . import timeline
+from .schedule import schedule_index
+from .writes import run_write
+from .archive import attendance_history
+from .conditional import conditional_page, page_state
+from .models import Branch, StudentRiskFlag
+from .routers import SESSION_KEY, branch_alias, current_alias, for_each_database
+from django.views.decorators.http import require_POST
+import json
+from django.core.exceptions import ValidationError
 
 logger = logging.getLogger(__name__)
+attendance_logger = logging.getLogger("myapp.attendance")
 
 
 def home(request):
@@ -48,56 +71,126 @@ def register_staff(request):
     return render(request,'register_staff.html')
 
 
+def _student_detail_state(request, student_id, batch_id):
+    return page_state(
+        Student.objects.filter(pk=student_id),
+        progress=StudentTopicProgress.objects.filter(student_id=student_id),
+        # Only the student's course: other courses' topics must not change this ETag
+        topics=CourseTopic.objects.filter(course_id__in=Student.objects.filter(pk=student_id).values('course_id')),
+    )
+
+
 @login_required
+@conditional_page(_student_detail_state)
 def student_detail(request, student_id,batch_id):
     student = get_object_or_404(Student, pk=student_id)
 
-    print("student :",student)
+    logger.debug("student_detail: %s (batch %s)", student, batch_id)
     #  Only allow staff to see their own students
     if hasattr(request.user, 'staff'):
         if student.staff != request.user.staff:
             return redirect('home')
 
-    #  Fetch all topics for the student's course
-    # topics = CourseTopic.objects.filter(course=student.course).order_by('module_name', 'topic_name')
-    topics = CourseTopic.objects.filter(course=student.course).order_by('topic_id')
+    # Topics come from the compiled curriculum; progress is joined in memory
+    topic_progress_list = curriculum(student.course_id).with_progress(
+        StudentTopicProgress.objects.filter(student=student)
+    )
 
+    return render(request, 'student_detail.html', {
+        'student': student,
+        'topic_progress_list': topic_progress_list,
+        'batch_id': batch_id,
+    })
 
-    #  Get progress for each topic (or None if not yet added)
-    progress_dict = {
-        p.topic_id: p for p in StudentTopicProgress.objects.filter(student=student)
-    }
+def _timeline_page(request, student_id):
+    """The requested timeline page of a student the user may see; raises Http404."""
+    student = get_object_or_404(Student, pk=student_id)
+    if hasattr(request.user, 'staff') and student.staff != request.user.staff:
+        raise Http404("No such student.")
+    try:
+        limit = int(request.GET.get('limit', timeline.PAGE_SIZE))
+    except ValueError:
+        limit = timeline.PAGE_SIZE
+    return student, timeline.student_timeline(student.pk, before=request.GET.get('before'), limit=limit)
 
-    # Build a list with topic + progress (if exists)
-    topic_progress_list = []
-    for topic in topics:
-        topic_progress_list.append({
-            "topic": topic,
-            "progress": progress_dict.get(topic.pk)
-        })
 
-    return render(request, 'student_detail.html', {
+@login_required
+def student_timeline(request, student_id, batch_id):
+    try:
+        student, page = _timeline_page(request, student_id)
+    except timeline.InvalidCursor:
+        return redirect('student_timeline', student_id=student_id, batch_id=batch_id)
+    return render(request, 'student_timeline.html', {
         'student': student,
-        'topic_progress_list': topic_progress_list,
+        'events': page['events'],
+        'next': page['next'],
         'batch_id': batch_id,
     })
 
+
+@require_GET
 @login_required
+def student_timeline_json(request, student_id):
+    """Timeline API: ?before=<next cursor>&limit=N, newest first."""
+    try:
+        student, page = _timeline_page(request, student_id)
+    except timeline.InvalidCursor as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({'student_id': student.pk, **page})
+
+
+def _warn_schedule_clashes(request, batch):
+    """Flash a warning when ``batch`` overlaps another batch of its staff or its room."""
+    clashes = schedule_index().batch_clashes(batch)
+    for other in clashes['staff'] + clashes['room']:
+        messages.warning(request, f"{batch.batch_name} overlaps {other.staff.staff_name}'s batch {other}.")
+
+
+def _student_list_state(request, batch_id):
+    return page_state(
+        Batch.objects.filter(pk=batch_id, staff__user=request.user),
+        batches=Batch.objects.filter(staff__user=request.user),
+        students=Student.objects.filter(batch_id=batch_id),
+        attendance=Attendance.objects.filter(staff__user=request.user, date=localdate()),
+    )
+
+
+@login_required
+@conditional_page(_student_list_state)
 def student_list(request,batch_id):
     staff = get_object_or_404(Staff, user=request.user)
     batch=get_object_or_404(Batch, pk=batch_id, staff=staff)
-    students = Student.objects.filter(staff=staff,batch=batch)
+    students = Student.active.filter(staff=staff,batch=batch)
     batches=Batch.objects.filter(staff=staff)
 
     today = localdate()
     attendance=Attendance.objects.filter(staff=staff,date=today).last()
-    print(attendance)
+    logger.debug("student_list: staff attendance today %s", attendance)
+    if request.method == "POST" and 'bulk' in request.POST:
+        # Multi-select: one validated UPDATE for every ticked student
+        selected = Student.objects.filter(pk__in=request.POST.getlist('selected'), staff=staff)
+        changes = {}
+        if request.POST.get('bulk_batch'):
+            changes['batch'] = get_object_or_404(Batch, pk=request.POST['bulk_batch'], staff=staff)
+        if request.POST.get('bulk_mode') in ['True', 'False']:
+            changes['mode'] = request.POST['bulk_mode'] == 'True'
+        try:
+            updated = reassign_students(selected, **changes)
+        except ValidationError as exc:
+            messages.error(request, " ".join(exc.messages))
+        else:
+            messages.success(request, f"Updated {updated} student(s).")
+            if changes.get('batch'):
+                _warn_schedule_clashes(request, changes['batch'])
+        return redirect('student_list', batch_id=batch_id)
     if request.method == "POST":
         student_id = request.POST.get('student_id')
         new_batch_id = request.POST.get('batch')
         student = get_object_or_404(Student, pk=student_id, staff=staff)
         if new_batch_id:
             new_batch = get_object_or_404(Batch, pk=new_batch_id, staff=staff)
+            if new_batch.pk != student.batch_id:
+                _warn_schedule_clashes(request, new_batch)
             student.batch = new_batch
 
         # Update batch and mode
@@ -112,7 +205,54 @@ def student_list(request,batch_id):
         student.save()
         return redirect('student_list', batch_id=batch_id)
     all_batches = Batch.objects.filter(staff=staff)
-    return render(request, 'student_list.html', {'students': students , 'attendance':attendance,'batch':batch,'all_batches':all_batches,'batches':batches,})
+    return render(request, 'student_list.html', {'students': students , 'attendance':attendance,'batch':batch,'all_batches':all_batches,'batches':batches,'mode_choices':Student.MODE_CHOICES,})
+
+
+class ProgressForm(forms.ModelForm):
+    class Meta:
+        model = StudentTopicProgress
+        fields = ('start_date', 'end_date', 'marks')
+        widgets = {
+            'start_date': forms.DateInput(attrs={'type': 'date'}),
+            'end_date': forms.DateInput(attrs={'type': 'date'}),
+        }
+
+
+ProgressFormSet = modelformset_factory(StudentTopicProgress, form=ProgressForm, extra=0)
+
+
+def _ensure_progress_rows(student, topic_ids):
+    """Create the missing progress rows of ``topic_ids`` with one INSERT."""
+    existing = set(
+        StudentTopicProgress.objects.filter(student=student, topic_id__in=topic_ids).values_list('topic_id', flat=True)
+    )
+    missing = [StudentTopicProgress(student=student, topic_id=pk) for pk in topic_ids if pk not in existing]
+    if missing:
+        # bulk_create sends no post_save, so drop the course analytics here
+        StudentTopicProgress.objects.bulk_create(missing, ignore_conflicts=True)
+        invalidate_course(student.course_id)
+
+
+def _save_progress_forms(formset, staff):
+    for form in formset.forms:
+        # Untouched rows are not written again
+        if form.has_changed():
+            progress = form.save(commit=False)
+            progress.sign = staff.staff_name
+            progress.save()
+
+
+def _progress_slice(request, course):
+    """
+    The topics of one module of ``course`` (a Curriculum), one page of them
+    at a time, so the editing form stays small however big the course is.
+    """
+    modules = [{'module_name': name, 'topic_count': len(topics)} for name, topics in course.modules]
+    module = request.GET.get('module')
+    if modules and module not in {m['module_name'] for m in modules}:
+        module = modules[0]['module_name']
+    paginator = Paginator(course.module(module), getattr(settings, 'PROGRESS_PAGE_SIZE', 50))
+    return modules, module, paginator.get_page(request.GET.get('page'))
 
 
 @login_required
@@ -120,55 +260,63 @@ def add_progress(request, student_id,batch_id):
     staff = get_object_or_404(Staff, user=request.user)
     student = get_object_or_404(Student, pk=student_id, staff=staff)
     batch = get_object_or_404(Batch, pk=batch_id)
-    # Ensure all topics exist for this student
-    topics = CourseTopic.objects.filter(course=student.course).order_by('topic_id')
-    for topic in topics:
-        StudentTopicProgress.objects.get_or_create(
-            student=student,
-            topic=topic
-        )
-
-    class ProgressForm(forms.ModelForm):
-        class Meta:
-            model = StudentTopicProgress
-            fields = ('start_date', 'end_date', 'marks')
-            widgets = {
-                'start_date': forms.DateInput(attrs={'type': 'date'}),
-                'end_date': forms.DateInput(attrs={'type': 'date'}),
-            }
-
-    ProgressFormSet = modelformset_factory(
-        StudentTopicProgress,
-        form=ProgressForm,
-        extra=0
-    )
-
-    queryset = StudentTopicProgress.objects.filter(student=student).order_by('topic__topic_id')
+    course = curriculum(student.course_id)
+    modules, module, page = _progress_slice(request, course)
+    # Only this page's topics are loaded, created, validated and saved
+    topic_ids = [topic.topic_id for topic in page.object_list]
+    run_write(_ensure_progress_rows, student, topic_ids)
+    queryset = StudentTopicProgress.objects.filter(student=student, topic_id__in=topic_ids).order_by('topic_id')
 
     if request.method == "POST":
         formset = ProgressFormSet(request.POST, queryset=queryset)
         if formset.is_valid():
-            for form in formset.forms:
-                progress = form.save(commit=False)
-                if form.has_changed():
-                    progress.sign = staff.staff_name
-                progress.save()
-                form.save_m2m()
-            return redirect('student_detail', student_id=student.pk,batch_id=batch.pk)
+            run_write(_save_progress_forms, formset, staff)
+            messages.success(request, f"Progress saved for {module}.")
+            return redirect(request.get_full_path())
         else:
-            print("Formset errors:", formset.errors)
-            print("Non-form errors:", formset.non_form_errors())
+            logger.warning("Progress formset invalid for student %s: %s %s",
+                           student.pk, formset.errors, formset.non_form_errors())
 
     else:
         formset = ProgressFormSet(queryset=queryset)
 
-    topic_form_pairs = list(zip(formset.forms, topics))
+    topic_form_pairs = [(form, course.topics_by_id[form.instance.topic_id]) for form in formset.forms]
 
     return render(request, 'add_progress.html', {
         'student': student,
         'formset': formset,
         'topic_form_pairs': topic_form_pairs,
         'batch_id': batch.pk,
+        'modules': modules,
+        'module': module,
+        'page': page,
+    })
+
+
+@require_POST
+@login_required
+def save_topic_progress(request, student_id, topic_id):
+    """Save one topic's progress row from the editing page; JSON errors, no formset."""
+    staff = get_object_or_404(Staff, user=request.user)
+    student = get_object_or_404(Student, pk=student_id, staff=staff)
+    if topic_id not in curriculum(student.course_id).topics_by_id:
+        raise Http404("No such topic in this course.")
+    form = ProgressForm(request.POST, instance=StudentTopicProgress(student=student, topic_id=topic_id))
+    if not form.is_valid():
+        return JsonResponse({'errors': {field: list(errors) for field, errors in form.errors.items()}}, status=400)
+
+    values = {field: form.cleaned_data[field] for field in ProgressForm._meta.fields}
+    # Lookup and write in one write transaction, so two first saves of a topic can't both INSERT
+    progress, _ = run_write(
+        StudentTopicProgress.objects.update_or_create,
+        student=student, topic_id=topic_id, defaults={**values, 'sign': staff.staff_name},
+    )
+    return JsonResponse({
+        'topic_id': topic_id,
+        'start_date': progress.start_date,
+        'end_date': progress.end_date,
+        'marks': progress.marks,
+        'sign': progress.sign,
     })
 
 
@@ -177,8 +325,17 @@ def staff_login(request):
     if request.method == "POST":
         username = request.POST.get('username')
         password = request.POST.get('password')
-        user = authenticate(request, username=username, password=password)
-
+        with hashing_slot() as admitted:
+            if not admitted:
+                # Hashing is already at LOGIN_CONCURRENCY; don't take the core from attendance submissions
+                metrics.inc("myapp_logins_total", outcome="throttled")
+                messages.error(request, "Many staff are signing in right now. Please try again in a few seconds.")
+                response = render(request, 'staff_login.html', status=503)
+                response["Retry-After"] = "5"
+                return response
+            user = authenticate(request, username=username, password=password)
+
+        metrics.inc("myapp_logins_total", outcome="failed" if user is None else "success")
         if user is not None:
             login(request, user)
             #  Redirect staff to student batch list (not back to home)
@@ -197,12 +354,21 @@ def add_batch(request):
         start_time=request.POST["start_time"]
         end_time=request.POST["end_time"]
 
-        Batch.objects.create(
+        batch = Batch(
             staff=staff,
             batch_name=batch_name,
             start_time=start_time,
-            end_time=end_time
+            end_time=end_time,
+            room=request.POST.get("room", "").strip(),
         )
+        try:
+            # Also rejects times overlapping the staff member's other batches
+            batch.full_clean()
+        except ValidationError as exc:
+            for error in exc.messages:
+                messages.error(request, error)
+            return render(request,"add_batch.html")
+        batch.save()
 
         messages.success(request,"NEW BATCH ADDED SCCESSFULLY")
         return redirect("get_batches")
@@ -212,11 +378,31 @@ def add_batch(request):
 
 
 
+def _save_student_marks(students, selected_date, data):
+    """One transaction for the whole attendance form; returns the number of marks written."""
+    written = 0
+    for student in students:
+        status = data.get(f"status_{student.student_id}")
+        if status is not None:
+            written += 1
+            status_bool = True if status == "present" else False
+            attendance, created = StudentAttendance.objects.get_or_create(
+                student=student,
+                date=selected_date,
+                defaults={"status": status_bool}
+            )
+            if not created:
+                attendance.status = status_bool
+                attendance.save()
+            attendance_logger.debug("Student %s marked %s on %s (created=%s)",
+                                    student.student_id, status, selected_date, created)
+    return written
+
+
 @login_required
 def mark_student_attendance(request,batch_id):
     staff = get_object_or_404(Staff, user=request.user)
     batch=get_object_or_404(Batch, pk=batch_id, staff=staff)
-    students = Student.objects.filter(staff=staff,batch=batch)
     today = timezone.now().date()
 
     # --- Get the selected date (POST first, then GET) ---
@@ -232,31 +418,24 @@ def mark_student_attendance(request,batch_id):
     # Prevent future dates
     if selected_date > today:
         selected_date = today
-    logger.info(f"Selected date for attendance: {selected_date}")
+    logger.debug("Selected date for attendance: %s", selected_date)
+    # The roster of the selected day, which may be back-dated: joined by then, not yet finished
+    students = Student.objects.filter(active_student_q(on=selected_date), staff=staff, batch=batch,
+                                      join_date__lte=selected_date)
 
     # --- Save attendance if POST ---
     if request.method == "POST":
-        for student in students:
-            status = request.POST.get(f"status_{student.student_id}")
-            if status is not None:
-                status_bool = True if status == "present" else False
-                attendance, created = StudentAttendance.objects.get_or_create(
-                    student=student,
-                    date=selected_date,
-                    defaults={"status": status_bool}
-                )
-                print("attendance : ",attendance, "created : ",created)
-                if not created:
-                    attendance.status = status_bool
-                    attendance.save()
-                    print("attendance : ",attendance, "created : ",created)
+        written = run_write(_save_student_marks, students, selected_date, request.POST)
+        if written:
+            metrics.inc("myapp_attendance_marks_written_total", written, source="form")
         # Redirect back to the same selected date
         return redirect(f"{reverse('student_attendance', args=[batch.batch_id])}?date={selected_date.strftime('%Y-%m-%d')}")
 
     # --- Load attendance for selected date ---
+    # A back-dated day may already be archived
     attendance_records = {
-        att.student_id: att
-        for att in StudentAttendance.objects.filter(date=selected_date, student__in=students)
+        student_id: {"status": status}
+        for student_id, _, _, status in attendance_history(date=selected_date, student__in=students)
     }
 
     return render(request, "student_attendance.html", {
@@ -265,19 +444,306 @@ def mark_student_attendance(request,batch_id):
         "today": today.strftime("%Y-%m-%d"),
         "selected_date": selected_date.strftime("%Y-%m-%d"),
         "batch": batch,
+        "sync_limit": MAX_ENTRIES,
     })
 
+def _count_subquery(queryset, group_by):
+    """Correlated COUNT(*) of ``queryset`` grouped on ``group_by``, 0 when empty."""
+    counts = queryset.order_by().values(group_by).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def batch_dashboard(staff, today):
+    """
+    Every batch of ``staff`` with today's roster numbers, in one SELECT.
+
+    Student counts come straight from the students join; attendance and
+    progress are correlated subqueries so the joins do not multiply rows.
+    """
+    active = active_student_q('students__', today)
+    active_student = active_student_q('student__', today)
+    todays_marks = StudentAttendance.objects.filter(
+        active_student, student__batch=OuterRef('pk'), date=today
+    )
+    progress = StudentTopicProgress.objects.filter(active_student, student__batch=OuterRef('pk'))
+    # one CourseTopic row per (active student, topic of their course)
+    expected_topics = CourseTopic.objects.filter(
+        active_student_q('course__students__', today), course__students__batch=OuterRef('pk')
+    )
+
+    batches = (
+        Batch.objects.filter(staff=staff)
+        .annotate(
+            total_students=Count('students', filter=active),
+            offline_students=Count('students', filter=active & Q(students__mode=True)),
+            online_students=Count('students', filter=active & Q(students__mode=False)),
+            marked_today=_count_subquery(todays_marks.exclude(status__isnull=True), 'student__batch'),
+            absent_today=_count_subquery(todays_marks.filter(status=False), 'student__batch'),
+            topics_done=_count_subquery(progress.filter(end_date__isnull=False), 'student__batch'),
+            topics_expected=_count_subquery(expected_topics, 'course__students__batch'),
+            at_risk=Coalesce(Subquery(
+                StudentRiskFlag.objects.filter(active_student, student__batch=OuterRef('pk')).order_by()
+                .values('student__batch').annotate(n=Count('student', distinct=True)).values('n'),
+                output_field=IntegerField(),
+            ), 0),
+            avg_marks=Subquery(
+                progress.filter(marks__isnull=False).order_by().values('student__batch')
+                .annotate(m=Avg('marks')).values('m'),
+                output_field=FloatField(),
+            ),
+        )
+        .order_by('start_time')
+    )
+    for batch in batches:
+        batch.unmarked_today = batch.total_students - batch.marked_today
+        batch.progress_percent = (
+            round(batch.topics_done * 100 / batch.topics_expected) if batch.topics_expected else 0
+        )
+    return batches
+
+
+@require_POST
+@login_required
+def sync_student_attendance(request):
+    """JSON endpoint for marks queued offline by student_attendance.html."""
+    staff = get_object_or_404(Staff, user=request.user)
+    try:
+        entries = json.loads(request.body).get('entries', [])
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'invalid JSON'}, status=400)
+    if not isinstance(entries, list) or len(entries) > MAX_ENTRIES:
+        return JsonResponse({'error': f'entries must be a list of at most {MAX_ENTRIES} items'}, status=400)
+    entries = [e for e in entries if isinstance(e, dict)]
+    return JsonResponse({'results': run_write(apply_attendance_entries, staff, entries)})
+
+def _batches_state(request):
+    today = localdate()
+    return page_state(
+        Staff.objects.filter(user=request.user),
+        batches=Batch.objects.filter(staff__user=request.user),
+        students=Student.objects.filter(batch__staff__user=request.user),
+        marks=StudentAttendance.objects.filter(student__batch__staff__user=request.user, date=today),
+        progress=StudentTopicProgress.objects.filter(student__batch__staff__user=request.user),
+        topics=CourseTopic.objects.filter(
+            course_id__in=Student.objects.filter(batch__staff__user=request.user).values('course_id')
+        ),
+        attendance=Attendance.objects.filter(staff__user=request.user, date=today),
+        flags=StudentRiskFlag.objects.filter(student__staff__user=request.user),
+    )
+
+
 @login_required
+@conditional_page(_batches_state)
 def getBatches(request):
     staff= get_object_or_404(Staff, user=request.user)
-    batches = Batch.objects.filter(staff=staff).order_by('start_time')
-    return render(request, 'batch.html', {'batches': batches,'staff':staff})
+    today = localdate()
+    batches = batch_dashboard(staff, today)
+    attendance = Attendance.objects.filter(staff=staff, date=today).order_by('-wifi_verified').first()
+    risk_flags = (
+        StudentRiskFlag.objects.filter(active_student_q('student__', today), student__staff=staff)
+        .select_related('student').order_by('student__student_name', 'reason')
+    )
+    return render(request, 'batch.html', {'batches': batches,'staff':staff,'attendance':attendance,'today':today,
+                                          'risk_flags':risk_flags})
 
 def staff_logout(request):
     logout(request)
     return redirect('staff_login')
 
 
+@staff_member_required
+def profiling_summary(request):
+    """Admin page: slowest myapp endpoints seen by RequestProfilingMiddleware."""
+    from . import urls as app_urls
+
+    stats = {row["url_name"]: row for row in endpoint_summary()}
+    endpoints = [
+        stats.get(p.name, {"url_name": p.name, "count": 0})
+        for p in app_urls.urlpatterns if p.name
+    ]
+    endpoints.sort(key=lambda r: r.get("avg_ms", 0), reverse=True)
+    return render(request, 'profiling_summary.html', {
+        'title': 'Request profiling',
+        'endpoints': endpoints,
+        'slow_requests': recent_slow_requests(),
+        'profiling_enabled': getattr(settings, "PROFILING_ENABLED", False),
+    })
+
+
+BRANCH_TOTALS = ('staff', 'students', 'active_students', 'marked_today', 'present_today', 'topics_completed')
+
+
+def _branch_totals(alias):
+    """Per-branch counts in one branch database, keyed by branch_id."""
+    today = localdate()
+    totals = {}
+
+    def add(rows, key):
+        for row in rows:
+            bucket = totals.setdefault(row.pop(key), dict.fromkeys(BRANCH_TOTALS, 0))
+            for name, value in row.items():
+                bucket[name] += value
+
+    add(Staff.objects.values('branch_id').annotate(staff=Count('pk')).order_by(), 'branch_id')
+    add(Student.objects.values('branch_id').annotate(
+        students=Count('pk'), active_students=Count('pk', filter=active_student_q(on=today)),
+    ).order_by(), 'branch_id')
+    add(StudentAttendance.objects.filter(date=today).values('student__branch_id').annotate(
+        marked_today=Count('pk', filter=Q(status__isnull=False)),
+        present_today=Count('pk', filter=Q(status=True)),
+    ).order_by(), 'student__branch_id')
+    add(StudentTopicProgress.objects.filter(end_date__isnull=False).values('student__branch_id').annotate(
+        topics_completed=Count('pk'),
+    ).order_by(), 'student__branch_id')
+    return totals
+
+
+@staff_member_required
+def branch_report(request):
+    """Admin page: per-branch numbers, queried from every branch database in parallel."""
+    if request.method == 'POST':
+        # Superusers have no Staff row; this picks the database their admin pages use
+        code = request.POST.get('branch') or None
+        if code and not Branch.objects.filter(code=code).exists():
+            return redirect('branch_report')
+        request.session[SESSION_KEY] = code
+        messages.success(request, f"Admin now works in {code or 'the default database'}.")
+        return redirect('branch_report')
+
+    branches = {b.pk: b for b in Branch.objects.all()}
+    merged = {}
+    for alias, totals in for_each_database(_branch_totals).items():
+        for branch_id, counts in totals.items():
+            row = merged.setdefault(branch_id, {'databases': set(), **dict.fromkeys(BRANCH_TOTALS, 0)})
+            row['databases'].add(alias)
+            for name in BRANCH_TOTALS:
+                row[name] += counts[name]
+
+    rows = []
+    for branch_id, row in merged.items():
+        branch = branches.get(branch_id)
+        rows.append({'branch': branch, 'name': branch.name if branch else 'Unassigned', **row,
+                     'databases': ', '.join(sorted(row['databases']))})
+    for branch in branches.values():
+        if branch.pk not in merged:
+            rows.append({'branch': branch, 'name': branch.name, 'databases': branch_alias(branch.code),
+                         **dict.fromkeys(BRANCH_TOTALS, 0)})
+    rows.sort(key=lambda r: r['name'])
+    return render(request, 'branch_report.html', {
+        'title': 'Branches',
+        'rows': rows,
+        'totals': {name: sum(r[name] for r in rows) for name in BRANCH_TOTALS},
+        'current_alias': current_alias(),
+        'current_branch': request.session.get(SESSION_KEY),
+    })
+
+
+@staff_member_required
+def attendance_board(request):
+    """Admin page: today's attendance marking per batch and staff check-ins, updated live."""
+    today = localdate()
+    return render(request, 'attendance_board.html', {
+        'title': 'Live attendance',
+        'today': today,
+        'rows': live.board_rows(today),
+        'checkins': Attendance.objects.filter(date=today).select_related('staff').order_by('time'),
+    })
+
+
+@require_GET
+@staff_member_required
+def attendance_board_events(request):
+    """Server-Sent Events for the attendance board. Serve it with the ASGI app (StudentReport/asgi.py)."""
+    try:
+        last_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_id = None
+    response = StreamingHttpResponse(live.event_stream(current_alias(), last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+    return response
+
+
+@staff_member_required
+def batch_schedule(request):
+    """Admin page: one staff member's or room's day, and every timetable conflict."""
+    index = schedule_index()
+    staff_id = request.GET.get('staff')
+    room = request.GET.get('room', '').strip()
+    staff_id = int(staff_id) if staff_id and staff_id.isdigit() else None
+
+    if staff_id is not None:
+        day = [index.batches[pk] for _, _, pk in index.staff[staff_id].items] if staff_id in index.staff else []
+        conflicts = index.all_conflicts(staff_id=staff_id)
+    elif room:
+        day = sorted(
+            (index.batches[pk] for key, rooms in index.rooms.items() if key[1] == room.lower() for _, _, pk in rooms.items),
+            key=lambda b: (b.start_time, b.end_time),
+        )
+        conflicts = index.all_conflicts(room=room)
+    else:
+        day = []
+        conflicts = index.all_conflicts()
+    clashing = {b.pk for _, a, c in conflicts for b in (a, c)}
+
+    staff_choices = sorted({(b.staff_id, b.staff.staff_name) for b in index.batches.values()}, key=lambda s: s[1])
+    rooms = sorted({b.room.strip() for b in index.batches.values() if b.room.strip()}, key=str.lower)
+    return render(request, 'batch_schedule.html', {
+        'title': 'Batch schedule',
+        'staff_choices': staff_choices,
+        'rooms': rooms,
+        'staff_id': staff_id,
+        'room': room,
+        'day': [{'batch': b, 'clash': b.pk in clashing} for b in day],
+        'conflicts': conflicts,
+        'batch_count': len(index.batches),
+    })
+
+
+@staff_member_required
+def analytics_dashboard(request):
+    """Admin page: funnels, mark distributions and staff comparison for one course."""
+    courses = Course.objects.order_by('course_name')
+    course = None
+    data = None
+    error = None
+    course_id = request.GET.get('course')
+    if course_id:
+        if not course_id.isdigit():
+            raise Http404("No such course.")
+        course = get_object_or_404(Course, pk=course_id)
+        try:
+            data = course_analytics(course.pk)
+        except AnalyticsUnavailable as exc:
+            error = str(exc)
+    return render(request, 'analytics.html', {
+        'title': 'Course analytics',
+        'courses': courses,
+        'course': course,
+        'data': data,
+        'error': error,
+    })
+
+
+@require_GET
+@staff_member_required
+def analytics_json(request, course_id):
+    course = get_object_or_404(Course, pk=course_id)
+    try:
+        return JsonResponse(course_analytics(course.pk))
+    except AnalyticsUnavailable as exc:
+        return JsonResponse({'error': str(exc)}, status=503)
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint; open to METRICS_ALLOWED_IPS and logged-in admins."""
+    allowed = getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+    if request.META.get("REMOTE_ADDR") not in allowed and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # @require_GET
 # @login_required
 # def get_staffs_json(request):
@@ -0,0 +1,117 @@
+# myapp/writes.py
+"""
+Coordinated writes for SQLite deployments.
+
+SQLite allows one writer at a time. A transaction that starts with a read
+and then writes (get_or_create followed by save) can find the lock taken
+when it upgrades and fail with "database is locked". The databases are
+configured with ``transaction_mode: IMMEDIATE`` (settings/base.py), so
+each ``transaction.atomic()`` takes the write lock when it begins and
+concurrent writers wait in the busy timeout instead.
+
+``run_write`` runs a write function in one such short transaction. If the
+lock is still busy after the timeout, it retries with jittered
+exponential backoff. With WRITE_QUEUE_ENABLED, writes are also funnelled
+through a single writer thread per process, so requests of one worker
+never compete with each other for the lock.
+"""
+import contextvars
+import functools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import OperationalError, connections, router, transaction
+
+from . import metrics
+from .routers import current_alias
+
+logger = logging.getLogger(__name__)
+
+_writer = None
+_writer_lock = threading.Lock()
+_in_writer = threading.local()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def is_lock_error(exc):
+    message = str(exc).lower()
+    return isinstance(exc, OperationalError) and ("locked" in message or "busy" in message)
+
+
+def _writer_pool():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="myapp-writer")
+    return _writer
+
+
+def _attempts(func, using, args, kwargs):
+    attempts = max(1, _setting("WRITE_RETRY_ATTEMPTS", 5))
+    base = _setting("WRITE_RETRY_BASE_DELAY", 0.05)
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic(using=using):
+                return func(*args, **kwargs)
+        except OperationalError as exc:
+            if not is_lock_error(exc) or attempt == attempts:
+                if is_lock_error(exc):
+                    metrics.inc("myapp_db_write_retries_total", outcome="gave_up")
+                    logger.error("Write %s gave up after %s attempts: %s", func.__name__, attempt, exc)
+                raise
+            # Full jitter: retries of competing writers spread out instead of colliding again
+            delay = random.uniform(0, base * 2 ** (attempt - 1))
+            metrics.inc("myapp_db_write_retries_total", outcome="retried")
+            logger.warning("Write %s hit a locked database (attempt %s), retrying in %.0f ms",
+                           func.__name__, attempt, delay * 1000)
+            time.sleep(delay)
+
+
+def _in_writer_thread(func, using, args, kwargs):
+    _in_writer.active = True
+    try:
+        return _attempts(func, using, args, kwargs)
+    finally:
+        _in_writer.active = False
+        # The writer thread outlives requests; don't keep a connection that may go stale
+        if not connections[using].in_atomic_block:
+            connections[using].close_if_unusable_or_obsolete()
+
+
+def run_write(func, *args, using=None, model=None, **kwargs):
+    """
+    Call ``func(*args, **kwargs)`` in one short write transaction on
+    ``using`` (default: the database ``model`` is routed to, else the
+    current branch database). Lock errors are retried. Inside an outer
+    transaction, or in the writer thread, ``func`` is simply called.
+    """
+    if using is None:
+        using = router.db_for_write(model) if model is not None else current_alias()
+    if connections[using].in_atomic_block or getattr(_in_writer, "active", False):
+        # Retrying part of an outer transaction is not possible; the outer one owns the lock
+        return func(*args, **kwargs)
+    if _setting("WRITE_QUEUE_ENABLED", False):
+        # copy_context keeps the request's branch database for the writer thread
+        context = contextvars.copy_context()
+        future = _writer_pool().submit(context.run, _in_writer_thread, func, using, args, kwargs)
+        return future.result()
+    return _attempts(func, using, args, kwargs)
+
+
+def serialized_write(func=None, *, model=None):
+    """Decorator form of ``run_write``."""
+    if func is None:
+        return functools.partial(serialized_write, model=model)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return run_write(func, *args, model=model, **kwargs)
+    return wrapper